@@ -0,0 +1,424 @@
+"""
+Running python_inter / fig_inter code: namespaces, compiled code cache, result summaries and time limits
+运行 python_inter / fig_inter 代码：命名空间、编译代码缓存、结果摘要与时间限制
+
+The worker processes import this module too, so it must not import graph.
+工作进程也会导入本模块，因此本模块不能导入 graph。
+"""
+import os
+import ast
+import dis
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import reprlib
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+import pandas as pd
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+logger = logging.getLogger(__name__)
+
+
+def workspace_builtins() -> dict:
+    """
+    Names every workspace starts with, matching what tool code could use before
+    每个工作区初始包含的名称，与此前工具代码可直接使用的名称一致
+    """
+    return {"__builtins__": __builtins__, "pd": pd, "np": np, "plt": plt, "sns": sns,
+            "matplotlib": matplotlib, "json": json, "os": os, "datetime": datetime, "date": date}
+
+# ============================================================================
+# PYTHON RESULT SUMMARIES
+# Python 执行结果摘要
+# ============================================================================
+# python_inter reports only the names its code assigned, found from the
+# compiled code instead of diffing the whole namespace. Large values are
+# summarised (shape, dtypes, head, memory) rather than formatted with str(),
+# and the whole reply is capped at PYTHON_RESULT_MAX_CHARS characters.
+# python_inter 只报告代码赋值的名称（从编译后的代码中找出，而不是比较整个命名空间）。
+# 大对象输出摘要（形状、类型、前几行、内存）而非 str() 全量格式化，整体输出限制在
+# PYTHON_RESULT_MAX_CHARS 个字符以内。
+# ============================================================================
+
+PYTHON_RESULT_MAX_CHARS = int(os.getenv('PYTHON_RESULT_MAX_CHARS', '4000'))
+# Frames up to this size are shown in full, like pandas' own repr / 不超过该规模的 DataFrame 完整显示，与 pandas 默认 repr 一致
+SUMMARY_FULL_ROWS = 60
+SUMMARY_FULL_COLUMNS = 20
+SUMMARY_HEAD_ROWS = 5
+
+_STORE_OPS = {"STORE_NAME", "STORE_GLOBAL", "DELETE_NAME", "DELETE_GLOBAL"}
+
+
+def _stored_names(code) -> list:
+    """
+    Global names a compiled code object assigns or deletes, in order
+    编译后的代码对象赋值或删除的全局名称（按出现顺序）
+    """
+    names, pending = {}, [code]
+    while pending:
+        current = pending.pop()
+        for instruction in dis.get_instructions(current):
+            # Nested functions only reach globals through `global x` / 嵌套函数只能通过 `global x` 修改全局变量
+            if instruction.opname in _STORE_OPS and (current is code or instruction.opname.endswith("GLOBAL")):
+                names.setdefault(instruction.argval, None)
+        pending.extend(c for c in current.co_consts if hasattr(c, "co_code"))
+    return list(names)
+
+
+def format_bytes(nbytes: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if nbytes < 1024 or unit == "GB":
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+
+def _clip(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}\n... [output truncated: {len(text) - max_chars:,} more characters]"
+
+
+def _shallow_nbytes(obj) -> int:
+    # Deep measurement walks every Python string; only afford it for small objects
+    # 深度计量会遍历每个 Python 字符串，仅对小对象使用
+    usage = obj.memory_usage(index=True, deep=len(obj) <= 100_000)
+    return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+
+
+def summarize_value(value, max_chars: int = PYTHON_RESULT_MAX_CHARS) -> str:
+    """
+    Model-facing text for a value: small ones in full, large ones as a summary
+    面向模型的值文本：小对象完整显示，大对象显示摘要
+    """
+    if isinstance(value, pd.DataFrame):
+        rows, cols = value.shape
+        if rows <= SUMMARY_FULL_ROWS and cols <= SUMMARY_FULL_COLUMNS:
+            return _clip(str(value), max_chars)
+        dtypes = ", ".join(f"{c} {t}" for c, t in list(value.dtypes.items())[:30])
+        if cols > 30:
+            dtypes += f", ... ({cols - 30} more)"
+        head = value.head(SUMMARY_HEAD_ROWS).to_string(max_cols=SUMMARY_FULL_COLUMNS, max_colwidth=40)
+        return _clip(f"DataFrame: {rows:,} rows × {cols} columns, {format_bytes(_shallow_nbytes(value))}\n"
+                     f"columns: {dtypes}\nhead({SUMMARY_HEAD_ROWS}):\n{head}", max_chars)
+    if isinstance(value, pd.Series):
+        if len(value) <= SUMMARY_FULL_ROWS:
+            return _clip(str(value), max_chars)
+        head = value.head(SUMMARY_HEAD_ROWS).to_string(max_rows=SUMMARY_HEAD_ROWS)
+        return _clip(f"Series '{value.name}': {len(value):,} values, dtype {value.dtype}, "
+                     f"{format_bytes(_shallow_nbytes(value))}\nhead({SUMMARY_HEAD_ROWS}):\n{head}", max_chars)
+    if isinstance(value, np.ndarray):
+        if value.size <= 100:
+            return _clip(str(value), max_chars)
+        preview = np.array2string(value, threshold=20, edgeitems=3)
+        return _clip(f"ndarray: shape {value.shape}, dtype {value.dtype}, {format_bytes(value.nbytes)}\n{preview}",
+                     max_chars)
+    if isinstance(value, (list, tuple, set, frozenset, dict)) and len(value) > 100:
+        # repr of a huge container would be built in full before clipping / 巨大容器的 repr 会在截断前完整构建
+        return _clip(f"{type(value).__name__} with {len(value):,} items: {reprlib.repr(value)}", max_chars)
+    return _clip(str(value), max_chars)
+
+
+def summarize_assignments(values: dict, max_chars: int = PYTHON_RESULT_MAX_CHARS) -> str:
+    """Summary of the variables a piece of code assigned / 代码所赋值变量的摘要"""
+    parts = []
+    for name, value in values.items():
+        # Leave room for the name and a truncation note / 为名称和截断提示预留空间
+        share = max(200, max_chars // len(values) - len(name) - 64)
+        text = _clip(repr(value), share) if isinstance(value, str) else summarize_value(value, share)
+        parts.append(f"{name} = {text}" if "\n" not in text else f"{name} =\n{text}")
+    return _clip("\n".join(parts), max_chars)
+
+# ============================================================================
+# COMPILED CODE CACHE
+# 编译代码缓存
+# ============================================================================
+# Snippets are parsed once with ast to decide between expression and
+# statements, compiled once, and kept in an LRU keyed by a hash of the source,
+# so resent or rerun code skips parsing and compiling altogether.
+# 代码片段只用 ast 解析一次以区分表达式与语句，只编译一次，并按源码哈希保存在 LRU
+# 缓存中，重复发送或重新运行的代码无需再次解析和编译。
+# ============================================================================
+
+def code_object_names(code) -> set:
+    """Names referenced by a code object and its nested code / 代码对象及其嵌套代码引用的名称"""
+    names, pending = set(), [code]
+    while pending:
+        current = pending.pop()
+        names.update(current.co_names)
+        pending.extend(c for c in current.co_consts if hasattr(c, "co_names"))
+    return names
+
+
+def _bound_names(node) -> set:
+    """Names a top-level statement binds at module level / 顶层语句在模块级绑定的名称"""
+    names, pending = set(), [node]
+    while pending:
+        current = pending.pop()
+        if isinstance(current, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(current.name)
+            # Their bodies bind local names only / 其内部只绑定局部名称
+            pending.extend(current.decorator_list)
+            continue
+        if isinstance(current, (ast.Import, ast.ImportFrom)):
+            names.update((a.asname or a.name).split(".")[0] for a in current.names if a.name != "*")
+        elif isinstance(current, ast.Name) and isinstance(current.ctx, (ast.Store, ast.Del)):
+            names.add(current.id)
+        elif isinstance(current, (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            continue
+        pending.extend(ast.iter_child_nodes(current))
+    return names
+
+
+def _definitions(tree, py_code: str) -> dict:
+    """
+    {name: source} of the functions, classes, imports and lambdas a snippet defines at top level,
+    for names whose last top-level binding is such a definition
+    代码片段在顶层定义的函数、类、导入与 lambda 的 {名称: 源码}（仅限最后一次顶层绑定即为该定义的名称）
+
+    Worker processes cannot send these back as values, so they travel as source and are run again.
+    工作进程无法将它们作为值传回，因此以源码形式传递并重新执行。
+    """
+    definitions = {}
+    for node in tree.body:
+        source, names = None, ()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            decorators = "".join(f"@{ast.get_source_segment(py_code, d)}\n" for d in node.decorator_list)
+            source, names = decorators + ast.get_source_segment(py_code, node), (node.name,)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)) and all(a.name != "*" for a in node.names):
+            source, names = ast.get_source_segment(py_code, node), _bound_names(node)
+        elif (isinstance(node, ast.Assign) and isinstance(node.value, ast.Lambda)
+              and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)):
+            source, names = ast.get_source_segment(py_code, node), (node.targets[0].id,)
+        bound = _bound_names(node)
+        for name in bound:
+            definitions.pop(name, None)
+        if source is not None:
+            # An import binds each of its names; each keeps the whole statement / 导入语句绑定的每个名称都保留整条语句
+            definitions.update((name, source) for name in names)
+    return definitions
+
+
+class CompiledSnippet:
+    """
+    A compiled snippet and what the tools need to know about it
+    已编译的代码片段及工具所需的相关信息
+    """
+
+    def __init__(self, code, expression: bool, seconds: float):
+        self.code = code
+        self.expression = expression
+        self.names = code_object_names(code)
+        self.targets = _stored_names(code)
+        self.definitions = {}
+        self.compile_seconds = seconds
+
+
+class CodeCache:
+    """
+    LRU cache of compiled python_inter / fig_inter snippets
+    python_inter / fig_inter 代码片段的 LRU 编译缓存
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "compile_seconds": 0.0}
+
+    def compile(self, py_code: str, filename: str) -> tuple:
+        """
+        (snippet, cached) for py_code; the filename is part of the key
+        返回 (snippet, cached)；filename 也是缓存键的一部分
+
+        :raises SyntaxError: when the code does not parse
+        """
+        key = hashlib.sha1(f"{filename}\0{py_code}".encode('utf-8', 'surrogatepass')).hexdigest()
+        with self._lock:
+            snippet = self._entries.get(key)
+            if snippet is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return snippet, True
+        started = time.perf_counter()
+        tree = ast.parse(py_code, filename, "exec")
+        if len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr):
+            # A lone expression is evaluated so its value can be returned / 单个表达式求值以便返回其结果
+            snippet = CompiledSnippet(compile(ast.Expression(tree.body[0].value), filename, "eval"), True, 0.0)
+        else:
+            snippet = CompiledSnippet(compile(tree, filename, "exec"), False, 0.0)
+        snippet.definitions = _definitions(tree, py_code)
+        snippet.compile_seconds = time.perf_counter() - started
+        with self._lock:
+            self._stats["misses"] += 1
+            self._stats["compile_seconds"] += snippet.compile_seconds
+            self._entries[key] = snippet
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return snippet, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, **self._stats}
+
+
+code_cache = CodeCache(int(os.getenv('CODE_CACHE_SIZE', '256')))
+
+
+def code_names(py_code: str, filename: str = "<python_inter>") -> set:
+    """
+    Global names a code string refers to, including inside nested functions
+    代码字符串引用的全局名称，包括嵌套函数内部
+    """
+    try:
+        snippet, _ = code_cache.compile(py_code, filename)
+    except (SyntaxError, ValueError):
+        return set()
+    return snippet.names
+
+
+def run_code(g: dict, py_code: str, filename: str = "<python_inter>", timings: dict = None) -> str:
+    """
+    Evaluate py_code as an expression, or execute it as statements, in namespace g
+    在命名空间 g 中将 py_code 作为表达式求值，或作为语句执行
+
+    :param timings: filled with compile/execute/summarize seconds and whether the compile was cached
+    """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    try:
+        snippet, timings["cached"] = code_cache.compile(py_code, filename)
+    except (SyntaxError, ValueError) as e:
+        return f"Code execution error: {e}"
+    finally:
+        timings["compile"] = time.perf_counter() - started
+    started = time.perf_counter()
+    try:
+        if snippet.expression:
+            # Return the expression result / 返回表达式运行结果
+            value = eval(snippet.code, g)
+        else:
+            # Only the names this code assigns can change / 只有本段代码赋值的名称可能变化
+            before = {name: id(g[name]) for name in snippet.targets if name in g}
+            exec(snippet.code, g)
+    except Exception as e:
+        return f"Code execution error: {str(e) or type(e).__name__}"
+    finally:
+        timings["execute"] = time.perf_counter() - started
+    started = time.perf_counter()
+    try:
+        if snippet.expression:
+            return summarize_value(value)
+        changed = [name for name in snippet.targets if name in g and before.get(name) != id(g[name])]
+        # If new or rebound variables exist / 若存在新增或重新赋值的变量
+        if changed:
+            # Optional execution confirmation for debugging
+            # 可选的执行确认用于调试
+            # print("代码已顺利执行，正在进行结果梳理...")
+            return summarize_assignments({name: g[name] for name in changed})
+        # Optional execution confirmation for debugging
+        # 可选的执行确认用于调试
+        # print("代码已顺利执行，正在进行结果梳理...")
+        return "Code executed successfully"
+    finally:
+        timings["summarize"] = time.perf_counter() - started
+
+
+def log_timings(tool_name: str, thread_id: str, timings: dict):
+    """Log where the time of one call went / 记录一次调用的耗时分布"""
+    if "compile" in timings:
+        logger.info("%s [%s]: compile %.2f ms%s, execute %.3f s, summarize %.2f ms", tool_name, thread_id,
+                    timings["compile"] * 1000, " (cached)" if timings.get("cached") else "",
+                    timings.get("execute", 0.0), timings.get("summarize", 0.0) * 1000)
+
+# ============================================================================
+# EXECUTION TIME LIMITS AND CANCELLATION
+# 执行时间限制与取消
+# ============================================================================
+# python_inter and fig_inter code running in a worker process is stopped, by
+# killing the worker, when it exceeds its time limit or when the LangGraph run
+# is cancelled. The model gets a JSON report of what happened. Code run in the
+# server process (PYTHON_WORKERS=0 or FIG_RENDER_WORKERS=0) has no time limit.
+# 在工作进程中运行的 python_inter 与 fig_inter 代码在超过时间限制或 LangGraph 运行被取消时，
+# 通过终止工作进程来停止，模型会收到一份说明原因的 JSON 报告。在服务进程内运行的代码
+# （PYTHON_WORKERS=0 或 FIG_RENDER_WORKERS=0）不受时间限制。
+# ============================================================================
+
+PYTHON_EXEC_TIMEOUT = int(os.getenv('PYTHON_EXEC_TIMEOUT', '120'))
+PYTHON_EXEC_MAX_TIMEOUT = int(os.getenv('PYTHON_EXEC_MAX_TIMEOUT', '600'))
+
+
+def clamp_timeout(timeout) -> int:
+    """Per-call time limit within 1..PYTHON_EXEC_MAX_TIMEOUT seconds / 单次调用的时间限制，限定在 1..PYTHON_EXEC_MAX_TIMEOUT 秒"""
+    return max(1, min(int(timeout or PYTHON_EXEC_TIMEOUT), PYTHON_EXEC_MAX_TIMEOUT))
+
+
+def interruption_report(tool_name: str, reason: str, limit: float, elapsed: float, py_code: str) -> str:
+    """
+    JSON result telling the model why its code stopped in the worker process
+    告知模型其代码为何在工作进程中被停止的 JSON 结果
+    """
+    report = {"status": reason, "tool": tool_name, "limit_seconds": limit, "elapsed_seconds": round(elapsed, 2),
+              "total_lines": len(py_code.splitlines()), "worker_restarted": True}
+    if reason == "cancelled":
+        report["note"] = "The run was cancelled; the code was stopped."
+    else:
+        kept = ("No image was saved." if tool_name == "fig_inter"
+                else "Workspace variables keep the values they had before this call.")
+        report["note"] = (f"The code was stopped after exceeding its {'CPU' if reason == 'cpu_limit' else 'time'} "
+                          f"limit. {kept} Vectorise loops, work on a sample, "
+                          f"or pass a larger timeout (max {PYTHON_EXEC_MAX_TIMEOUT}s).")
+    return json.dumps(report, ensure_ascii=False)
+
+
+class CancelScope:
+    """
+    Cancellation handle shared between an async tool call and the thread running it
+    异步工具调用与执行它的线程之间共享的取消句柄
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.cancelled = False
+
+    def on_cancel(self, callback):
+        """Run callback on cancel (at once if already cancelled) / 取消时执行回调（若已取消则立即执行）"""
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+async def run_cancellable(func, *args):
+    """
+    Run a blocking tool body in a thread; cancelling the awaiting task stops its code
+    在线程中运行阻塞的工具主体；取消等待中的任务会中断其代码
+    """
+    cancel = CancelScope()
+    try:
+        return await asyncio.shield(asyncio.to_thread(func, *args, cancel=cancel))
+    except asyncio.CancelledError:
+        cancel.cancel()
+        raise
@@ -0,0 +1,336 @@
+"""
+Figure rendering for fig_inter: output profiles, downsampling plot helpers and render jobs
+fig_inter 的图表渲染：输出配置、降采样绘图辅助函数与渲染任务
+
+The render worker processes import this module, so it must not import graph.
+渲染工作进程会导入本模块，因此本模块不能导入 graph。
+"""
+import io
+import os
+import time
+import pickle
+
+import pandas as pd
+import numpy as np
+import matplotlib
+import matplotlib.collections
+import matplotlib.lines
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+from execution import code_cache, workspace_builtins
+from workers import replay_definitions
+
+# ============================================================================
+# FIGURE OUTPUT PROFILES
+# 图像输出配置
+# ============================================================================
+# Line and bar charts are small as SVG; dense plots are written as compressed
+# PNG or WebP at a chosen DPI, and artists above a point count are rasterized
+# so vector output stays light. A small PNG thumbnail is shown in the chat and
+# links to the full image.
+# 折线图和柱状图以 SVG 输出体积更小；密集图形按指定 DPI 输出为压缩 PNG 或 WebP，
+# 点数超过阈值的图元会被栅格化以保持矢量输出轻量。聊天界面显示小尺寸 PNG 缩略图，
+# 点击链接到完整图像。
+# ============================================================================
+
+FIG_FORMATS = ("auto", "svg", "png", "webp")
+FIG_DPI = int(os.getenv('FIG_DPI', '100'))
+FIG_SVG_MAX_POINTS = int(os.getenv('FIG_SVG_MAX_POINTS', '5000'))
+FIG_RASTERIZE_POINTS = int(os.getenv('FIG_RASTERIZE_POINTS', '2000'))
+FIG_THUMB_WIDTH = int(os.getenv('FIG_THUMB_WIDTH', '480'))
+FIG_RASTER_FORMAT = os.getenv('FIG_RASTER_FORMAT', 'png').lower()
+_SAVE_OPTIONS = {
+    "png": {"pil_kwargs": {"optimize": True, "compress_level": 9}},
+    "webp": {"pil_kwargs": {"quality": 85, "method": 6}},
+    "svg": {},
+}
+
+
+def output_profile(output_format: str = "auto", dpi: int = 0) -> dict:
+    """
+    Validated output settings for one fig_inter call
+    单次 fig_inter 调用经校验的输出设置
+
+    :raises ValueError: for an unknown format
+    """
+    output_format = (output_format or "auto").lower()
+    if output_format not in FIG_FORMATS:
+        raise ValueError(f"output_format must be one of {', '.join(FIG_FORMATS)}")
+    return {"format": output_format, "dpi": min(max(int(dpi or FIG_DPI), 50), 300),
+            "raster_format": FIG_RASTER_FORMAT if FIG_RASTER_FORMAT in ("png", "webp") else "png",
+            "svg_max_points": FIG_SVG_MAX_POINTS, "rasterize_points": FIG_RASTERIZE_POINTS,
+            "thumb_width": FIG_THUMB_WIDTH}
+
+
+def _artist_points(artist) -> int:
+    if isinstance(artist, matplotlib.lines.Line2D):
+        return len(artist.get_xdata())
+    if isinstance(artist, matplotlib.collections.QuadMesh):
+        return int(np.prod(artist.get_coordinates().shape[:2]))
+    if isinstance(artist, matplotlib.collections.Collection):
+        return max(len(artist.get_offsets()), len(artist.get_paths()))
+    return 1
+
+
+def prepare_figure(fig, profile: dict) -> tuple:
+    """
+    Rasterize heavy artists and pick the file format
+    栅格化点数过多的图元并选择文件格式
+
+    :return: (format, total points, rasterized artist count)
+    """
+    total, rasterized, has_image = 0, 0, False
+    for ax in fig.axes:
+        has_image = has_image or bool(ax.images)
+        for artist in [*ax.lines, *ax.collections]:
+            points = _artist_points(artist)
+            total += points
+            if points > profile["rasterize_points"] and not artist.get_rasterized():
+                artist.set_rasterized(True)
+                rasterized += 1
+    fmt = profile["format"]
+    if fmt == "auto":
+        vector = not has_image and total <= profile["svg_max_points"]
+        fmt = "svg" if vector else profile["raster_format"]
+    return fmt, total, rasterized
+
+
+def _figure_bytes(fig, fmt: str, dpi: float) -> bytes:
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight', **_SAVE_OPTIONS[fmt])
+    return buffer.getvalue()
+
+
+def save_figure(fig, profile: dict) -> dict:
+    """
+    Encode the image, plus a thumbnail when it is wider than thumb_width, as {suffix: bytes}
+    将图像（宽于 thumb_width 时另加缩略图）编码为 {后缀: 字节}
+    """
+    fmt, points, rasterized = prepare_figure(fig, profile)
+    images = {f".{fmt}": _figure_bytes(fig, fmt, profile["dpi"])}
+    width = fig.get_figwidth() * profile["dpi"]
+    if profile["thumb_width"] and width > profile["thumb_width"]:
+        images[".thumb.png"] = _figure_bytes(fig, "png", profile["dpi"] * profile["thumb_width"] / width)
+    return {"images": images, "format": fmt, "points": points, "rasterized": rasterized}
+
+# ============================================================================
+# PLOT DOWNSAMPLING HELPERS
+# 绘图降采样辅助函数
+# ============================================================================
+# fig_inter code gets a `fastplot` object whose line/scatter/hist methods
+# reduce large inputs before matplotlib sees them: LTTB or min/max decimation
+# for lines, hexbin or a fixed-seed random sample for scatter plots, and
+# histograms computed with numpy and drawn as a single step artist. Inputs at
+# or below FIG_DOWNSAMPLE_POINTS are drawn unchanged. Every reduction is
+# reported in the tool result.
+# fig_inter 代码中可使用 `fastplot` 对象，其 line/scatter/hist 方法在交给 matplotlib 之前
+# 缩减大数据：折线使用 LTTB 或最小/最大值抽取，散点使用 hexbin 或固定种子的随机抽样，
+# 直方图由 numpy 预先计算后绘制为单个阶梯图元。不超过 FIG_DOWNSAMPLE_POINTS 的输入
+# 原样绘制。每次缩减都会在工具结果中说明。
+# ============================================================================
+
+FIG_DOWNSAMPLE_POINTS = int(os.getenv('FIG_DOWNSAMPLE_POINTS', '20000'))
+FIG_LINE_POINTS = int(os.getenv('FIG_LINE_POINTS', '2000'))
+
+
+def _numeric_axis(values) -> np.ndarray:
+    """Float view of x values, datetimes as nanoseconds / x 值的浮点表示，日期时间按纳秒计"""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").view("int64").astype(float)
+    return values.astype(float)
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of n_out points that keep the visual shape
+    LTTB 算法：选出保持视觉形状的 n_out 个点的下标
+    """
+    x, y = _numeric_axis(x), np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket) / 下一个桶的平均点
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        if i + 2 < len(edges):
+            avg_x, avg_y = x[end:next_end].mean(), np.nanmean(y[end:next_end])
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        ax, ay = x[previous], y[previous]
+        areas = np.abs((ax - avg_x) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+        previous = start + int(np.nanargmax(areas)) if np.isfinite(areas).any() else start
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax_indices(y, n_out: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum of each of n_out/2 buckets, in order
+    将数据分为 n_out/2 个桶，按顺序返回每个桶最小值与最大值的下标
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    # Slots are kept for the end points and the partial last bucket / 为首尾两点及末尾不完整的桶预留位置
+    buckets = max(1, (n_out - 4) // 2)
+    if n <= n_out:
+        return np.arange(n)
+    size = n // buckets
+    body = y[:buckets * size].reshape(buckets, size)
+    filled = np.where(np.isnan(body), np.nanmean(y), body)
+    offsets = np.arange(buckets) * size
+    picks = [offsets + filled.argmin(axis=1), offsets + filled.argmax(axis=1), [0, n - 1]]
+    if buckets * size < n:
+        tail = np.arange(buckets * size, n)
+        picks.append(tail[[np.nanargmin(y[tail]), np.nanargmax(y[tail])]] if np.isfinite(y[tail]).any() else tail[:1])
+    return np.unique(np.concatenate(picks))
+
+
+class PlotHelpers:
+    """
+    Downsampling plot calls for fig_inter, exposed as `fastplot`; notes records what was reduced
+    fig_inter 中的降采样绘图方法，以 `fastplot` 提供；notes 记录缩减了哪些数据
+    """
+
+    def __init__(self, threshold: int = FIG_DOWNSAMPLE_POINTS, line_points: int = FIG_LINE_POINTS):
+        self.threshold = threshold
+        self.line_points = line_points
+        self.notes = []
+
+    @staticmethod
+    def _take(values, index):
+        return values.iloc[index] if isinstance(values, pd.Series) else np.asarray(values)[index]
+
+    def line(self, ax, x, y=None, method: str = "lttb", **kwargs):
+        """ax.plot(x, y) keeping the shape: method 'lttb' or 'minmax' / 保持形状的 ax.plot：method 可选 'lttb' 或 'minmax'"""
+        if y is None:
+            x, y = np.arange(len(x)), x
+        n = len(y)
+        if n > self.threshold:
+            index = minmax_indices(y, self.line_points) if method == "minmax" else lttb_indices(x, y, self.line_points)
+            x, y = self._take(x, index), self._take(y, index)
+            self.notes.append(f"line: {n:,} → {len(index):,} points ({'min/max' if method == 'minmax' else 'LTTB'})")
+        return ax.plot(x, y, **kwargs)
+
+    def scatter(self, ax, x, y, kind: str = "hexbin", gridsize: int = 80, sample: int = 0, **kwargs):
+        """
+        ax.scatter that bins (kind='hexbin') or samples (kind='sample') large inputs
+        对大数据分箱（kind='hexbin'）或抽样（kind='sample'）的 ax.scatter
+        """
+        n = len(x)
+        if n <= self.threshold:
+            return ax.scatter(x, y, **kwargs)
+        if kind == "sample":
+            size = sample or self.threshold
+            if size >= n:
+                return ax.scatter(x, y, **kwargs)
+            # Fixed seed: the same data gives the same picture / 固定种子：相同数据得到相同图像
+            index = np.sort(np.random.default_rng(0).choice(n, size=size, replace=False))
+            for key in ("c", "s"):
+                if key in kwargs and np.ndim(kwargs[key]) and len(kwargs[key]) == n:
+                    kwargs[key] = self._take(kwargs[key], index)
+            self.notes.append(f"scatter: random sample of {size:,} of {n:,} points")
+            return ax.scatter(self._take(x, index), self._take(y, index), **kwargs)
+        kwargs.pop("s", None)
+        kwargs.pop("alpha", None)
+        c = kwargs.pop("c", None)
+        dropped = [key for key in ("color", "marker") if kwargs.pop(key, None) is not None]
+        if c is not None and np.ndim(c) and len(c) == n:
+            # Per-point values colour each cell by their mean / 逐点数值按单元格均值着色
+            kwargs["C"] = np.asarray(c, dtype=float)
+            kwargs.setdefault("reduce_C_function", np.mean)
+            coloured = "mean of c per cell"
+        else:
+            if c is not None:
+                dropped.insert(0, "c")
+            kwargs.setdefault("bins", "log")
+            coloured = "density"
+        kwargs.setdefault("mincnt", 1)
+        kwargs.setdefault("cmap", "viridis")
+        self.notes.append(f"scatter: {n:,} points binned into a hexbin plot of {coloured} (gridsize {gridsize})"
+                          + (f"; ignored {', '.join(dropped)}" if dropped else ""))
+        return ax.hexbin(_numeric_axis(x), np.asarray(y, dtype=float), gridsize=gridsize, **kwargs)
+
+    def hist(self, ax, values, bins=50, range=None, density: bool = False, **kwargs):
+        """ax.hist computed with numpy first and drawn as one artist / 先用 numpy 计算再绘制为单个图元的 ax.hist"""
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        counts, edges = np.histogram(values, bins=bins, range=range, density=density)
+        if len(values) > self.threshold:
+            self.notes.append(f"hist: {len(values):,} values pre-aggregated into {len(counts)} bins")
+        kwargs.setdefault("fill", True)
+        return ax.stairs(counts, edges, **kwargs)
+
+
+# Names fig_inter code finds besides the workspace / fig_inter 代码在工作区之外可用的名称
+_FIG_LOCALS = ("plt", "pd", "sns", "fastplot")
+
+
+def fig_locals() -> dict:
+    return {"plt": plt, "pd": pd, "sns": sns, "fastplot": PlotHelpers()}
+
+
+def is_plot_object(value) -> bool:
+    return type(value).__module__.startswith(("matplotlib", "seaborn")) or isinstance(value, type(os))
+
+# ============================================================================
+# FIGURE RENDER JOBS
+# 图表渲染任务
+# ============================================================================
+# A fig_inter job runs in a fresh namespace holding the workspace builtins, the
+# values its code reads and the workspace definitions, and returns only the
+# encoded image. Nothing it assigns or changes goes back to the workspace, so
+# concurrent jobs never share pyplot or workspace state.
+# fig_inter 任务在全新的命名空间中运行，其中只有工作区内置名称、代码读取的变量和工作区定义，
+# 只返回编码后的图像。任务赋值或修改的内容都不会传回工作区，因此并发任务之间不会共享
+# pyplot 或工作区状态。
+# ============================================================================
+
+def figure_namespace(inputs: dict, definitions: dict) -> dict:
+    """
+    Namespace of a render job: {name: pickled value} inputs and {name: source} definitions
+    渲染任务的命名空间：{名称: pickle 值} 形式的输入与 {名称: 源码} 形式的定义
+    """
+    g = workspace_builtins()
+    for name, payload in inputs.items():
+        g[name] = pickle.loads(payload)
+    replay_definitions(g, definitions)
+    return g
+
+
+def draw(g: dict, py_code: str, fname: str, profile: dict) -> dict:
+    """
+    Run fig_inter code in g and encode the figure bound to fname; the caller closes the figures
+    在 g 中运行 fig_inter 代码并编码绑定到 fname 的图形；由调用方关闭图形
+
+    :return: {"saved": save_figure result plus "downsampled" notes, or None without a figure, "timings"}
+    """
+    timings = {}
+    started = time.perf_counter()
+    snippet, timings["cached"] = code_cache.compile(py_code, "<fig_inter>")
+    timings["compile"] = time.perf_counter() - started
+    local_vars = fig_locals()
+    helpers = local_vars["fastplot"]
+    started = time.perf_counter()
+    exec(snippet.code, g, local_vars)
+    timings["execute"] = time.perf_counter() - started
+    fig = local_vars.get(fname, None)
+    saved = save_figure(fig, profile) if fig else None
+    timings["render"] = time.perf_counter() - started - timings["execute"]
+    if saved:
+        saved["downsampled"] = helpers.notes
+    return {"saved": saved, "timings": timings}
+
+
+def render_figure(py_code: str, fname: str, inputs: dict, definitions: dict, profile: dict) -> dict:
+    """Render job of a fig_inter worker process; see draw / fig_inter 工作进程的渲染任务，参见 draw"""
+    try:
+        return draw(figure_namespace(inputs, definitions), py_code, fname, profile)
+    finally:
+        plt.close('all')
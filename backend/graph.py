@@ -1,25 +1,327 @@
 import os                    
+import re
+import time
+import logging
+import threading
+import warnings
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
 from dotenv import load_dotenv   
 from langchain_openai import ChatOpenAI       
 from langgraph.prebuilt import create_react_agent  
 from langchain_core.tools import tool         
+from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field          
 from langchain_tavily import TavilySearch     
 import pandas as pd          
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import pyarrow.csv as pa_csv
 import pymysql              
 import json                 
-from datetime import datetime  
+import hashlib
+from datetime import date, datetime  
 import matplotlib          
 import matplotlib.pyplot as plt  
 import seaborn as sns       
-from reportlab.lib.pagesizes import letter          
+from reportlab.lib.pagesizes import letter, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph  
+from reportlab.platypus import LongTable, Image, Spacer
 from reportlab.lib.styles import getSampleStyleSheet 
 from reportlab.lib import colors                     
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
 
 # Load environment variables / 加载环境变量
 load_dotenv(override=True)
 
+logger = logging.getLogger(__name__)
+
+# Local modules read their settings at import time, so they come after .env is loaded
+# 本地模块在导入时读取配置，因此须在加载 .env 之后导入
+from execution import (PYTHON_EXEC_TIMEOUT, PYTHON_EXEC_MAX_TIMEOUT, CancelScope,  # noqa: E402
+                       clamp_timeout, code_cache, code_names, format_bytes, interruption_report, log_timings,
+                       run_cancellable, run_code)
+from workers import WorkerPool, WorkerStopped  # noqa: E402
+from workspace import (Workspace, frame_nbytes, job_inputs, python_workers, run_python_in_worker,  # noqa: E402
+                       save_frame, thread_id_of, workspace_manager)
+from figures import FIG_DPI, draw, figure_namespace, is_plot_object, output_profile, render_figure  # noqa: E402
+
+# ============================================================================
+# MYSQL CONNECTION POOL
+# MySQL 连接池
+# ============================================================================
+# All SQL-touching tools borrow connections from one module-level pool instead
+# of rereading .env and opening a new socket on every call. Settings are read
+# once at import time; call reload_db_config() to pick up changes.
+# 所有访问数据库的工具共享同一个模块级连接池，而不是每次调用都重新读取 .env
+# 并新建连接。配置在导入时读取一次；调用 reload_db_config() 重新加载。
+# ============================================================================
+
+def load_db_config() -> dict:
+    """
+    Build pymysql connection arguments from environment variables
+    从环境变量构建 pymysql 连接参数
+    """
+    return {
+        "host": os.getenv('HOST'),
+        "user": os.getenv('USER'),
+        "passwd": os.getenv('MYSQL_PW'),
+        "db": os.getenv('DB_NAME'),
+        "port": int(os.getenv('MYSQL_PORT', '3306')),
+        "charset": 'utf8',
+        "autocommit": True,
+        "connect_timeout": int(os.getenv('MYSQL_CONNECT_TIMEOUT', '30')),
+        "read_timeout": int(os.getenv('MYSQL_READ_TIMEOUT', '60')),
+    }
+
+
+def load_pool_settings() -> dict:
+    """
+    Read connection pool tuning knobs from environment variables
+    从环境变量读取连接池调优参数
+    """
+    return {
+        "size": int(os.getenv('MYSQL_POOL_SIZE', '5')),
+        "max_idle": float(os.getenv('MYSQL_POOL_MAX_IDLE', '300')),
+        "max_lifetime": float(os.getenv('MYSQL_POOL_MAX_LIFETIME', '3600')),
+        "ping_after": float(os.getenv('MYSQL_POOL_PING_AFTER', '5')),
+        "timeout": float(os.getenv('MYSQL_POOL_TIMEOUT', '30')),
+    }
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time / 等待连接超时"""
+
+
+class _PoolEntry:
+    __slots__ = ("conn", "created", "last_used", "generation")
+
+    def __init__(self, conn, created, generation):
+        self.conn = conn
+        self.created = created
+        self.last_used = created
+        self.generation = generation
+
+
+class MySQLConnectionPool:
+    """
+    Thread-safe, bounded pool of pymysql connections
+    线程安全、有上限的 pymysql 连接池
+
+    - Size: at most ``size`` connections are open at once / 最多同时打开 size 个连接
+    - Health check: connections idle longer than ``ping_after`` seconds are pinged on checkout
+      健康检查：空闲超过 ping_after 秒的连接在借出时执行 ping
+    - Idle recycling: connections unused for ``max_idle`` seconds are closed
+      空闲回收：超过 max_idle 秒未使用的连接会被关闭
+    - Max lifetime: connections older than ``max_lifetime`` seconds are replaced
+      最大生命周期：存活超过 max_lifetime 秒的连接会被替换
+    """
+
+    def __init__(self, config: dict, size: int = 5, max_idle: float = 300,
+                 max_lifetime: float = 3600, ping_after: float = 5, timeout: float = 30):
+        self._config = dict(config)
+        self._cond = threading.Condition()
+        self._idle = deque()          # Most recently used at the right / 最近使用的在右侧
+        self._checked_out = {}        # id(conn) -> _PoolEntry
+        self._total = 0               # Open connections (idle + checked out) / 已打开连接数
+        self._generation = 0          # Bumped by reload() / reload() 时递增
+        self._stats = {"created": 0, "reused": 0, "recycled": 0, "failed_pings": 0}
+        self.configure(size=size, max_idle=max_idle, max_lifetime=max_lifetime,
+                       ping_after=ping_after, timeout=timeout)
+
+    def configure(self, size: int, max_idle: float, max_lifetime: float,
+                  ping_after: float, timeout: float) -> None:
+        """Update pool limits in place / 就地更新连接池限制"""
+        with self._cond:
+            self.size = max(1, size)
+            self.max_idle = max_idle
+            self.max_lifetime = max_lifetime
+            self.ping_after = ping_after
+            self.timeout = timeout
+            self._cond.notify_all()
+
+    def _is_stale(self, entry: _PoolEntry, now: float) -> bool:
+        return (entry.generation != self._generation
+                or now - entry.created > self.max_lifetime
+                or now - entry.last_used > self.max_idle)
+
+    def _reap_locked(self, now: float) -> list:
+        # Oldest idle connections sit at the left of the deque
+        # 最旧的空闲连接位于双端队列左侧
+        stale = []
+        while self._idle and self._is_stale(self._idle[0], now):
+            stale.append(self._idle.popleft().conn)
+            self._total -= 1
+            self._stats["recycled"] += 1
+        return stale
+
+    @staticmethod
+    def _close_quietly(connections) -> None:
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def acquire(self, timeout: float = None):
+        """
+        Check out a healthy connection, opening a new one if the pool has room
+        借出一个健康的连接，若池未满则新建连接
+        """
+        wait = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + wait
+        while True:
+            stale = []
+            entry = None
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    stale.extend(self._reap_locked(now))
+                    if self._idle:
+                        entry = self._idle.pop()
+                        if self._is_stale(entry, now):
+                            stale.append(entry.conn)
+                            self._total -= 1
+                            self._stats["recycled"] += 1
+                            entry = None
+                            continue
+                        break
+                    if self._total < self.size:
+                        self._total += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._close_quietly(stale)
+                        raise PoolTimeoutError(
+                            f"No MySQL connection available within {wait:.0f}s "
+                            f"(pool size {self.size})")
+                    self._cond.wait(remaining)
+                config = self._config
+                generation = self._generation
+            self._close_quietly(stale)
+
+            if entry is None:
+                try:
+                    conn = pymysql.connect(**config)
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                entry = _PoolEntry(conn, time.monotonic(), generation)
+                with self._cond:
+                    self._stats["created"] += 1
+            else:
+                if time.monotonic() - entry.last_used > self.ping_after:
+                    try:
+                        entry.conn.ping(reconnect=False)
+                    except Exception:
+                        self._close_quietly([entry.conn])
+                        with self._cond:
+                            self._total -= 1
+                            self._stats["failed_pings"] += 1
+                            self._cond.notify()
+                        continue
+                with self._cond:
+                    self._stats["reused"] += 1
+
+            with self._cond:
+                self._checked_out[id(entry.conn)] = entry
+            return entry.conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        """
+        Return a connection to the pool, or close it if it is broken or stale
+        归还连接；若连接已损坏或过期则关闭
+        """
+        with self._cond:
+            entry = self._checked_out.pop(id(conn), None)
+            now = time.monotonic()
+            if entry is None:
+                close = True
+            else:
+                close = discard or not conn.open or self._is_stale(entry, now)
+                if close:
+                    self._total -= 1
+                else:
+                    entry.last_used = now
+                    self._idle.append(entry)
+            self._cond.notify()
+        if close:
+            self._close_quietly([conn])
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """
+        Borrow a connection for the duration of a ``with`` block
+        在 with 代码块内借用一个连接
+
+        Connections that raised a connection-level error are discarded instead of reused.
+        发生连接级错误的连接会被丢弃而不是复用。
+        """
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def reload(self, config: dict = None) -> None:
+        """
+        Apply new connection settings; idle connections close now, busy ones on release
+        应用新的连接配置；空闲连接立即关闭，使用中的连接在归还时关闭
+        """
+        with self._cond:
+            if config is not None:
+                self._config = dict(config)
+            self._generation += 1
+            stale = [entry.conn for entry in self._idle]
+            self._total -= len(stale)
+            self._idle.clear()
+            self._cond.notify_all()
+        self._close_quietly(stale)
+
+    def close_all(self) -> None:
+        """Close every idle connection / 关闭所有空闲连接"""
+        self.reload()
+
+    @property
+    def database(self) -> str:
+        """Default database of pooled connections / 连接池连接的默认数据库"""
+        return self._config.get("db") or ""
+
+    def stats(self) -> dict:
+        """Pool counters for monitoring / 用于监控的连接池计数器"""
+        with self._cond:
+            return {**self._stats, "open": self._total, "idle": len(self._idle),
+                    "in_use": len(self._checked_out), "size": self.size}
+
+
+db_pool = MySQLConnectionPool(load_db_config(), **load_pool_settings())
+
+
+def reload_db_config() -> dict:
+    """
+    Re-read .env and apply new database and pool settings to the shared pool
+    重新读取 .env，并将新的数据库和连接池配置应用到共享连接池
+    """
+    load_dotenv(override=True)
+    config = load_db_config()
+    db_pool.configure(**load_pool_settings())
+    db_pool.reload(config)
+    return config
+
 # Create Tavily search tool / 创建Tavily搜索工具
 search_tool = TavilySearch(max_results=5, topic="general")
 
@@ -31,9 +333,483 @@ using pymysql to connect to the MySQL database.
 This function only handles SQL code execution and data querying. For data extraction, use the extract_data function.
 """
 
+# Default result budgets of sql_inter / sql_inter 的默认结果预算
+SQL_RESULT_MAX_ROWS = int(os.getenv('SQL_RESULT_MAX_ROWS', '500'))
+SQL_RESULT_MAX_BYTES = int(os.getenv('SQL_RESULT_MAX_BYTES', '65536'))
+
 # Define structured parameter model / 定义结构化参数模型
 class SQLQuerySchema(BaseModel):
     sql_query: str = Field(description=description)
+    max_rows: int = Field(
+        default=SQL_RESULT_MAX_ROWS,
+        description="Maximum number of rows to return; larger results are truncated / 返回的最大行数，超出部分会被截断",
+        ge=1,
+        le=100000
+    )
+    max_bytes: int = Field(
+        default=SQL_RESULT_MAX_BYTES,
+        description="Maximum size of the encoded result in bytes / 编码后结果的最大字节数",
+        ge=1024,
+        le=16 * 1024 * 1024
+    )
+    use_cache: bool = Field(
+        default=True,
+        description="Serve repeated read-only queries from the result cache; set false for volatile data / 对重复的只读查询使用结果缓存；易变数据请设为 false"
+    )
+    count_total: bool = Field(
+        default=False,
+        description="When the result is truncated, run the query again as COUNT(*) to report total_rows; doubles the cost of expensive queries / 结果被截断时再以 COUNT(*) 执行一次查询以给出 total_rows；会使昂贵查询的开销翻倍"
+    )
+
+# ============================================================================
+# STREAMING RESULT ENCODING
+# 流式结果编码
+# ============================================================================
+# Rows are pulled from an unbuffered server-side cursor (SSCursor) in small
+# batches and encoded one at a time, so a careless SELECT * never materializes
+# the whole result in backend memory. Output is columnar: column names once,
+# then compact row arrays.
+# 通过非缓冲服务端游标 (SSCursor) 分批拉取并逐行编码，避免一次性将整个结果集
+# 加载到后端内存。输出为列式：列名只出现一次，随后是紧凑的行数组。
+# ============================================================================
+
+SQL_FETCH_BATCH = 256
+
+def _strip_sql(sql_query: str) -> str:
+    """Trim whitespace and trailing semicolons / 去除首尾空白和结尾分号"""
+    return sql_query.strip().rstrip(';').strip()
+
+
+def _is_select(sql_query: str) -> bool:
+    """True for statements that can be wrapped in a COUNT(*) subquery / 是否可包装为 COUNT(*) 子查询"""
+    return statement_verb(sql_query) == 'select'
+
+
+def _count_rows(sql_query: str):
+    """
+    Count the rows a SELECT would return without transferring them
+    在不传输数据的情况下统计 SELECT 结果的总行数
+    """
+    try:
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) FROM ({_strip_sql(sql_query)}) AS _counted")
+                return cursor.fetchone()[0]
+    except Exception as e:
+        logger.debug("Row count for truncated result failed: %s", e)
+        return None
+
+
+def _encode_row(row) -> str:
+    return json.dumps(list(row), ensure_ascii=False, default=str, separators=(',', ':'))
+
+
+def stream_query(sql_query: str, max_rows: int, max_bytes: int, count_total: bool = False) -> str:
+    """
+    Execute a query on a server-side cursor and encode at most ``max_rows`` rows /
+    ``max_bytes`` bytes as compact columnar JSON
+    在服务端游标上执行查询，最多编码 max_rows 行 / max_bytes 字节的紧凑列式 JSON
+
+    Result shape / 结果结构:
+        {"columns": [...], "rows": [[...], ...], "row_count": n,
+         "truncated": bool, "total_rows": N}
+
+    When a budget is hit the remaining rows are never read: the connection is
+    closed instead of drained. "total_rows" is then null unless ``count_total``
+    asks for a COUNT(*) query, which runs the user query a second time.
+    达到预算后不再读取剩余行：直接关闭连接而不是读完结果。此时 "total_rows" 为 null，
+    除非 count_total 要求执行 COUNT(*) 查询（会再次执行用户查询）。
+    """
+    connection = db_pool.acquire()
+    discard = False
+    try:
+        cursor = connection.cursor(pymysql.cursors.SSCursor)
+        cursor.execute(sql_query)
+
+        # Statements without a result set (INSERT/UPDATE/DDL)
+        # 无结果集的语句（INSERT/UPDATE/DDL）
+        if cursor.description is None:
+            affected = cursor.rowcount
+            cursor.close()
+            return json.dumps({"affected_rows": affected}, ensure_ascii=False)
+
+        columns = [d[0] for d in cursor.description]
+        header = json.dumps(columns, ensure_ascii=False, separators=(',', ':'))
+        encoded = []
+        size = len(header.encode('utf-8'))
+        truncated_by = None
+
+        while truncated_by is None:
+            batch = cursor.fetchmany(SQL_FETCH_BATCH)
+            if not batch:
+                break
+            for row in batch:
+                if len(encoded) >= max_rows:
+                    truncated_by = "max_rows"
+                    break
+                text = _encode_row(row)
+                row_size = len(text.encode('utf-8')) + 1
+                if size + row_size > max_bytes:
+                    truncated_by = "max_bytes"
+                    break
+                encoded.append(text)
+                size += row_size
+
+        if truncated_by is None:
+            cursor.close()
+            total_rows = len(encoded)
+        else:
+            # Abandon the unread remainder instead of draining it over the wire;
+            # detaching the cursor stops it from draining on garbage collection
+            # 放弃未读取的剩余数据而不是通过网络读完；解除游标关联以免回收时再读取
+            discard = True
+            connection.close()
+            cursor.connection = None
+            if count_total and _is_select(sql_query):
+                total_rows = _count_rows(sql_query)
+            else:
+                total_rows = None
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+        discard = True
+        raise
+    finally:
+        db_pool.release(connection, discard=discard)
+
+    parts = [
+        '{"columns":', header,
+        ',"rows":[', ','.join(encoded), ']',
+        f',"row_count":{len(encoded)}',
+        f',"truncated":{"true" if truncated_by else "false"}',
+        f',"total_rows":{"null" if total_rows is None else total_rows}',
+    ]
+    if truncated_by:
+        note = (f"Result truncated by {truncated_by} after {len(encoded)} rows"
+                + (". " if total_rows is not None else f"; the full result has more than {len(encoded)} rows "
+                   "(pass count_total=true to count them). ")
+                + "Narrow the query with WHERE/LIMIT or aggregate it, or use extract_data for full tables.")
+        parts += [f',"truncated_by":"{truncated_by}"', ',"note":', json.dumps(note)]
+    parts.append('}')
+    return ''.join(parts)
+
+# ============================================================================
+# SQL RESULT CACHE
+# SQL 结果缓存
+# ============================================================================
+# Repeated read-only queries (including schema probes such as SHOW TABLES or
+# DESCRIBE x) are answered from memory. Entries are keyed by the normalized SQL
+# text plus the target database and result budget, expire after a TTL, are
+# evicted LRU-first under a memory cap and are dropped when a write through
+# sql_inter touches one of their tables.
+# 重复的只读查询（包括 SHOW TABLES、DESCRIBE x 等结构探测）直接从内存返回。
+# 缓存键为规范化 SQL 文本 + 目标数据库 + 结果预算；条目按 TTL 过期，超出内存上限
+# 时按 LRU 淘汰，并在 sql_inter 写入相关表时失效。
+# ============================================================================
+
+_SQL_LITERAL = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+# Identifiers (optionally schema-qualified), parentheses, commas and single other characters
+# 标识符（可带库名）、括号、逗号及其他单个字符
+_SQL_TOKEN = re.compile(r"(?:`[^`]*`|[\w$]+)(?:\s*\.\s*(?:`[^`]*`|[\w$]+))*|\S")
+# Keywords after which table names follow; FROM, UPDATE and TABLE(S) take comma-separated lists
+# 其后跟随表名的关键字；FROM、UPDATE 和 TABLE(S) 后可跟逗号分隔的表列表
+_SQL_TABLE_KEYWORDS = ('from', 'join', 'straight_join', 'into', 'update', 'table', 'tables',
+                       'describe', 'desc', 'explain')
+_SQL_TABLE_LISTS = ('from', 'update', 'table', 'tables')
+# Keywords that end a FROM/UPDATE table list / 结束 FROM/UPDATE 表列表的关键字
+_SQL_CLAUSE_END = frozenset('where group having order limit union except intersect window for lock into set '
+                            'returning values select'.split())
+# Reserved words that end a table list or can't be an alias / 结束表列表或不能作为别名的保留字
+_SQL_RESERVED = frozenset(
+    'select from where group order having limit on using join inner left right outer cross natural '
+    'straight_join set union except intersect window for lock into values value as with lateral '
+    'if not exists partition use force ignore key index returning table tables like'.split())
+_SQL_VOLATILE = re.compile(
+    r"\b(?:now|sysdate|curdate|curtime|current_date|current_time|current_timestamp|"
+    r"utc_date|utc_time|utc_timestamp|unix_timestamp|rand|uuid|uuid_short|"
+    r"last_insert_id|found_rows|row_count|connection_id|sleep|get_lock)\s*\(",
+    re.IGNORECASE)
+_SQL_READ_ONLY = ('select', 'show', 'describe', 'desc', 'explain')
+_SQL_DDL = ('create', 'alter', 'drop', 'rename', 'truncate')
+# Pseudo-table of results that read no table (SHOW TABLES, SHOW DATABASES, ...), flushed by any DDL
+# 不读取任何表的结果（SHOW TABLES、SHOW DATABASES 等）所属的伪表，任何 DDL 都会使其失效
+_SQL_NO_TABLE = ""
+
+
+def normalize_sql(sql_query: str) -> str:
+    """
+    Collapse whitespace outside string literals and quoted identifiers
+    折叠字符串字面量和引号标识符之外的空白
+
+    Case is preserved because MySQL table names can be case sensitive.
+    保留大小写，因为 MySQL 表名可能区分大小写。
+    """
+    parts = _SQL_LITERAL.split(_strip_sql(sql_query))
+    return ''.join(part if i % 2 else re.sub(r'\s+', ' ', part) for i, part in enumerate(parts)).strip()
+
+
+def mask_sql_literals(sql_query: str) -> str:
+    """
+    Replace string literals with '' (keeping quoted identifiers) so keyword scans ignore them
+    将字符串字面量替换为 ''（保留引号标识符），使关键字扫描忽略其内容
+    """
+    masked = _SQL_LITERAL.sub(lambda m: m.group(0) if m.group(0).startswith('`') else "''", sql_query)
+    return ' '.join(masked.split())
+
+
+def _sql_tokens(sql_query: str) -> list:
+    return _SQL_TOKEN.findall(mask_sql_literals(_strip_sql(sql_query)))
+
+
+def _skip_parens(tokens: list, i: int) -> int:
+    """Index just past the parenthesis group opening at tokens[i] / tokens[i] 处括号组之后的位置"""
+    depth = 0
+    for j in range(i, len(tokens)):
+        depth += {'(': 1, ')': -1}.get(tokens[j], 0)
+        if depth == 0:
+            return j + 1
+    return len(tokens)
+
+
+def _is_name(token: str) -> bool:
+    return token[:1] == '`' or ((token[:1].isalnum() or token[:1] in '_$') and token.lower() not in _SQL_RESERVED)
+
+
+def _cte_end(tokens: list) -> tuple:
+    """
+    Skip a leading WITH [RECURSIVE] name [(cols)] AS (...), ... clause
+    跳过开头的 WITH [RECURSIVE] name [(cols)] AS (...), ... 子句
+
+    :return: (index of the statement verb, CTE names)
+    """
+    names, i = set(), 0
+    while i < len(tokens) and tokens[i] == '(':
+        i += 1
+    if i >= len(tokens) or tokens[i].lower() != 'with':
+        return i, names
+    i += 1
+    if i < len(tokens) and tokens[i].lower() == 'recursive':
+        i += 1
+    while i < len(tokens):
+        names.add(tokens[i].strip('`').lower())
+        i += 1
+        if i < len(tokens) and tokens[i] == '(':
+            i = _skip_parens(tokens, i)
+        if i < len(tokens) and tokens[i].lower() == 'as':
+            i += 1
+        if i < len(tokens) and tokens[i] == '(':
+            i = _skip_parens(tokens, i)
+        if i < len(tokens) and tokens[i] == ',':
+            i += 1
+            continue
+        break
+    while i < len(tokens) and tokens[i] == '(':
+        i += 1
+    return i, names
+
+
+def statement_verb(sql_query: str) -> str:
+    """
+    First top-level keyword of a statement, after any WITH clause ('select', 'delete', ...)
+    语句的第一个顶层关键字，跳过 WITH 子句（'select'、'delete' 等）
+    """
+    tokens = _sql_tokens(sql_query)
+    i, _ = _cte_end(tokens)
+    return tokens[i].lower() if i < len(tokens) else ''
+
+
+def sql_table_refs(sql_query: str) -> tuple:
+    """
+    Referenced tables as lower-cased (schema, table) pairs, including every entry of
+    comma-separated FROM/UPDATE lists; CTE names are left out
+    以小写 (库名, 表名) 对返回引用的表，包括 FROM/UPDATE 逗号列表中的每一项；不含 CTE 名称
+
+    :return: (set of (schema or "", table), complete) where complete is False when a
+             table source could not be named (table functions such as JSON_TABLE)
+             (表集合, 是否完整)；存在无法识别名称的表来源（如 JSON_TABLE 等表函数）时为 False
+    """
+    tokens = _sql_tokens(sql_query)
+    lower = [t.lower() for t in tokens]
+    _, ctes = _cte_end(tokens)
+    refs, complete = set(), True
+    for i, word in enumerate(lower):
+        if word not in _SQL_TABLE_KEYWORDS:
+            continue
+        j, expect_table = i + 1, True
+        while j < len(tokens) and lower[j] in ('if', 'not', 'exists'):
+            j += 1
+        while j < len(tokens):
+            if expect_table and _is_name(tokens[j]):
+                if word in ('from', 'join', 'straight_join') and j + 1 < len(tokens) and tokens[j + 1] == '(':
+                    complete = False  # Table function, not a table / 表函数而非表
+                else:
+                    parts = [p.strip('`').lower() for p in re.split(r'\s*\.\s*', tokens[j])]
+                    refs.add(("" if len(parts) == 1 else parts[-2], parts[-1]))
+            elif tokens[j] == '(':
+                # Derived tables and ON/hint groups; nested FROM clauses are visited by the outer loop
+                # 派生表及 ON/索引提示中的括号；内部的 FROM 子句由外层循环处理
+                j, expect_table = _skip_parens(tokens, j), False
+                continue
+            if word not in _SQL_TABLE_LISTS or tokens[j] in (')', ';') or lower[j] in _SQL_CLAUSE_END:
+                break
+            # Any top-level comma of the clause starts the next table, even after JOIN ... ON
+            # 子句中任何顶层逗号都开始下一个表，即使位于 JOIN ... ON 之后
+            expect_table = tokens[j] == ','
+            j += 1
+    return {(schema, table) for schema, table in refs if schema or table not in ctes}, complete
+
+
+def sql_tables(sql_query: str) -> set:
+    """
+    Extract referenced table names (lower-cased, schema and quotes removed); CTE names are left out
+    提取引用的表名（小写，去除库名和引号）；不含 CTE 名称
+    """
+    return {table for _, table in sql_table_refs(sql_query)[0]}
+
+
+def is_read_only_sql(sql_query: str) -> bool:
+    """
+    True when the statement's verb after any WITH clause is SELECT/SHOW/DESCRIBE/EXPLAIN
+    WITH 子句之后的语句关键字为 SELECT/SHOW/DESCRIBE/EXPLAIN 时为只读语句
+    """
+    return statement_verb(sql_query) in _SQL_READ_ONLY
+
+
+class QueryResultCache:
+    """
+    Thread-safe TTL + LRU cache of encoded query results with per-table invalidation
+    线程安全的查询结果缓存：TTL 过期 + LRU 淘汰 + 按表失效
+    """
+
+    def __init__(self, ttl: float = 300, max_bytes: int = 64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()       # key -> (payload, tables, expires_at, size)
+        self._by_table = defaultdict(set)   # table -> {key, ...}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def _drop_locked(self, key) -> None:
+        payload, tables, _, size = self._entries.pop(key)
+        self._size -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def get(self, key):
+        """Return the cached payload or None / 返回缓存结果或 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[2] < time.monotonic():
+                self._drop_locked(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, payload: str, tables: set) -> None:
+        """Store a payload, evicting least recently used entries over the cap / 写入缓存并按 LRU 淘汰"""
+        size = len(payload.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop_locked(key)
+            self._entries[key] = (payload, frozenset(tables), time.monotonic() + self.ttl, size)
+            self._size += size
+            for table in tables:
+                self._by_table[table].add(key)
+            while self._size > self.max_bytes and self._entries:
+                self._drop_locked(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate_tables(self, tables) -> int:
+        """Drop every entry that reads one of ``tables`` / 删除读取这些表的所有条目"""
+        dropped = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.get(table.lower(), ())):
+                    if key in self._entries:
+                        self._drop_locked(key)
+                        dropped += 1
+            self._stats["invalidations"] += dropped
+        return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters and memory usage / 命中/未命中计数和内存占用"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {**self._stats,
+                    "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                    "entries": len(self._entries), "bytes": self._size}
+
+
+sql_result_cache = QueryResultCache(
+    ttl=float(os.getenv('SQL_CACHE_TTL', '300')),
+    max_bytes=int(float(os.getenv('SQL_CACHE_MAX_MB', '64')) * 1024 * 1024),
+)
+
+
+def cached_query(sql_query: str, max_rows: int, max_bytes: int, use_cache: bool = True,
+                 count_total: bool = False) -> str:
+    """
+    Run ``stream_query`` through the result cache
+    通过结果缓存执行 stream_query
+
+    Volatile queries (NOW(), RAND(), ...) and writes are never cached; writes
+    invalidate cached results of the tables they touch.
+    易变查询（NOW()、RAND() 等）和写操作不会被缓存；写操作会使相关表的缓存失效。
+    """
+    read_only = is_read_only_sql(sql_query)
+    cacheable = use_cache and read_only and not _SQL_VOLATILE.search(sql_query)
+    if cacheable:
+        key = (normalize_sql(sql_query), db_pool.database, max_rows, max_bytes, count_total)
+        payload = sql_result_cache.get(key)
+        if payload is not None:
+            return payload[:-1] + ',"cached":true}'
+
+    payload = stream_query(sql_query, max_rows, max_bytes, count_total)
+
+    if not read_only:
+        tables = sql_tables(sql_query)
+        if not tables:
+            # A write whose tables are unknown (CALL, ...) may touch anything / 无法识别表的写操作（CALL 等）可能影响任何表
+            sql_result_cache.clear()
+        elif statement_verb(sql_query) in _SQL_DDL:
+            sql_result_cache.invalidate_tables(tables | {_SQL_NO_TABLE})
+        else:
+            sql_result_cache.invalidate_tables(tables)
+        if statement_verb(sql_query) in _SQL_DDL:
+            schema_catalog_cache.invalidate()
+    elif cacheable and payload.startswith('{"columns"'):
+        sql_result_cache.put(key, payload, sql_tables(sql_query) or {_SQL_NO_TABLE})
+    return payload
+
+
+def cache_stats() -> dict:
+    """
+    Counters of the backend caches and the connection pool, for operators
+    后端各缓存及连接池的计数器，供运维查看
+    """
+    return {"sql_result_cache": sql_result_cache.stats(), "schema_catalog": schema_catalog_cache.stats(),
+            "extract_cache": extract_cache.stats(), "db_pool": db_pool.stats(),
+            "workspaces": workspace_manager.stats(), "python_workers": python_workers.stats(),
+            "code_cache": code_cache.stats(), "render_pool": render_pool.stats(),
+            "figure_store": figure_store.stats(), "export_jobs": export_jobs.stats(),
+            "profile_cache": profile_cache.stats()}
 
 # ============================================================================
 # SQL QUERY EXECUTION TOOL IMPLEMENTATION
@@ -41,7 +817,8 @@ class SQLQuerySchema(BaseModel):
 # ============================================================================
 
 @tool(args_schema=SQLQuerySchema)
-def sql_inter(sql_query: str) -> str:
+def sql_inter(sql_query: str, max_rows: int = SQL_RESULT_MAX_ROWS, max_bytes: int = SQL_RESULT_MAX_BYTES,
+              use_cache: bool = True, count_total: bool = False) -> str:
     """
     High-performance SQL query execution tool for database interaction
     高性能 SQL 查询执行工具，用于数据库交互
@@ -57,88 +834,70 @@ def sql_inter(sql_query: str) -> str:
     SECURITY FEATURES / 安全特性:
     - Environment-based configuration (no hardcoded credentials)
     - 基于环境的配置（无硬编码凭据）
-    - Automatic connection cleanup and resource management
-    - 自动连接清理和资源管理
+    - Connections are returned to the shared pool, broken ones are discarded
+    - 连接归还到共享连接池，损坏的连接会被丢弃
     - UTF-8 encoding support for international data
     - UTF-8 编码支持国际化数据
     
     PERFORMANCE OPTIMIZATIONS / 性能优化:
-    - Connection pooling through environment configuration
-    - 通过环境配置的连接池
-    - Efficient result formatting as JSON for downstream processing
-    - 高效的结果格式化为 JSON 供下游处理
-    - Minimal memory footprint with cursor-based operations
-    - 基于游标操作的最小内存占用
+    - Shared connection pool (db_pool) with health checks and recycling
+    - 带健康检查和回收机制的共享连接池 (db_pool)
+    - Unbuffered server-side cursor: rows are streamed, never fetched all at once
+    - 非缓冲服务端游标：逐批流式读取，不会一次性获取全部结果
+    - Row and byte budgets with compact columnar JSON output
+    - 行数和字节预算，输出紧凑的列式 JSON
+    - TTL/LRU result cache for repeated read-only queries ("cached": true on hits)
+    - 重复只读查询的 TTL/LRU 结果缓存（命中时返回 "cached": true）
     
     DATA FLOW / 数据流:
-    SQL Query Input → MySQL Execution → Result Processing → JSON Output
-    SQL 查询输入 → MySQL 执行 → 结果处理 → JSON 输出
+    SQL Query Input → MySQL Execution → Streaming Encode (budgeted) → JSON Output
+    SQL 查询输入 → MySQL 执行 → 流式编码（受预算限制） → JSON 输出
     
     :param sql_query: Well-formed SQL query string for database execution
                      用于数据库执行的良好格式化 SQL 查询字符串
     :type sql_query: str
     
-    :return: JSON-formatted query results or error message
-             JSON 格式的查询结果或错误信息
+    :param max_rows: Maximum number of rows to return / 返回的最大行数
+    :type max_rows: int
+    
+    :param max_bytes: Maximum size of the encoded result / 编码结果的最大字节数
+    :type max_bytes: int
+    
+    :param use_cache: Allow serving the result from cache / 是否允许使用缓存结果
+    :type use_cache: bool
+    
+    :param count_total: Count the full result with COUNT(*) when truncated / 截断时用 COUNT(*) 统计完整结果行数
+    :type count_total: bool
+    
+    :return: Columnar JSON query results or error message. If "truncated" is true,
+             "total_rows" tells how many rows the full query returns (null unless count_total).
+             列式 JSON 查询结果或错误信息。若 "truncated" 为 true，"total_rows" 给出完整结果行数（仅当 count_total 时）。
     :rtype: str
     
     :raises: Connection errors, SQL syntax errors, timeout exceptions
              连接错误、SQL 语法错误、超时异常
     
     Example Usage / 使用示例:
-        result = sql_inter("SELECT * FROM customers LIMIT 10")
-        # Returns: '[{"id": 1, "name": "John", ...}, ...]'
+        result = sql_inter("SELECT id, name FROM customers LIMIT 10")
+        # Returns: '{"columns":["id","name"],"rows":[[1,"John"],...],"row_count":10,
+        #            "truncated":false,"total_rows":10}'
     """
 
-    load_dotenv(override=True)
-    
-    host = os.getenv('HOST')           
-    user = os.getenv('USER')           
-    mysql_pw = os.getenv('MYSQL_PW')   
-    db = os.getenv('DB_NAME')          
-    port = os.getenv('MYSQL_PORT')           
-    
-    connection = pymysql.connect(
-        host=host,                    
-        user=user,                    
-        passwd=mysql_pw,              
-        db=db,                        
-        port=int(port),               
-        charset='utf8',               
-        autocommit=True,              
-        connect_timeout=30,           
-        read_timeout=60               
-    )
-    
     # =======================================================================
     # SAFE SQL EXECUTION WITH RESOURCE MANAGEMENT
     # 安全 SQL 执行和资源管理
     # =======================================================================
     
     try:
-        # Use context manager for automatic cursor cleanup
-        # 使用上下文管理器进行自动游标清理
-        # This ensures proper resource disposal even on exceptions
-        # 这确保即使在异常情况下也能正确释放资源
-        with connection.cursor() as cursor:
-            # Execute the SQL query with built-in error handling
-            # 执行 SQL 查询，内置错误处理
-            cursor.execute(sql_query)
-            
-            # Fetch all results efficiently into memory
-            # 高效地将所有结果获取到内存中
-            # For large datasets, consider using fetchmany() for memory optimization
-            # 对于大型数据集，考虑使用 fetchmany() 进行内存优化
-            results = cursor.fetchall()
-            
-            # Optional success logging - useful for debugging
-            # 可选的成功日志 - 用于调试很有用
-            # print("SQL query executed successfully, organizing results... / SQL 查询已成功执行，正在整理结果...")
+        # Stream rows from a pooled connection within the row/byte budget;
+        # the connection is returned (or discarded if broken) even on exceptions
+        # 在行数/字节预算内从连接池连接流式读取；即使发生异常也会归还（或丢弃）连接
+        return cached_query(sql_query, max_rows, max_bytes, use_cache, count_total)
             
     except pymysql.Error as e:
         # Handle MySQL-specific errors with detailed information
         # 处理 MySQL 特定错误，提供详细信息
-        error_msg = f"MySQL Error {e.args[0]}: {e.args[1]}"
+        error_msg = f"MySQL Error {e.args[0]}: {e.args[1]}" if len(e.args) > 1 else f"MySQL Error: {e}"
         return json.dumps({"error": error_msg, "query": sql_query}, ensure_ascii=False)
     
     except Exception as e:
@@ -146,21 +905,256 @@ def sql_inter(sql_query: str) -> str:
         # 处理一般异常，提供上下文
         error_msg = f"Query execution failed: {str(e)}"
         return json.dumps({"error": error_msg, "query": sql_query}, ensure_ascii=False)
-    
-    finally:
-        # Ensure connection is always closed to prevent resource leaks
-        # 确保连接始终关闭，防止资源泄漏
-        # This runs regardless of success or failure
-        # 无论成功或失败都会运行
-        if 'connection' in locals() and connection.open:
-            connection.close()
 
-    return json.dumps(
-        results, 
-        ensure_ascii=False,   
-        default=str,           
-        indent=2                
+# ============================================================================
+# SCHEMA CATALOG TOOL
+# 数据库结构目录工具
+# ============================================================================
+# Builds tables, columns, types, indexes, approximate row counts and a few
+# sample values in bulk from INFORMATION_SCHEMA, so the agent learns the schema
+# in one call instead of several SHOW TABLES / DESCRIBE / LIMIT 5 round-trips.
+# The catalog is cached in memory and rebuilt after SCHEMA_CATALOG_TTL seconds.
+# 从 INFORMATION_SCHEMA 批量构建表、列、类型、索引、近似行数和少量样本值，
+# 使代理一次调用即可了解数据库结构，而无需多次 SHOW TABLES / DESCRIBE / LIMIT 5。
+# 目录缓存在内存中，SCHEMA_CATALOG_TTL 秒后重建。
+# ============================================================================
+
+class SchemaCatalog:
+    """
+    In-memory cache of the database schema with a refresh interval
+    带刷新间隔的数据库结构内存缓存
+    """
+
+    def __init__(self, ttl: float = 600, sample_rows: int = 3, sample_tables: int = 50):
+        self.ttl = ttl
+        self.sample_rows = sample_rows
+        self.sample_tables = sample_tables
+        self._catalog = None
+        self._built_at = 0.0
+        self._build_seconds = 0.0
+        self._building = False   # single flight: one rebuild at a time / 单飞：同一时间只有一个重建
+        self._generation = 0     # bumped by invalidate() / invalidate() 时递增
+        self._lock = threading.Condition()
+        self._stats = {"builds": 0, "hits": 0, "waits": 0}
+
+    def invalidate(self) -> None:
+        """Force a rebuild on next access / 下次访问时强制重建"""
+        with self._lock:
+            self._catalog = None
+            self._generation += 1
+
+    def get(self, refresh: bool = False) -> dict:
+        """
+        Return the cached catalog, rebuilding it when stale
+        返回缓存目录，过期时重建
+
+        The INFORMATION_SCHEMA round trips run outside the lock; concurrent callers
+        wait for the rebuild in flight instead of starting their own.
+        INFORMATION_SCHEMA 查询在锁外执行；并发调用者等待进行中的重建，而不是各自重建。
+        """
+        with self._lock:
+            while True:
+                fresh = self._catalog is not None and time.monotonic() - self._built_at < self.ttl
+                if fresh and not refresh:
+                    self._stats["hits"] += 1
+                    return self._catalog
+                if not self._building:
+                    break
+                # Another caller is rebuilding; its result satisfies refresh too / 其他调用者正在重建，其结果同样满足 refresh
+                self._stats["waits"] += 1
+                self._lock.wait()
+                refresh = False
+            self._building = True
+            generation = self._generation
+        started = time.monotonic()
+        try:
+            catalog = self._build()
+        finally:
+            with self._lock:
+                self._building = False
+                self._lock.notify_all()
+        with self._lock:
+            # A DDL during the build may have made this result stale: return it but don't keep it
+            # 构建期间的 DDL 可能使结果过期：返回但不缓存
+            if generation == self._generation:
+                self._catalog = catalog
+                self._built_at = time.monotonic()
+                self._build_seconds = self._built_at - started
+            self._stats["builds"] += 1
+        return catalog
+
+    def age(self) -> float:
+        """Seconds since the catalog was built / 距离上次构建的秒数"""
+        return time.monotonic() - self._built_at
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "tables": len(self._catalog["tables"]) if self._catalog else 0,
+                    "build_seconds": round(self._build_seconds, 3)}
+
+    def _build(self) -> dict:
+        database = db_pool.database
+        tables = OrderedDict()
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT TABLE_NAME, TABLE_TYPE, TABLE_ROWS, DATA_LENGTH + INDEX_LENGTH, TABLE_COMMENT "
+                    "FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME",
+                    (database,))
+                for name, table_type, rows, size, comment in cursor.fetchall():
+                    tables[name] = {"type": "view" if table_type == "VIEW" else "table",
+                                    "rows": rows, "bytes": size, "comment": comment or "",
+                                    "columns": [], "indexes": [], "samples": {}}
+
+                cursor.execute(
+                    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY "
+                    "FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = %s "
+                    "ORDER BY TABLE_NAME, ORDINAL_POSITION",
+                    (database,))
+                for table, column, column_type, nullable, key in cursor.fetchall():
+                    if table in tables:
+                        tables[table]["columns"].append(
+                            {"name": column, "type": column_type, "nullable": nullable == "YES", "key": key or ""})
+
+                cursor.execute(
+                    "SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, "
+                    "GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX SEPARATOR ',') "
+                    "FROM INFORMATION_SCHEMA.STATISTICS WHERE TABLE_SCHEMA = %s "
+                    "GROUP BY TABLE_NAME, INDEX_NAME, NON_UNIQUE ORDER BY TABLE_NAME, INDEX_NAME",
+                    (database,))
+                for table, index, non_unique, columns in cursor.fetchall():
+                    if table in tables:
+                        tables[table]["indexes"].append(
+                            {"name": index, "unique": not non_unique, "columns": columns.split(',')})
+
+                # A few sample values per column; one cheap LIMIT query per table
+                # 每列少量样本值；每个表一次低成本的 LIMIT 查询
+                if self.sample_rows > 0:
+                    # Views are skipped: a LIMIT over a view can still run its full query
+                    # 跳过视图：对视图执行 LIMIT 仍可能运行其完整查询
+                    base_tables = [t for t, info in tables.items() if info["type"] == "table"]
+                    for table in base_tables[:self.sample_tables]:
+                        try:
+                            cursor.execute(f"SELECT * FROM `{table.replace('`', '``')}` LIMIT {self.sample_rows}")
+                            names = [d[0] for d in cursor.description]
+                            rows = cursor.fetchall()
+                        except pymysql.Error as e:
+                            logger.debug("Sampling %s failed: %s", table, e)
+                            continue
+                        for i, name in enumerate(names):
+                            values = []
+                            for row in rows:
+                                value = row[i]
+                                if value is None:
+                                    continue
+                                text = str(value)
+                                text = text if len(text) <= 30 else text[:27] + "..."
+                                if text not in values:
+                                    values.append(text)
+                            tables[table]["samples"][name] = values
+        return {"database": database, "tables": tables}
+
+
+schema_catalog_cache = SchemaCatalog(
+    ttl=float(os.getenv('SCHEMA_CATALOG_TTL', '600')),
+    sample_rows=int(os.getenv('SCHEMA_SAMPLE_ROWS', '3')),
+    sample_tables=int(os.getenv('SCHEMA_SAMPLE_TABLES', '50')),
+)
+
+
+SCHEMA_CATALOG_MAX_CHARS = int(os.getenv('SCHEMA_CATALOG_MAX_CHARS', '30000'))
+
+
+def format_schema_catalog(catalog: dict, table_filter: set = None, include_samples: bool = True,
+                          max_chars: int = SCHEMA_CATALOG_MAX_CHARS) -> str:
+    """
+    Render the catalog as compact text for the model, cut after ``max_chars`` characters
+    将结构目录渲染为紧凑文本供模型使用，超过 max_chars 个字符后截断
+    """
+    tables = catalog["tables"]
+    selected = [t for t in tables if not table_filter or t.lower() in table_filter]
+    lines = [f"DATABASE `{catalog['database']}`: {len(tables)} tables"
+             + (f" (showing {len(selected)})" if table_filter else "")]
+    used = len(lines[0])
+    for shown, name in enumerate(selected):
+        start = len(lines)
+        info = tables[name]
+        rows = f"~{info['rows']:,} rows" if info["rows"] is not None else "rows unknown"
+        size = f", {info['bytes'] / 1024**2:.1f} MB" if info["bytes"] else ""
+        kind = " VIEW" if info["type"] == "view" else ""
+        comment = f" -- {info['comment']}" if info["comment"] else ""
+        lines.append(f"\n{name}{kind} ({rows}{size}){comment}")
+
+        columns = []
+        for col in info["columns"]:
+            flags = {"PRI": " PK", "UNI": " UQ", "MUL": " IDX"}.get(col["key"], "")
+            flags += " NULL" if col["nullable"] else ""
+            columns.append(f"{col['name']} {col['type']}{flags}")
+        lines.append("  columns: " + " | ".join(columns))
+
+        if info["indexes"]:
+            lines.append("  indexes: " + ", ".join(
+                f"{idx['name']}({','.join(idx['columns'])}){' UNIQUE' if idx['unique'] and idx['name'] != 'PRIMARY' else ''}"
+                for idx in info["indexes"]))
+
+        if include_samples and info["samples"]:
+            samples = [f"{col}={', '.join(values)}" for col, values in info["samples"].items() if values]
+            if samples:
+                lines.append("  samples: " + "; ".join(samples))
+
+        used += sum(len(line) + 1 for line in lines[start:])
+        if used > max_chars and shown:
+            # Keep whole tables only; the rest can be asked for by name / 只保留完整的表，其余可按名称查询
+            del lines[start:]
+            lines.append(f"\n... output truncated at {max_chars:,} characters: {len(selected) - shown} more tables "
+                         f"({', '.join(selected[shown:shown + 20])}{', ...' if len(selected) - shown > 20 else ''}). "
+                         "Pass `tables` to show specific ones.")
+            break
+    return "\n".join(lines)
+
+
+class SchemaCatalogSchema(BaseModel):
+    """Schema for the schema catalog tool | 结构目录工具输入模式"""
+
+    tables: str = Field(
+        default="",
+        description="Optional comma-separated table names to show; empty shows all tables / 可选，逗号分隔的表名；为空则显示全部表"
+    )
+    include_samples: bool = Field(
+        default=True,
+        description="Include a few sample values per column / 是否包含每列的少量样本值"
     )
+    refresh: bool = Field(
+        default=False,
+        description="Rebuild the catalog instead of using the cached copy / 是否忽略缓存重新构建"
+    )
+
+@tool(args_schema=SchemaCatalogSchema)
+def schema_catalog(tables: str = "", include_samples: bool = True, refresh: bool = False) -> str:
+    """
+    Return a compact catalog of the MySQL database: tables, columns and types, indexes,
+    approximate row counts and a few sample values per column.
+    Call this FIRST to learn the schema instead of running SHOW TABLES / DESCRIBE /
+    SELECT ... LIMIT 5 through sql_inter. The catalog is cached, so repeat calls are cheap.
+
+    返回 MySQL 数据库的紧凑结构目录：表、列及类型、索引、近似行数和每列少量样本值。
+    请先调用此工具了解数据库结构，而不是通过 sql_inter 执行 SHOW TABLES / DESCRIBE。
+
+    :param tables: Optional comma-separated table names to limit the output
+    :param include_samples: Include sample values per column
+    :param refresh: Rebuild the catalog from INFORMATION_SCHEMA
+    :return: Compact text catalog
+    """
+    try:
+        catalog = schema_catalog_cache.get(refresh=refresh)
+        table_filter = {t.strip().strip('`').lower() for t in tables.split(',') if t.strip()}
+        text = format_schema_catalog(catalog, table_filter or None, include_samples)
+        return f"{text}\n\n(catalog age: {schema_catalog_cache.age():.0f}s)"
+    except pymysql.Error as e:
+        error_msg = f"MySQL Error {e.args[0]}: {e.args[1]}" if len(e.args) > 1 else f"MySQL Error: {e}"
+        return f"Schema catalog failed: {error_msg}"
+    except Exception as e:
+        return f"Schema catalog failed: {str(e)}"
 
 # ============================================================================
 # DATA EXTRACTION TOOL CONFIGURATION
@@ -184,73 +1178,1232 @@ class ExtractQuerySchema(BaseModel):
     )
     
     df_name: str = Field(
-        description="Variable name for storing the extracted DataFrame in global scope (must be valid Python identifier) / 用于在全局作用域中存储提取的 DataFrame 的变量名（必须是有效的 Python 标识符）",
+        description="Variable name for storing the extracted DataFrame in the session workspace (must be valid Python identifier) / 用于在会话工作区中存储提取的 DataFrame 的变量名（必须是有效的 Python 标识符）",
         min_length=1,
         max_length=100,
         pattern=r'^[a-zA-Z_][a-zA-Z0-9_]*$'  # Valid Python identifier / 有效的 Python 标识符
     )
 
+    memory_budget_mb: int = Field(
+        default=int(os.getenv('EXTRACT_MEMORY_BUDGET_MB', '2048')),
+        description="Stop the extraction once the DataFrame would exceed this many MB / DataFrame 超过该内存 (MB) 时停止提取",
+        ge=1
+    )
+
+    partition_column: str = Field(
+        default="",
+        description="Split a large extraction into ranges of this numeric or date column and fetch them in parallel; 'auto' uses the table's primary key. Other columns need the query to end with ORDER BY that column; empty disables / 按该数值或日期列分区并行提取；'auto' 使用主键；其他列要求查询以该列的 ORDER BY 结尾；为空则不分区"
+    )
+    partitions: int = Field(
+        default=int(os.getenv('EXTRACT_PARTITIONS', '8')),
+        description="Number of ranges for partitioned extraction / 分区提取的区间数",
+        ge=1,
+        le=256
+    )
+    concurrency: int = Field(
+        default=int(os.getenv('EXTRACT_CONCURRENCY', '4')),
+        description="Partitions fetched at the same time (capped by the connection pool size) / 同时提取的分区数（不超过连接池大小）",
+        ge=1,
+        le=64
+    )
+
+    use_cache: bool = Field(
+        default=True,
+        description="Reuse a fresh on-disk copy of the same query instead of pulling it from MySQL again / 复用本地磁盘上同一查询的最新副本"
+    )
+    watermark_column: str = Field(
+        default="",
+        description="Optional column whose MAX() decides whether the cached copy is still fresh (e.g. updated_at) / 可选，用其 MAX() 判断缓存是否新鲜的列（如 updated_at）"
+    )
+
+    incremental_column: str = Field(
+        default="",
+        description="Monotonic column (id or timestamp) for append-only refresh: only rows newer than this query's earlier extract (df_name if unchanged since, else its cached copy) are fetched / 用于追加式增量刷新的单调列（id 或时间戳）：只提取比本查询之前的提取结果（df_name 未被修改时使用它，否则使用缓存副本）更新的行"
+    )
+    dedup_key: str = Field(
+        default="",
+        description="Optional comma-separated key columns; rows fetched by an incremental refresh replace older rows with the same key / 可选，逗号分隔的键列；增量刷新获取的行会替换具有相同键的旧行"
+    )
+
 # ============================================================================
-# DATA EXTRACTION TOOL IMPLEMENTATION
-# 数据提取工具实现
+# CHUNKED, MEMORY-BUDGETED EXTRACTION
+# 分块、受内存预算限制的数据提取
 # ============================================================================
-@tool(args_schema=ExtractQuerySchema)
-def extract_data(sql_query: str, df_name: str) -> str:
+# Rows are streamed from a server-side cursor in batches of EXTRACT_CHUNK_ROWS.
+# Each batch is turned into a small DataFrame and shrunk to compact dtypes
+# (category for low-cardinality strings, smallest lossless int/float width,
+# parsed dates) before the next batch is read, so peak memory stays close to
+# the final frame instead of several times it.
+# 从服务端游标按 EXTRACT_CHUNK_ROWS 行分批读取。每批数据先构建为小 DataFrame 并
+# 压缩为紧凑的数据类型（低基数字符串转 category、无损的最小整数/浮点宽度、日期解析），
+# 再读取下一批，使峰值内存接近最终 DataFrame 而不是其数倍。
+# ============================================================================
+
+EXTRACT_CHUNK_ROWS = int(os.getenv('EXTRACT_CHUNK_ROWS', '50000'))
+CATEGORY_MAX_RATIO = 0.5   # Unique/non-null ratio below which strings become category / 低于该唯一值比例的字符串转为 category
+
+
+class MemoryBudgetExceeded(Exception):
+    """Raised when an extraction outgrows its memory budget / 提取超出内存预算"""
+
+    def __init__(self, budget, rows_read: int):
+        self.budget = budget
+        self.rows_read = rows_read
+        super().__init__(
+            f"memory budget of {budget.limit / 1024**2:.0f} MB exceeded after {rows_read:,} rows "
+            f"({budget.used / 1024**2:.1f} MB held)")
+
+
+class ExtractionBudget:
     """
-    Extract a table from MySQL database to the current Python environment. Note that this function only handles data extraction,
-    not data querying. For data queries in MySQL, use the sql_inter function.
-    Also note that when writing external function parameter messages, they must be strings in JSON format.
-    
-    :param sql_query: SQL query statement in string format for extracting a table from MySQL
-    :param df_name: Variable name for locally saving the table extracted from MySQL database, represented as a string
-    :return: Table reading and saving results
+    Thread-safe memory accounting for one extraction
+    单次提取的线程安全内存记账
+
+    ``used`` counts compacted chunks that are kept; ``peak`` also includes the
+    transient raw chunk being converted.
+    used 统计已保留的压缩数据块；peak 还包含正在转换的原始数据块。
     """
-    # Active status logging for data extraction operations
-    # 数据提取操作的活动状态日志
-    print("Calling extract_data tool to run SQL query... / 正在调用 extract_data 工具运行 SQL 查询...")
+
+    def __init__(self, limit_mb: float):
+        self.limit = int(limit_mb * 1024 * 1024)
+        self.used = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def charge(self, kept: int, transient: int = 0) -> bool:
+        """Account for a chunk; False once the budget is exceeded / 记账；超出预算时返回 False"""
+        with self._lock:
+            self.used += kept
+            self.peak = max(self.peak, self.used + transient)
+            return self.used <= self.limit
+
+
+def _column_kind(series: pd.Series):
+    """
+    Decide the compact dtype for a column from its first non-empty chunk
+    根据第一个非空数据块决定列的紧凑数据类型
+    """
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return "keep"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    if series.dtype != object and not isinstance(series.dtype, pd.StringDtype):
+        return "keep"
+    values = series.dropna()
+    if values.empty:
+        return None   # Decide on a later chunk / 在后续数据块中决定
+    first = values.iloc[0]
+    if isinstance(first, (datetime, date)):
+        return "datetime"
+    if isinstance(first, str) and values.nunique() <= len(values) * CATEGORY_MAX_RATIO:
+        return "category"
+    return "keep"
+
+
+def _compact_column(series: pd.Series, kind: str) -> pd.Series:
+    if kind == "int":
+        return pd.to_numeric(series, downcast="integer")
+    if kind == "float":
+        narrow = series.astype("float32")
+        # Only keep float32 when the round trip is lossless / 仅在往返转换无损时使用 float32
+        if np.array_equal(narrow.to_numpy(dtype="float64"), series.to_numpy(dtype="float64"), equal_nan=True):
+            return narrow
+        return series
+    if kind == "category":
+        return series.astype("category")
+    if kind == "datetime":
+        return pd.to_datetime(series, errors="coerce")
+    return series
+
+
+def compact_chunk(chunk: pd.DataFrame, plan: dict) -> pd.DataFrame:
+    """
+    Apply (and lazily extend) the per-column dtype plan to one chunk
+    对一个数据块应用（并按需补全）逐列数据类型方案
+    """
+    for col in chunk.columns:
+        if plan.get(col) is None:
+            plan[col] = _column_kind(chunk[col])
+        kind = plan[col]
+        if kind and kind != "keep":
+            chunk[col] = _compact_column(chunk[col], kind)
+    return chunk
+
+
+def concat_chunks(chunks: list, columns: list) -> pd.DataFrame:
+    """
+    Concatenate chunks column by column, merging categorical dictionaries
+    逐列拼接数据块，并合并各块的 category 字典
+
+    Chunks are consumed as they are merged so their memory is released early.
+    拼接时逐步释放各数据块，以尽早回收内存。
+    """
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    if len(chunks) == 1:
+        return chunks[0]
+    data = {}
+    for col in columns:
+        pieces = [chunk.pop(col) for chunk in chunks]
+        is_cat = [isinstance(p.dtype, pd.CategoricalDtype) for p in pieces]
+        if any(is_cat) and all(cat for p, cat in zip(pieces, is_cat) if p.notna().any()):
+            # All-NULL pieces do not vote against category / 全为 NULL 的数据块不影响 category 判定
+            pieces = [p if cat else p.astype("category") for p, cat in zip(pieces, is_cat)]
+            merged = pd.api.types.union_categoricals(pieces, ignore_order=True)
+            data[col] = pd.Series(merged, name=col)
+        else:
+            if any(is_cat):
+                # Partitions disagreed; plain values avoid a huge dictionary / 各分区判定不一致时使用普通值
+                pieces = [p.astype(p.cat.categories.dtype) if cat else p for p, cat in zip(pieces, is_cat)]
+            data[col] = pd.concat(pieces, ignore_index=True)
+    return pd.DataFrame(data, columns=columns)
+
+
+def read_sql_chunked(sql_query: str, budget: ExtractionBudget, chunk_rows: int = None, plan: dict = None) -> pd.DataFrame:
+    """
+    Stream a query into a compact DataFrame within a memory budget
+    在内存预算内将查询结果流式读取为紧凑的 DataFrame
+
+    :raises MemoryBudgetExceeded: when the kept chunks outgrow the budget
+    """
+    chunk_rows = chunk_rows or EXTRACT_CHUNK_ROWS
+    plan = {} if plan is None else plan
+    chunks = []
+    rows_read = 0
+    connection = db_pool.acquire()
+    discard = False
+    try:
+        cursor = connection.cursor(pymysql.cursors.SSCursor)
+        cursor.execute(sql_query)
+        if cursor.description is None:
+            cursor.close()
+            return pd.DataFrame()
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            rows_read += len(rows)
+            raw = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+            del rows
+            transient = frame_nbytes(raw)
+            chunk = compact_chunk(raw, plan)
+            if not budget.charge(frame_nbytes(chunk), transient):
+                # Drop the unread remainder instead of draining it / 放弃未读取的剩余数据
+                discard = True
+                connection.close()
+                cursor.connection = None
+                raise MemoryBudgetExceeded(budget, rows_read)
+            chunks.append(chunk)
+        cursor.close()
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+        discard = True
+        raise
+    finally:
+        db_pool.release(connection, discard=discard)
+
+    # Concatenation briefly holds the chunks and the result side by side
+    # 拼接时会短暂同时持有数据块和结果
+    budget.charge(0, budget.used)
+    return settle_dtypes(concat_chunks(chunks, columns), plan)
+
+
+def settle_dtypes(df: pd.DataFrame, plan: dict) -> pd.DataFrame:
+    """
+    Re-compact columns that fell back to object because early chunks were all NULL
+    重新压缩因前几个数据块全为 NULL 而退化为 object 的列
+    """
+    for col, kind in plan.items():
+        if kind in ("int", "float", "datetime") and col in df.columns and df[col].dtype == object:
+            if kind == "datetime":
+                df[col] = pd.to_datetime(df[col], errors="coerce")
+            else:
+                converted = pd.to_numeric(df[col], errors="coerce")
+                df[col] = _compact_column(converted, _column_kind(converted))
+    return df
+
+
+# ============================================================================
+# PARALLEL PARTITIONED EXTRACTION
+# 并行分区提取
+# ============================================================================
+# The query is wrapped as a derived table and split into contiguous ranges of
+# a numeric or date column. Ranges are fetched concurrently over pooled
+# connections (each with the chunked reader above, sharing one memory budget)
+# and concatenated in range order. Every range is ordered by the partition
+# column, so the merged frame is ordered by it. That equals the single-query
+# result only when the column is the primary key of the one table read (the
+# order of a plain table scan) or the query itself ends with ORDER BY on it;
+# other columns fall back to a single query. Queries MySQL can't merge into
+# the outer range filter (GROUP BY, DISTINCT, aggregates, UNION, windows) would
+# run in full once per range, so they fall back too.
+# 将查询包装为派生表，并按数值或日期列切分为连续区间。各区间通过连接池并发提取
+# （使用上面的分块读取器，共享同一内存预算），并按区间顺序拼接。每个区间按分区列
+# 排序，因此合并结果按该列有序。只有当该列是所读单表的主键（即整表扫描的顺序），
+# 或查询本身以该列的 ORDER BY 结尾时，才与单查询结果一致；其他列退回单查询。
+# MySQL 无法合并到外层区间条件的查询（GROUP BY、DISTINCT、聚合、UNION、窗口函数）
+# 会在每个区间完整执行一次，因此同样退回单查询。
+# ============================================================================
+
+_SQL_ORDER_OR_LIMIT = re.compile(r"\b(?:order\s+by|limit)\b", re.IGNORECASE)
+_SQL_TRAILING_ORDER = re.compile(r"\s+order\s+by\s+`?([\w$]+)`?(?:\s+asc)?\s*$", re.IGNORECASE)
+_SQL_NOT_MERGEABLE = re.compile(
+    r"\b(?:group\s+by|distinct|having|union|over\s*\(|(?:count|sum|avg|min|max|group_concat|"
+    r"std|stddev|variance|bit_and|bit_or|json_arrayagg|json_objectagg)\s*\()", re.IGNORECASE)
+_PARTITION_TYPES = ('int', 'tinyint', 'smallint', 'mediumint', 'bigint', 'decimal', 'float', 'double',
+                    'date', 'datetime', 'timestamp')
+
+
+class ExtractionFallback(Exception):
+    """A faster extraction strategy does not apply; the caller falls back to a full query / 加速策略不适用，退回完整查询"""
+
+
+def _quote_identifier(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _primary_key_column(sql_query: str) -> str:
+    """
+    Single-column numeric/date primary key of the one table the query reads
+    查询所读单表的单列数值/日期主键
+
+    :raises ExtractionFallback: several tables, unknown table or no such key
+    """
+    tables = sql_tables(sql_query)
+    if len(tables) != 1:
+        raise ExtractionFallback("the query must read exactly one table")
+    table = next(iter(tables))
+    catalog = schema_catalog_cache.get()
+    info = next((v for k, v in catalog["tables"].items() if k.lower() == table), None)
+    if info is None:
+        raise ExtractionFallback(f"table `{table}` not found in the schema catalog")
+    primary = [c for c in info["columns"] if c["key"] == "PRI"]
+    if len(primary) != 1 or primary[0]["type"].split('(')[0].split()[0].lower() not in _PARTITION_TYPES:
+        raise ExtractionFallback(f"`{table}` has no single-column numeric or date primary key")
+    return primary[0]["name"]
+
+
+def resolve_partition_column(sql_query: str, partition_column: str) -> str:
+    """
+    Pick the partition column; 'auto' uses the primary key of the single table the query reads
+    选择分区列；'auto' 使用查询所读单表的主键
+    """
+    if partition_column.lower() != "auto":
+        return partition_column.strip('`')
+    return _primary_key_column(sql_query)
+
+
+def _range_edges(low, high, partitions: int) -> list:
+    """Split [low, high] into at most ``partitions`` contiguous ranges / 将 [low, high] 切分为连续区间"""
+    if isinstance(low, datetime):
+        start, end = pd.Timestamp(low).value, pd.Timestamp(high).value
+        edges = np.linspace(start, end, partitions + 1).astype("int64")
+        edges = [pd.Timestamp(int(v)).to_pydatetime() for v in edges]
+    elif isinstance(low, date):
+        return [date.fromordinal(d) for d in _range_edges(low.toordinal(), high.toordinal(), partitions)]
+    elif isinstance(low, int) and isinstance(high, int):
+        step = max(1, -(-(high - low + 1) // partitions))
+        edges = list(range(low, high + 1, step)) + [high]
+    else:
+        edges = [float(v) for v in np.linspace(float(low), float(high), partitions + 1)]
+    edges[0], edges[-1] = low, high
+    deduped = [edges[0]]
+    for edge in edges[1:]:
+        if edge > deduped[-1]:
+            deduped.append(edge)
+    return deduped if len(deduped) > 1 else [low, high]
+
+
+def plan_partitions(sql_query: str, column: str, partitions: int) -> list:
+    """
+    Build the per-range queries for a partitioned extraction, in result order
+    按结果顺序构建分区提取的各区间查询
+    """
+    base = _strip_sql(sql_query)
+    trailing = _SQL_TRAILING_ORDER.search(base)
+    ordered = bool(trailing and trailing.group(1).lower() == column.lower())
+    if ordered:
+        # ORDER BY on the partition column is preserved by the range order
+        # 按分区列的 ORDER BY 由区间顺序保证
+        base = base[:trailing.start()]
+    masked = mask_sql_literals(base)
+    if _SQL_ORDER_OR_LIMIT.search(masked):
+        raise ExtractionFallback("the query has ORDER BY or LIMIT, which partitions cannot reproduce")
+    if _SQL_NOT_MERGEABLE.search(masked):
+        raise ExtractionFallback("GROUP BY, DISTINCT, aggregate, UNION or window queries would run in full "
+                                 "for every range")
+    if not ordered:
+        try:
+            key = _primary_key_column(sql_query)
+        except ExtractionFallback as e:
+            key, reason = None, str(e)
+        if key is None or key.lower() != column.lower():
+            raise ExtractionFallback(
+                f"rows would come back ordered by `{column}`, unlike the single query "
+                f"({reason if key is None else f'`{column}` is not the primary key `{key}`'}); "
+                f"end the query with ORDER BY `{column}` to partition on it")
+
+    col = _quote_identifier(column)
+    try:
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT MIN({col}), MAX({col}) FROM ({base}) AS _bounds")
+                low, high = cursor.fetchone()
+    except pymysql.MySQLError as e:
+        # e.g. the column is aliased or not selected / 例如该列被起了别名或不在选择列表中
+        raise ExtractionFallback(f"`{column}` cannot be read from the query's result ({e.args[-1]})") from e
+    source = f"SELECT * FROM ({base}) AS _part"
+    # MySQL sorts NULLs first in ascending order / MySQL 升序排序时 NULL 在前
+    queries = [f"{source} WHERE {col} IS NULL"]
+    if low is None:
+        return queries
+    if not isinstance(low, (int, float, Decimal, datetime, date)):
+        raise ExtractionFallback(f"`{column}` is not a numeric or date column")
+
+    edges = _range_edges(low, high, partitions)
+    literal = lambda v: pymysql.converters.escape_item(v, "utf8")
+    for i, (start, stop) in enumerate(zip(edges[:-1], edges[1:])):
+        upper = "<=" if i == len(edges) - 2 else "<"
+        queries.append(f"{source} WHERE {col} >= {literal(start)} AND {col} {upper} {literal(stop)} "
+                       f"ORDER BY {col}")
+    return queries
+
+
+def read_sql_partitioned(sql_query: str, column: str, partitions: int, concurrency: int,
+                         budget: ExtractionBudget) -> tuple:
+    """
+    Fetch the ranges of a partitioned extraction concurrently and concatenate them in order
+    并发提取各分区区间并按顺序拼接
+
+    :return: (DataFrame, number of range queries, effective concurrency)
+    """
+    queries = plan_partitions(sql_query, column, partitions)
+    workers = max(1, min(concurrency, db_pool.size, len(queries)))
+    plans = [{} for _ in queries]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract") as executor:
+        futures = [executor.submit(read_sql_chunked, q, budget, None, plan) for q, plan in zip(queries, plans)]
+        try:
+            frames = [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    columns = next((list(f.columns) for f in frames if len(f.columns)), [])
+    non_empty = [f for f in frames if len(f)]
+    merged_plan = {}
+    for plan in plans:
+        for col, kind in plan.items():
+            if merged_plan.get(col) in (None, "keep"):
+                merged_plan[col] = kind
+    budget.charge(0, budget.used)
+    return settle_dtypes(concat_chunks(non_empty, columns), merged_plan), len(queries), workers
+
+
+def describe_dtypes(df: pd.DataFrame) -> str:
+    """Short dtype histogram such as '3 category, 2 int32' / 简短的数据类型统计"""
+    counts = df.dtypes.astype(str).value_counts()
+    return ", ".join(f"{n} {dtype}" for dtype, n in counts.items())
+
+# ============================================================================
+# ON-DISK COLUMNAR EXTRACT CACHE
+# 本地磁盘列式提取缓存
+# ============================================================================
+# Extracted DataFrames are written as uncompressed Arrow IPC (Feather v2)
+# files under PROJECT_ROOT/cache/extracts, keyed by a hash of the normalized
+# SQL and database. A hit is memory-mapped back, so it survives backend
+# restarts and costs far less than a new MySQL pull. Freshness is checked
+# against the tables' UPDATE_TIME, or MAX() of a user-given watermark column
+# (taken from the base table when the query reads just that table). When
+# neither is available, or some table source of the query can't be named,
+# entries older than EXTRACT_CACHE_MAX_AGE are treated as stale. Total size is
+# capped with LRU eviction. An incremental refresh appends its new rows as a
+# further part file instead of rewriting the entry; parts are concatenated on
+# load and compacted into one file after EXTRACT_CACHE_MAX_PARTS appends.
+# 提取的 DataFrame 以未压缩的 Arrow IPC (Feather v2) 文件保存在
+# PROJECT_ROOT/cache/extracts 下，键为规范化 SQL 与数据库的哈希。命中时通过内存映射
+# 加载，重启后依然有效。新鲜度通过表的 UPDATE_TIME 或用户指定水位列的 MAX() 检查
+# （查询只读单表时直接在基表上计算）；两者都不可用或存在无法识别的表来源时，
+# 超过 EXTRACT_CACHE_MAX_AGE 的条目视为过期。总大小按 LRU 淘汰。增量刷新将新行追加为
+# 新的分段文件，而不是重写整个条目；加载时拼接各分段，追加满 EXTRACT_CACHE_MAX_PARTS 次后
+# 合并为一个文件。
+# ============================================================================
+
+EXTRACT_CACHE_MAX_PARTS = int(os.getenv('EXTRACT_CACHE_MAX_PARTS', '16'))
+
+
+class ExtractCache:
+    """
+    Size-capped LRU cache of extracted DataFrames on local disk
+    本地磁盘上有大小上限的 LRU 提取结果缓存
+
+    An entry is a list of Arrow part files, each used up to its recorded row count, and a
+    revision that every store or append increments.
+    每个条目由若干 Arrow 分段文件（各自使用到记录的行数）和一个修订号组成，每次写入或追加都会使修订号加一。
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age: float, max_parts: int = 16):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_parts = max(1, max_parts)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "stores": 0, "appends": 0, "evictions": 0}
+
+    def key(self, sql_query: str) -> str:
+        text = f"{db_pool.database}\0{normalize_sql(sql_query)}"
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+    def _paths(self, key: str) -> tuple:
+        base = os.path.join(self.directory, key)
+        return f"{base}.arrow", f"{base}.json"
+
+    @staticmethod
+    def _read_meta(meta_path: str):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _parts(self, key: str, meta: dict) -> list:
+        """[{"file", "rows"}] of an entry; entries written before parts existed are one file / 条目的分段列表"""
+        return meta.get("parts") or [{"file": f"{key}.arrow", "rows": meta.get("rows")}]
+
+    def _open(self, key: str, meta: dict) -> pa.Table:
+        """
+        Memory-map the parts of an entry as one table; mapped parts stay readable after a later store removes them
+        将条目的各分段内存映射为一个表；之后的写入删除分段文件后，已映射的内容仍可读取
+        """
+        tables = []
+        for part in self._parts(key, meta):
+            table = feather.read_table(os.path.join(self.directory, part["file"]), memory_map=True)
+            tables.append(table if part["rows"] is None else table.slice(0, part["rows"]))
+        # Later parts may need wider integers or more categories / 后续分段可能需要更宽的整数或更多类别
+        return tables[0] if len(tables) == 1 else pa.concat_tables(tables, promote_options="permissive")
+
+    def freshness_state(self, sql_query: str, watermark_column: str = "") -> dict:
+        """
+        Current freshness markers: table UPDATE_TIMEs and the watermark MAX()
+        当前的新鲜度标记：各表的 UPDATE_TIME 和水位列 MAX()
+
+        UPDATE_TIMEs only count as complete when every table source of the query was
+        named and lives in the current database; otherwise the entry ages out instead.
+        仅当查询的每个表来源都可识别且位于当前数据库时，UPDATE_TIME 才视为完整；否则按缓存时长过期。
+        """
+        refs, complete = sql_table_refs(sql_query)
+        database = (db_pool.database or "").lower()
+        tables = sorted({table for _, table in refs})
+        complete = complete and bool(refs) and all(schema in ("", database) for schema, _ in refs)
+        state = {"update_times": {}, "tables_complete": complete,
+                 "watermark_column": watermark_column, "watermark": None}
+        with db_pool.connection() as connection:
+            with connection.cursor() as cursor:
+                if tables:
+                    placeholders = ", ".join(["%s"] * len(tables))
+                    cursor.execute(
+                        "SELECT LOWER(TABLE_NAME), UPDATE_TIME FROM INFORMATION_SCHEMA.TABLES "
+                        f"WHERE TABLE_SCHEMA = %s AND LOWER(TABLE_NAME) IN ({placeholders})",
+                        (db_pool.database, *tables))
+                    found = {name: str(updated) if updated else None for name, updated in cursor.fetchall()}
+                    state["update_times"] = {t: found.get(t) for t in tables}
+                if watermark_column:
+                    col = _quote_identifier(watermark_column.strip('`'))
+                    source = self._watermark_source(sql_query, watermark_column.strip('`'), refs, complete)
+                    cursor.execute(f"SELECT MAX({col}) FROM {source}")
+                    value = cursor.fetchone()[0]
+                    state["watermark"] = None if value is None else str(value)
+        return state
+
+    @staticmethod
+    def _watermark_source(sql_query: str, column: str, refs: set, complete: bool) -> str:
+        """
+        FROM target of the watermark MAX(): the base table when the query reads one table
+        that has the column (an index lookup or one column scan), else the query itself
+        水位 MAX() 的来源：查询只读一个含该列的表时直接用基表（索引查找或单列扫描），否则用查询本身
+        """
+        aliased = re.search(rf"\bas\s+`?{re.escape(column)}`?(?![\w$])", mask_sql_literals(sql_query), re.IGNORECASE)
+        if complete and len(refs) == 1 and not aliased:
+            schema, table = next(iter(refs))
+            info = next((v for k, v in schema_catalog_cache.get()["tables"].items() if k.lower() == table), None)
+            if info is not None and any(c["name"].lower() == column.lower() for c in info["columns"]):
+                return _quote_identifier(table)
+        return f"({_strip_sql(sql_query)}) AS _watermark"
+
+    def _is_fresh(self, meta: dict, state: dict) -> bool:
+        if state["watermark_column"]:
+            return (meta.get("watermark_column") == state["watermark_column"]
+                    and meta.get("watermark") == state["watermark"])
+        times = state["update_times"]
+        if state.get("tables_complete") and times and all(times.values()):
+            return meta.get("update_times") == times
+        # UPDATE_TIME unknown (views, restarted InnoDB) or tables not all known: fall back to max age
+        # UPDATE_TIME 未知（视图、重启后的 InnoDB）或表未能全部识别：退回最大缓存时长
+        return time.time() - meta.get("created", 0) <= self.max_age
+
+    def lookup(self, sql_query: str, state: dict):
+        """
+        Return (DataFrame, metadata) for a fresh entry, or (None, None)
+        返回新鲜条目的 (DataFrame, 元数据)，否则返回 (None, None)
+        """
+        key = self.key(sql_query)
+        data_path, meta_path = self._paths(key)
+        with self._lock:
+            meta = self._read_meta(meta_path)
+            if meta is None:
+                self._stats["misses"] += 1
+                return None, None
+            if not os.path.exists(data_path) or not self._is_fresh(meta, state):
+                self._stats["stale"] += 1
+                self._remove_entry(key, meta)
+                return None, None
+            meta["last_access"] = time.time()
+            self._write_meta(meta_path, meta)
+            self._stats["hits"] += 1
+            table = self._open(key, meta)
+        return table.to_pandas(split_blocks=True), meta
+
+    def peek(self, sql_query: str) -> tuple:
+        """
+        Load the cached copy regardless of freshness (base for incremental refresh); returns
+        (DataFrame, revision), or (None, None)
+        忽略新鲜度加载缓存副本（用作增量刷新的基础数据）；返回 (DataFrame, 修订号) 或 (None, None)
+        """
+        key = self.key(sql_query)
+        data_path, meta_path = self._paths(key)
+        with self._lock:
+            meta = self._read_meta(meta_path)
+            if meta is None or not os.path.exists(data_path):
+                return None, None
+            table = self._open(key, meta)
+        return table.to_pandas(split_blocks=True), meta.get("revision", 0)
+
+    def store(self, sql_query: str, df: pd.DataFrame, state: dict) -> int:
+        """
+        Write an entry in full and evict least recently used entries over the cap; returns its revision
+        完整写入条目并按 LRU 淘汰；返回其修订号
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        key = self.key(sql_query)
+        data_path, meta_path = self._paths(key)
+        now = time.time()
+        meta = {"sql": normalize_sql(sql_query), "database": db_pool.database,
+                "created": now, "last_access": now, "rows": int(df.shape[0]), "columns": int(df.shape[1]),
+                "parts": [{"file": os.path.basename(data_path), "rows": int(df.shape[0])}], **state}
+        with self._lock:
+            old = self._read_meta(meta_path)
+            meta["bytes"] = save_frame(df, data_path)
+            meta["revision"] = (old or {}).get("revision", 0) + 1
+            self._write_meta(meta_path, meta)
+            for part in self._parts(key, old or {})[1:]:
+                self._remove(os.path.join(self.directory, part["file"]))
+            self._stats["stores"] += 1
+            self._evict_locked()
+        return meta["revision"]
+
+    def append(self, sql_query: str, revision: int, keep_rows: int, new: pd.DataFrame, state: dict):
+        """
+        Turn revision of an entry into its first keep_rows rows plus new, writing only the new rows;
+        returns the new revision, or None when the entry changed meanwhile, has too many parts or
+        cannot hold new's columns (the caller then stores in full)
+        将条目的该修订版本变为其前 keep_rows 行加上 new，只写入新行；返回新修订号。条目已被修改、
+        分段过多或无法容纳 new 的列时返回 None（调用方随后完整写入）
+        """
+        key = self.key(sql_query)
+        data_path, meta_path = self._paths(key)
+        with self._lock:
+            meta = self._read_meta(meta_path)
+            if meta is None or meta.get("revision", 0) != revision or not os.path.exists(data_path):
+                return None
+            parts = [dict(part) for part in self._parts(key, meta)]
+            if len(new) and len(parts) >= self.max_parts:
+                return None  # Compact through a full store / 通过完整写入合并分段
+            # Rows the new ones replace are cut from the tail / 被新行替换的行从尾部截去
+            excess = meta["rows"] - keep_rows
+            while excess > 0:
+                cut = min(excess, parts[-1]["rows"])
+                parts[-1]["rows"] -= cut
+                excess -= cut
+                if not parts[-1]["rows"] and len(parts) > 1:
+                    self._remove(os.path.join(self.directory, parts.pop()["file"]))
+            if len(new):
+                schemas = [pa.ipc.open_file(pa.memory_map(os.path.join(self.directory, part["file"]))).schema
+                           for part in parts]
+                try:
+                    pa.unify_schemas([*schemas, pa.Schema.from_pandas(new, preserve_index=False)],
+                                     promote_options="permissive")
+                except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                    return None
+                name = f"{key}.{meta.get('revision', 0) + 1}.arrow"
+                save_frame(new.reset_index(drop=True), os.path.join(self.directory, name))
+                parts.append({"file": name, "rows": len(new)})
+            meta.update(state, parts=parts, rows=keep_rows + len(new), last_access=time.time(),
+                        revision=meta.get("revision", 0) + 1,
+                        bytes=sum(os.path.getsize(os.path.join(self.directory, p["file"])) for p in parts))
+            self._write_meta(meta_path, meta)
+            self._stats["appends"] += 1
+            self._evict_locked()
+        return meta["revision"]
+
+    @staticmethod
+    def _write_meta(meta_path: str, meta: dict):
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def _evict_locked(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            entries.append((meta.get("last_access", 0), meta.get("bytes", 0), name[:-5], meta))
+        total = sum(entry[1] for entry in entries)
+        for _, size, key, meta in sorted(entries, key=lambda entry: entry[:3]):
+            if total <= self.max_bytes:
+                break
+            self._remove_entry(key, meta)
+            total -= size
+            self._stats["evictions"] += 1
+
+    def _remove_entry(self, key: str, meta: dict) -> None:
+        self._remove(*self._paths(key), *(os.path.join(self.directory, p["file"]) for p in self._parts(key, meta)))
+
+    @staticmethod
+    def _remove(*paths) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+# ============================================================================
+# INCREMENTAL (APPEND-ONLY) REFRESH
+# 增量（追加式）刷新
+# ============================================================================
+# Growing event tables are refreshed by fetching only rows whose watermark
+# column is beyond the maximum already held, then appending them. With a
+# dedup key the boundary value is fetched again (>=) and the new rows replace
+# older rows with the same key, so late rows sharing the last timestamp are
+# not lost.
+# 对持续增长的事件表，只提取水位列超过已有最大值的行并追加。指定去重键时会重新
+# 提取边界值（>=），新行替换具有相同键的旧行，避免遗漏与最后时间戳相同的迟到数据。
+# ============================================================================
+
+def _python_scalar(value):
+    """Convert numpy/pandas scalars to plain Python values for SQL literals / 转换为 Python 标量"""
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _key_mask(base: pd.DataFrame, new: pd.DataFrame, keys: list) -> np.ndarray:
+    """Rows of ``base`` whose key also appears in ``new`` / base 中键值出现在 new 里的行"""
+    if len(keys) == 1:
+        return base[keys[0]].isin(new[keys[0]]).to_numpy()
+    return pd.MultiIndex.from_frame(base[keys]).isin(pd.MultiIndex.from_frame(new[keys]))
+
+
+def extract_incremental(sql_query: str, base: pd.DataFrame, column: str, dedup_key: str,
+                        budget: ExtractionBudget) -> tuple:
+    """
+    Fetch rows beyond the watermark of ``base`` and append them
+    提取超过 base 水位的行并追加
+
+    :return: (combined DataFrame, rows fetched, rows replaced, watermark used, kept rows), where kept
+             rows is n when the result is the first n rows of base followed by the new rows, else None
+             (合并后的 DataFrame, 提取行数, 替换行数, 使用的水位, 保留行数)；结果为 base 前 n 行加新行时
+             保留行数为 n，否则为 None
+    """
+    keys = [k.strip().strip('`') for k in dedup_key.split(',') if k.strip()]
+    missing = [c for c in [column, *keys] if c not in base.columns]
+    if missing:
+        raise ExtractionFallback(f"existing data has no column(s) {', '.join(missing)}")
+    watermark = base[column].max()
+    if pd.isna(watermark):
+        raise ExtractionFallback(f"existing data has no values in `{column}`")
+
+    budget.charge(frame_nbytes(base))
+    col = _quote_identifier(column)
+    op = ">=" if keys else ">"
+    literal = pymysql.converters.escape_item(_python_scalar(watermark), "utf8")
+    new = read_sql_chunked(
+        f"SELECT * FROM ({_strip_sql(sql_query)}) AS _inc WHERE {col} {op} {literal} ORDER BY {col}", budget)
+    if list(new.columns) != list(base.columns):
+        raise ExtractionFallback("the query's columns changed since the data was extracted")
+
+    replaced = 0
+    kept = base
+    kept_rows = len(base)
+    if keys and len(new):
+        new = new.drop_duplicates(subset=keys, keep='last', ignore_index=True)
+        mask = _key_mask(base, new, keys)
+        replaced = int(mask.sum())
+        if replaced:
+            kept = base.loc[~mask]
+            # Replaced rows that form the tail can be cut instead of rewriting everything
+            # 被替换的行恰好构成尾部时可直接截去，无需全部重写
+            kept_rows = len(kept) if not mask[:len(kept)].any() else None
+    if not len(new):
+        return base, 0, 0, watermark, kept_rows
+    # Shallow copy: concat_chunks pops columns and must not touch the caller's frame
+    # 浅拷贝：concat_chunks 会弹出列，不能修改调用方的 DataFrame
+    combined = concat_chunks([kept.reset_index(drop=True).copy(deep=False), new], list(base.columns))
+    return combined, len(new), replaced, watermark, kept_rows
+
+
+extract_cache = ExtractCache(
+    directory=os.path.join(os.getenv('PROJECT_ROOT', "/app"), "cache", "extracts"),
+    max_bytes=int(float(os.getenv('EXTRACT_CACHE_MAX_MB', '4096')) * 1024 * 1024),
+    max_age=float(os.getenv('EXTRACT_CACHE_MAX_AGE', '3600')),
+    max_parts=EXTRACT_CACHE_MAX_PARTS,
+)
+
+# ============================================================================
+# WORKSPACE CLEAR TOOL
+# 工作区清理工具
+# ============================================================================
+
+class WorkspaceClearSchema(BaseModel):
+    names: str = Field(default="", description="Comma-separated variable names to delete; empty clears the whole session workspace / 要删除的变量名（逗号分隔）；为空则清空整个会话工作区")
+
+
+@tool(args_schema=WorkspaceClearSchema)
+def clear_workspace(names: str = "", config: RunnableConfig = None) -> str:
+    """
+    Free memory held by this conversation's DataFrames and variables once they are no longer needed.
+    当不再需要本会话的 DataFrame 和变量时，释放其占用的内存。
+
+    :param names: Comma-separated variable names, or empty to clear everything
+    :return: What was released
+    """
+    thread_id = thread_id_of(config)
+    wanted = [n.strip() for n in names.split(",") if n.strip()]
+    if not wanted:
+        ws = workspace_manager.get(thread_id)
+        freed, count = ws.nbytes, len(ws.sizes)
+        workspace_manager.teardown(thread_id)
+        return f"Cleared the session workspace: {count} variables, {freed / 1024**2:.1f} MB released."
+    ws = workspace_manager.get(thread_id)
+    freed = sum(ws.sizes.get(n, 0) for n in wanted)
+    removed = [n for n in wanted if ws.discard(n)]
+    missing = [n for n in wanted if n not in removed]
+    result = f"Deleted {', '.join(removed) or 'nothing'} ({freed / 1024**2:.1f} MB released)."
+    if missing:
+        result += f" Not found: {', '.join(missing)}."
+    return result
+
+# ============================================================================
+# CONTENT-ADDRESSED FIGURE STORE
+# 内容寻址的图像存储
+# ============================================================================
+# Images are stored under a hash of the plotting code, the figure variable and
+# a fingerprint of every workspace value the code reads. The same code on the
+# same data is served from the stored file without running matplotlib, and
+# users no longer overwrite each other's images. The directory is kept under a
+# size cap by removing the least recently served files.
+# 图像按绘图代码、图像变量名以及代码读取的每个工作区变量的数据指纹计算哈希后存储。
+# 相同代码作用于相同数据时直接返回已存储的文件，无需运行 matplotlib，不同用户的图像也
+# 不再相互覆盖。目录大小受上限约束，超限时删除最久未被使用的文件。
+# ============================================================================
+
+# Attribute/function names whose result changes between runs / 每次运行结果都可能不同的属性或函数名
+_NONDETERMINISTIC_NAMES = {"random", "rand", "randn", "randint", "choice", "shuffle", "sample",
+                           "now", "today", "time", "urandom", "uuid4"}
+
+
+def figure_inputs(ws, snippet) -> dict:
+    """
+    Fingerprints of the workspace values a fig_inter snippet reads, or None when
+    its image cannot be reused (random/clock calls, values without a fingerprint)
+    fig_inter 代码片段读取的工作区变量的指纹；图像不可复用时（随机数/时钟调用、
+    无法计算指纹的变量）返回 None
+    """
+    if snippet.names & _NONDETERMINISTIC_NAMES:
+        return None
+    fingerprints = {}
+    for name in ws.referenced(snippet.names):
+        if name not in ws or name in ws._base:
+            continue
+        if name in ws.definitions:
+            # A definition is identified by its source / 定义由其源码标识
+            fingerprints[name] = hashlib.sha256(ws.definitions[name].encode('utf-8')).hexdigest()
+            continue
+        if name not in ws.namespace:
+            # Spilled: use the fingerprint taken at this version if there is one,
+            # else the version itself, rather than loading the value
+            # 已溢写：若有本版本的指纹则使用，否则直接使用版本，不加载其值
+            cached = ws.fingerprints.get(name)
+            version = ws.versions.get(name)
+            fingerprints[name] = cached[1] if cached and cached[0] == version and cached[1] else ws.value_key(name)
+            continue
+        value = ws.namespace[name]
+        if isinstance(value, type(os)):
+            fingerprints[name] = value.__name__
+            continue
+        if is_plot_object(value):
+            # A figure the snippet assigns again is not an input / 代码重新赋值的图形对象不是输入
+            if name in snippet.targets:
+                continue
+            return None
+        fingerprint = ws.fingerprint(name)
+        if fingerprint is None:
+            return None
+        fingerprints[name] = fingerprint
+    return fingerprints
+
+
+class FigureStore:
+    """
+    Image files named by content key, with an LRU size cap over the whole directory
+    以内容键命名的图像文件，整个目录按 LRU 受大小上限约束
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Running size of the directory, measured by the first collection / 目录的累计大小，由首次回收时测量
+        self._bytes = None
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "uncacheable": 0, "evictions": 0, "evicted_bytes": 0}
+
+    @staticmethod
+    def key(py_code: str, fname: str, fingerprints: dict, profile: dict) -> str:
+        text = json.dumps([matplotlib.__version__, py_code.strip(), fname, sorted(fingerprints.items()),
+                           sorted(profile.items())])
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:40]
+
+    def lookup(self, key: str):
+        """
+        {suffix: path relative to PUBLIC_DIR} of a stored image, or None
+        已存储图像的 {后缀: 相对 PUBLIC_DIR 的路径}，否则返回 None
+        """
+        found = {}
+        with self._lock:
+            for suffix in (".svg", ".png", ".webp", ".thumb.png"):
+                try:
+                    # mtime doubles as last use for the collector / mtime 同时作为回收器的最近使用时间
+                    os.utime(os.path.join(self.directory, key + suffix))
+                except OSError:
+                    continue
+                found[suffix] = os.path.join("images", key + suffix)
+            if set(found) <= {".thumb.png"}:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+        return found
+
+    def publish(self, key: str, images: dict) -> dict:
+        """
+        Write rendered images ({suffix: bytes}) under key and collect garbage
+        将渲染结果（{后缀: 字节}）以 key 命名写入并回收空间
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        published, keep, added = {}, set(), 0
+        for suffix, data in images.items():
+            abs_path = os.path.join(self.directory, key + suffix)
+            try:
+                added -= os.path.getsize(abs_path)
+            except OSError:
+                pass
+            # Readers never see a partly written file / 读取方不会看到写了一半的文件
+            temp_path = os.path.join(self.directory, f".render-{os.getpid()}-{threading.get_ident()}{suffix}")
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, abs_path)
+            added += len(data)
+            keep.add(abs_path)
+            published[suffix] = os.path.join("images", key + suffix)
+        with self._lock:
+            self._stats["stores"] += 1
+            if self._bytes is not None:
+                self._bytes += added
+            # The directory is only listed once the running total passes the cap
+            # 仅当累计大小超过上限时才列出目录
+            if self._bytes is None or self._bytes > self.max_bytes:
+                self._collect_locked(keep=keep)
+        return published
+
+    def note_uncacheable(self):
+        with self._lock:
+            self._stats["uncacheable"] += 1
+
+    def _collect_locked(self, keep=()) -> None:
+        entries = []
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if not entry.is_file():
+                    continue
+                # Files still being written are left alone for an hour / 正在写入的文件保留一小时
+                if entry.name.startswith(".render-") and now - st.st_mtime < 3600:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._stats["evictions"] += 1
+            self._stats["evicted_bytes"] += size
+        self._bytes = total
+
+    def collect(self) -> None:
+        """Enforce the size cap now / 立即执行大小上限"""
+        if os.path.isdir(self.directory):
+            with self._lock:
+                self._collect_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "bytes": self._bytes}
+
+
+figure_store = FigureStore(
+    directory=os.path.join(os.getenv('PUBLIC_DIR', "/app/shared/public"), "images"),
+    max_bytes=int(float(os.getenv('FIG_STORE_MAX_MB', '1024')) * 1024 * 1024),
+)
+
+
+def image_markdown(stored: dict, note: str) -> str:
+    """
+    fig_inter result: the image path, and markdown showing the thumbnail linked to the full image
+    fig_inter 的返回内容：图像路径，以及显示缩略图并链接到完整图像的 markdown
+    """
+    thumb = stored.get(".thumb.png")
+    full = next(path for suffix, path in stored.items() if suffix != ".thumb.png")
+    # Return markdown format for frontend display
+    if thumb:
+        return f"Image saved successfully: {full} ({note})\n\n[![Visualization]({thumb})]({full})"
+    return f"Image saved successfully: {full} ({note})\n\n![Visualization]({full})"
+
+
+# ============================================================================
+# FIGURE RENDER PROCESSES
+# 图表渲染进程
+# ============================================================================
+# fig_inter code runs in a pool of render worker processes (workers.py) with the
+# Agg backend. A job carries the workspace values its code reads, pickled, and
+# the workspace definitions as source; it returns only the encoded image
+# (figures.render_figure), so plotting code never changes the workspace. A job
+# past its time limit, or a cancelled one, has its worker killed and replaced.
+# fig_inter 的代码在使用 Agg 后端的渲染工作进程池（workers.py）中运行。任务携带代码读取的
+# 工作区变量（经 pickle 序列化）与以源码形式发送的工作区定义，只返回编码后的图像
+# （figures.render_figure），因此绘图代码不会修改工作区。超时或被取消的任务会终止并替换其工作进程。
+# ============================================================================
+
+# In-process rendering shares pyplot's global state / 进程内渲染共享 pyplot 的全局状态
+_pyplot_lock = threading.Lock()
+
+
+def render_in_process(py_code: str, fname: str, inputs: dict, definitions: dict, profile: dict) -> dict:
+    """
+    Fallback when render processes are disabled: one job at a time, closing only its own figures,
+    without a time limit (only a worker process can be stopped)
+    渲染进程被禁用时的回退方案：一次只运行一个任务，只关闭自己创建的图形，不限时（只有工作进程可被中断）
+    """
+    g = figure_namespace(inputs, definitions)
+    with _pyplot_lock:
+        existing = set(plt.get_fignums())
+        try:
+            return draw(g, py_code, fname, profile)
+        finally:
+            for number in set(plt.get_fignums()) - existing:
+                plt.close(number)
+
+
+matplotlib.use('Agg')
+render_pool = WorkerPool("fig_inter", size=int(os.getenv('FIG_RENDER_WORKERS', '2')), warm=("figures",))
+
+# ============================================================================
+# DATA EXTRACTION TOOL IMPLEMENTATION
+# 数据提取工具实现
+# ============================================================================
+@tool(args_schema=ExtractQuerySchema)
+def extract_data(sql_query: str, df_name: str, memory_budget_mb: int = 2048,
+                 partition_column: str = "", partitions: int = 8, concurrency: int = 4,
+                 use_cache: bool = True, watermark_column: str = "",
+                 incremental_column: str = "", dedup_key: str = "", config: RunnableConfig = None) -> str:
+    """
+    Extract a table from MySQL database to the current Python environment. Note that this function only handles data extraction,
+    not data querying. For data queries in MySQL, use the sql_inter function.
+    Also note that when writing external function parameter messages, they must be strings in JSON format.
     
-    load_dotenv(override=True)
-    host = os.getenv('HOST')
-    user = os.getenv('USER')
-    mysql_pw = os.getenv('MYSQL_PW')
-    db = os.getenv('DB_NAME')
-    port = os.getenv('MYSQL_PORT')
-
-    # Create database connection / 创建数据库连接
-    connection = pymysql.connect(
-        host=host,
-        user=user,
-        passwd=mysql_pw,
-        db=db,
-        port=int(port),
-        charset='utf8'
-    )
+    Rows are streamed in chunks and stored with compact dtypes (category, smallest int/float, datetime);
+    the extraction stops with a message if the DataFrame would exceed memory_budget_mb.
+    数据按块流式读取并以紧凑数据类型存储；若 DataFrame 将超过 memory_budget_mb，提取会停止并给出提示。
+    
+    For large tables set partition_column (or 'auto') to fetch ranges of that column in parallel.
+    对于大表，可设置 partition_column（或 'auto'）以按该列的区间并行提取。
+    
+    Results are cached on disk; a repeat of the same query loads the cached copy while the
+    source tables are unchanged (or while MAX(watermark_column) is unchanged).
+    结果缓存在磁盘上；源表未变化（或 MAX(watermark_column) 未变化）时，重复查询直接加载缓存副本。
+    
+    For growing tables, incremental_column refreshes df_name by fetching only newer rows.
+    对于持续增长的表，incremental_column 只提取更新的行来刷新 df_name。
+    
+    :param sql_query: SQL query statement in string format for extracting a table from MySQL
+    :param df_name: Variable name for locally saving the table extracted from MySQL database, represented as a string
+    :param memory_budget_mb: Memory budget for the resulting DataFrame in MB
+    :param partition_column: Numeric/date column to split on, 'auto', or empty for a single query
+    :param partitions: Number of ranges for partitioned extraction
+    :param concurrency: Number of ranges fetched at the same time
+    :param use_cache: Reuse a fresh on-disk copy of the same query
+    :param watermark_column: Column whose MAX() decides cache freshness
+    :param incremental_column: Monotonic column for append-only refresh of df_name
+    :param dedup_key: Key columns whose newer rows replace older ones on refresh
+    :return: Table reading and saving results
+    """
+    # Active status logging for data extraction operations
+    # 数据提取操作的活动状态日志
+    print("Calling extract_data tool to run SQL query... / 正在调用 extract_data 工具运行 SQL 查询...")
+    
+    with workspace_manager.use(config) as ws:
+        return _extract_into(ws, sql_query, df_name, memory_budget_mb, partition_column, partitions,
+                             concurrency, use_cache, watermark_column, incremental_column, dedup_key)
+
 
+def _extract_into(ws: Workspace, sql_query: str, df_name: str, memory_budget_mb: int, partition_column: str,
+                  partitions: int, concurrency: int, use_cache: bool, watermark_column: str,
+                  incremental_column: str, dedup_key: str) -> str:
+    """Body of extract_data, writing df_name into the given workspace / extract_data 的主体，将 df_name 写入给定工作区"""
+    budget = ExtractionBudget(memory_budget_mb)
     try:
-        # Execute SQL and save as global variable / 执行 SQL 并保存为全局变量
-        df = pd.read_sql(sql_query, connection)
-        globals()[df_name] = df
+        df = None
+        note = ""
+        state = None
+        # (base revision, kept rows, new rows) when only new rows need writing to the cache
+        # 仅需将新行写入缓存时为 (基础修订号, 保留行数, 新行)
+        increment = None
+        key = extract_cache.key(sql_query)
+        if incremental_column:
+            # Append-only refresh on top of this query's own earlier extract: df_name while it
+            # still holds it unchanged, else the cached copy; anything else is extracted in full
+            # 基于本查询之前的提取结果进行追加式刷新：df_name 仍未经修改地持有它时使用 df_name，
+            # 否则使用缓存副本；其他情况完整提取
+            started = time.perf_counter()
+            base = revision = None
+            source = "existing DataFrame"
+            if ws.extracted_as(df_name, key):
+                base, revision = ws.get(df_name), ws.origins[df_name][2]
+            if not isinstance(base, pd.DataFrame):
+                base, revision = extract_cache.peek(sql_query) if use_cache else (None, None)
+                source = "cached copy"
+            if isinstance(base, pd.DataFrame):
+                try:
+                    state = extract_cache.freshness_state(sql_query, watermark_column) if use_cache else None
+                    df, fetched, replaced, mark, kept_rows = extract_incremental(
+                        sql_query, base, incremental_column, dedup_key, budget)
+                    if revision is not None and kept_rows is not None:
+                        increment = (revision, kept_rows, df.iloc[kept_rows:])
+                    note = (f"\nIncremental refresh from the {source}: fetched {fetched:,} rows with "
+                            f"`{incremental_column}` {'>=' if dedup_key else '>'} {mark}"
+                            f"{f', {replaced:,} replaced by key' if replaced else ''} "
+                            f"in {time.perf_counter() - started:.2f}s.")
+                except ExtractionFallback as e:
+                    df = None
+                    budget = ExtractionBudget(memory_budget_mb)
+                    note = f"\nIncremental refresh skipped ({e}); extracted in full."
+            else:
+                note = "\nNo earlier extract of this query to refresh; extracted in full."
+        if df is None and use_cache and not incremental_column:
+            # Serve a fresh on-disk copy when available / 若有新鲜的磁盘副本则直接加载
+            started = time.perf_counter()
+            state = extract_cache.freshness_state(sql_query, watermark_column)
+            cached, meta = extract_cache.lookup(sql_query, state)
+            if cached is not None:
+                ws.set(df_name, cached)
+                ws.origins[df_name] = (key, ws.versions.get(df_name), meta.get("revision", 0))
+                age_min = (time.time() - meta["created"]) / 60
+                return (f"Successfully created pandas object `{df_name}` from the local extract cache "
+                        f"({cached.shape[0]:,} rows × {cached.shape[1]} columns, cached {age_min:.0f} min ago, "
+                        f"loaded in {time.perf_counter() - started:.2f}s). "
+                        f"Memory: {frame_nbytes(cached) / 1024**2:.1f} MB. "
+                        f"Set use_cache=false to force a fresh pull from MySQL.")
+        if df is None and partition_column:
+            # Parallel range extraction; falls back to one query when unsafe
+            # 并行区间提取；无法安全分区时退回单查询
+            try:
+                column = resolve_partition_column(sql_query, partition_column)
+                df, ranges, workers = read_sql_partitioned(sql_query, column, partitions, concurrency, budget)
+                note = f"\nPartitioned on `{column}`: {ranges} range queries, {workers} concurrent."
+            except ExtractionFallback as e:
+                note = f"\nPartitioning skipped ({e}); used a single query."
+        if df is None:
+            # Stream the query on a pooled connection / 在连接池连接上流式执行 SQL
+            df = read_sql_chunked(sql_query, budget)
+        if use_cache and state is None:
+            state = extract_cache.freshness_state(sql_query, watermark_column)
+        ws.set(df_name, df)
         # Optional success confirmation - useful for development
         # 可选的成功确认 - 用于开发很有用
-        # print("Data successfully extracted and saved as global variable: / 数据成功提取并保存为全局变量：", df_name)
-        return f"Successfully created pandas object `{df_name}` containing data extracted from MySQL."
+        # print("Data successfully extracted and saved to the session workspace: / 数据成功提取并保存到会话工作区：", df_name)
+        revision = None
+        if state is not None:
+            try:
+                if increment is not None:
+                    # Only the new rows are written; with none, only the freshness markers change
+                    # 只写入新行；没有新行时只更新新鲜度标记
+                    revision = extract_cache.append(sql_query, *increment, state)
+                if revision is None:
+                    revision = extract_cache.store(sql_query, df, state)
+            except Exception as e:
+                logger.warning("Writing extract cache for %s failed: %s", df_name, e)
+        ws.origins[df_name] = (key, ws.versions.get(df_name), revision)
+        final_mb = frame_nbytes(df) / 1024**2
+        return (f"Successfully created pandas object `{df_name}` containing data extracted from MySQL "
+                f"({df.shape[0]:,} rows × {df.shape[1]} columns).\n"
+                f"Memory: final {final_mb:.1f} MB, peak ≈ {budget.peak / 1024**2:.1f} MB "
+                f"(budget {memory_budget_mb} MB). Dtypes: {describe_dtypes(df)}{note}")
+    except MemoryBudgetExceeded as e:
+        return (f"Extraction stopped: {e}. `{df_name}` was not created or changed. "
+                f"Select fewer columns, filter rows with WHERE, aggregate in SQL, or raise memory_budget_mb.")
     except Exception as e:
         return f"Execution failed: {e}"
-    finally:
-        connection.close()
 
 # Create Python code execution tool / 创建Python代码执行工具
 # Python code execution tool structured parameter description / Python代码执行工具结构化参数说明
 class PythonCodeInput(BaseModel):
     py_code: str = Field(description="A valid Python code string, e.g., '2 + 2' or 'x = 3\\ny = x * 2'")
+    timeout: int = Field(default=PYTHON_EXEC_TIMEOUT, description=f"Time limit in seconds (max {PYTHON_EXEC_MAX_TIMEOUT}); the code is stopped when it runs longer / 时间限制（秒），超时代码将被中断")
 
 @tool(args_schema=PythonCodeInput)
-def python_inter(py_code):
+def python_inter(py_code, timeout: int = PYTHON_EXEC_TIMEOUT, config: RunnableConfig = None):
     """
     Call this function when users need to write and execute Python programs.
     This function can execute Python code and return the final result. Note that this function can only execute non-plotting code.
     For plotting-related code, use the fig_inter function.
+    Code running longer than timeout seconds is stopped and a JSON report says why.
     """    
+    return _python_inter(py_code, timeout, config)
+
+
+def _python_inter(py_code, timeout, config, cancel: CancelScope = None):
+    """Body of python_inter, stoppable through cancel / python_inter 的主体，可通过 cancel 中断"""
     # Check if the code contains plotting operations
     plotting_keywords = ['plt.savefig', 'plt.save', 'fig.savefig', 'plt.show', 'plt.plot', 'plt.scatter', 
                         'plt.bar', 'plt.hist', 'plt.boxplot', 'sns.', 'seaborn']
@@ -267,40 +2420,48 @@ fig_inter(py_code="YOUR_PLOTTING_CODE", fname="fig")
 
 Note: Your plotting code should create a figure object assigned to the variable name specified in 'fname'."""
     
-    g = globals()
-    try:
-        # Try to return expression result if it's an expression / 尝试如果是表达式，则返回表达式运行结果
-        return str(eval(py_code, g))
-    # If error occurs, test if it's repeated assignment to the same variable / 若报错，则先测试是否是对相同变量重复赋值
-    except Exception as e:
-        global_vars_before = set(g.keys())
-        try:            
-            exec(py_code, g)
-        except Exception as e:
-            return f"Code execution error: {e}"
-        global_vars_after = set(g.keys())
-        new_vars = global_vars_after - global_vars_before
-        # If new variables exist / 若存在新变量
-        if new_vars:
-            result = {var: g[var] for var in new_vars}
-            # Optional execution confirmation for debugging
-            # 可选的执行确认用于调试
-            # print("代码已顺利执行，正在进行结果梳理...")
-            return str(result)
-        else:
-            # Optional execution confirmation for debugging
-            # 可选的执行确认用于调试
-            # print("代码已顺利执行，正在进行结果梳理...")
-            return "Code executed successfully"
+    timeout = clamp_timeout(timeout)
+    # Run inside this conversation's workspace / 在本会话的工作区中运行
+    with workspace_manager.use(config) as ws, ws.lock:
+        if python_workers.enabled:
+            # Out of process, in a worker / 在工作进程中运行，不占用服务进程
+            return run_python_in_worker(ws, py_code, timeout, cancel)
+        names = ws.referenced(code_names(py_code))
+        # Bring back spilled DataFrames the code (or a function it calls) refers to
+        # 重新加载代码（或其调用的函数）引用的已溢写 DataFrame
+        ws.ensure(names)
+        before = ws.snapshot()
+        timings = {}
+        # In the server process the time limit does not apply: only a worker can be stopped
+        # 在服务进程内运行时不受时间限制：只有工作进程可被中断
+        try:
+            return run_code(ws.namespace, py_code, timings=timings)
+        finally:
+            log_timings("python_inter", ws.thread_id, timings)
+            # In-place edits keep the same object, so re-measure everything the code touched
+            # 原地修改不会改变对象 id，因此重新计量代码触及的所有变量
+            ws.account(set(ws.changed_since(before)) | names, mutated=names)
+
+
+async def _python_inter_async(py_code, timeout: int = PYTHON_EXEC_TIMEOUT, config: RunnableConfig = None):
+    # Cancelling the LangGraph run stops the code / 取消 LangGraph 运行时中断代码
+    return await run_cancellable(_python_inter, py_code, timeout, config)
+
+
+python_inter.coroutine = _python_inter_async
 
 # Create plotting tool / 创建绘图工具
 # Plotting tool structured parameter description / 绘图工具结构化参数说明
 class FigCodeInput(BaseModel):
     py_code: str = Field(description="Python plotting code to execute, must use matplotlib/seaborn to create images and assign to descriptive variables")
     fname: str = Field(description="Descriptive variable name for the image object (e.g., 'scatter_plot', 'correlation_heatmap') - NEVER use 'fig'")
+    timeout: int = Field(default=PYTHON_EXEC_TIMEOUT, description=f"Time limit in seconds (max {PYTHON_EXEC_MAX_TIMEOUT}) for running the code and saving the image / 运行代码并保存图像的时间限制（秒）")
+    output_format: str = Field(default="auto", description="Image format: 'auto' (SVG for light line/bar charts, compressed raster for dense plots), 'svg', 'png' or 'webp' / 图像格式")
+    dpi: int = Field(default=0, description=f"Resolution of raster images, 50-300; 0 uses the default ({FIG_DPI}) / 栅格图像分辨率，0 表示使用默认值")
 
 @tool(args_schema=FigCodeInput)
-def fig_inter(py_code: str, fname: str) -> str:
+def fig_inter(py_code: str, fname: str, timeout: int = PYTHON_EXEC_TIMEOUT, output_format: str = "auto",
+              dpi: int = 0, config: RunnableConfig = None) -> str:
     """
     Call this function when users need to use Python for visualization plotting tasks.
 
@@ -309,6 +2470,8 @@ def fig_inter(py_code: str, fname: str) -> str:
     Args:
         py_code: Python plotting code
         fname: Variable name for the plot object - MUST be descriptive (e.g., 'scatter_plot', 'correlation_heatmap')
+        output_format: 'auto' (default), 'svg', 'png' or 'webp'
+        dpi: Raster resolution, 0 for the default
 
     Rules:
     1. Variable name MUST match fname parameter exactly
@@ -316,6 +2479,7 @@ def fig_inter(py_code: str, fname: str) -> str:
     3. NEVER use 'fig' - it causes file overwrites
     4. Create plot with: variable_name, ax = plt.subplots()
     5. End code with: variable_name.tight_layout()
+    6. Variables the plotting code creates or changes are not kept; prepare data with python_inter first
 
     Example code:
     scatter_plot, ax = plt.subplots(figsize=(10,6))
@@ -324,40 +2488,72 @@ def fig_inter(py_code: str, fname: str) -> str:
     
     Then call: fig_inter(code, "scatter_plot")
     """
+    return _fig_inter(py_code, fname, timeout, output_format, dpi, config)
+
+
+def _fig_inter(py_code: str, fname: str, timeout: int, output_format: str, dpi: int, config,
+               cancel: CancelScope = None) -> str:
+    """Body of fig_inter, stoppable through cancel / fig_inter 的主体，可通过 cancel 中断"""
     # Optional debug output for monitoring tool usage
     # 可选的调试输出用于监控工具使用
     # print("Calling fig_inter tool to run Python code... / 正在调用fig_inter工具运行Python代码...")
 
-    current_backend = matplotlib.get_backend()
-    matplotlib.use('Agg')
-
-    local_vars = {"plt": plt, "pd": pd, "sns": sns}
-    
-    # Set image save path (from environment variable) / 设置图像保存路径（从环境变量）
-    base_dir = os.getenv('PUBLIC_DIR', "/app/shared/public")
-    images_dir = os.path.join(base_dir, "images")
-    os.makedirs(images_dir, exist_ok=True)  # Automatically create images folder if it doesn't exist / 自动创建 images 文件夹（如不存在）
+    timeout = clamp_timeout(timeout)
     try:
-        g = globals()
-        exec(py_code, g, local_vars)
-        g.update(local_vars)
-
-        fig = local_vars.get(fname, None)
-        if fig:
-            image_filename = f"{fname}.png"
-            abs_path = os.path.join(images_dir, image_filename)  # Absolute path / 绝对路径
-            rel_path = os.path.join("images", image_filename)    # Return relative path (for frontend) / 返回相对路径（给前端用）
-
-            fig.savefig(abs_path, bbox_inches='tight')
-            # Return markdown format for frontend display
-            return f"Image saved successfully: {rel_path}\n\n![Visualization]({rel_path})"
+        profile = output_profile(output_format, dpi)
+        with workspace_manager.use(config) as ws, ws.lock:
+            started = time.perf_counter()
+            snippet, cached = code_cache.compile(py_code, "<fig_inter>")
+            compile_seconds = time.perf_counter() - started
+            # Same code on the same data gives the same image / 相同代码作用于相同数据得到相同图像
+            fingerprints = figure_inputs(ws, snippet)
+            key = None
+            if fingerprints is not None:
+                key = figure_store.key(py_code, fname, fingerprints, profile)
+                stored = figure_store.lookup(key)
+                if stored:
+                    logger.info("fig_inter [%s]: served %s from the figure store", ws.thread_id, key)
+                    return image_markdown(stored, "identical code and data, reused the stored image")
+            inputs, definitions, notes = job_inputs(ws, snippet.names)
+        # The job holds its own copy of the data: the workspace is free while it renders
+        # 任务持有数据副本：渲染期间工作区不被占用
+        if render_pool.enabled:
+            result = render_pool.call(render_figure, (py_code, fname, inputs, definitions, profile), timeout, cancel)
         else:
-            return "Image object not found, please confirm the variable name is correct and is a matplotlib figure object."
+            result = render_in_process(py_code, fname, inputs, definitions, profile)
+    except WorkerStopped as e:
+        if e.reason == "crashed":
+            return f"Execution failed: the render worker {e}."
+        return interruption_report("fig_inter", e.reason, timeout, e.elapsed, py_code)
     except Exception as e:
         return f"Execution failed: {e}"
-    finally:
-        plt.close('all')
-        matplotlib.use(current_backend)
+
+    saved, timings = result["saved"], result["timings"]
+    logger.info("fig_inter [%s]: compile %.2f ms%s, execute %.3f s, render %.3f s", ws.thread_id,
+                compile_seconds * 1000, " (cached)" if cached else "",
+                timings.get("execute", 0.0), timings.get("render", 0.0))
+    if saved:
+        if key is None:
+            figure_store.note_uncacheable()
+            key = hashlib.sha256(os.urandom(16)).hexdigest()[:40]
+        stored = figure_store.publish(key, saved["images"])
+        note = f"{saved['format'].upper()}, {saved['points']:,} points"
+        if saved["rasterized"]:
+            note += f", {saved['rasterized']} dense layer(s) rasterized"
+        if saved.get("downsampled"):
+            note += "; downsampled: " + "; ".join(saved["downsampled"])
+        return "\n".join(notes + [image_markdown(stored, note)])
+    else:
+        return "Image object not found, please confirm the variable name is correct and is a matplotlib figure object."
+
+
+async def _fig_inter_async(py_code: str, fname: str, timeout: int = PYTHON_EXEC_TIMEOUT, output_format: str = "auto",
+                           dpi: int = 0, config: RunnableConfig = None) -> str:
+    # Cancelling the LangGraph run stops the plotting code / 取消 LangGraph 运行时中断绘图代码
+    return await run_cancellable(_fig_inter, py_code, fname, timeout, output_format, dpi, config)
+
+
+fig_inter.coroutine = _fig_inter_async
 
 # Load prompt from external file / 从外部文件加载提示词
 def load_prompt():
@@ -374,6 +2570,623 @@ def load_prompt():
 
 prompt = load_prompt()
 
+# ============================================================================
+# STREAMING EXCEL EXPORT
+# 流式 Excel 导出
+# ============================================================================
+# Excel files are written with a write-only openpyxl workbook, which streams
+# rows to disk instead of building every cell in memory. Rows are converted
+# chunk by chunk, and frames longer than one sheet continue on further sheets.
+# Excel 文件使用 openpyxl 只写工作簿生成，行数据直接流式写入磁盘，不在内存中构建全部
+# 单元格。数据按块转换，超过单个工作表行数上限的数据自动续写到后续工作表。
+# ============================================================================
+
+# Excel allows 1,048,576 rows per sheet, one of them is the header / Excel 每个工作表最多 1,048,576 行，其中一行为表头
+EXCEL_SHEET_ROWS = min(int(os.getenv('EXPORT_EXCEL_SHEET_ROWS', '1048575')), 1048575)
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '50000'))
+
+
+def _excel_headers(df: pd.DataFrame, index: bool) -> list:
+    columns = [" / ".join(map(str, c)) if isinstance(c, tuple) else str(c) for c in df.columns]
+    if not index:
+        return columns
+    return [str(n) if n is not None else "" for n in df.index.names] + columns
+
+
+def _excel_column(values: pd.Series) -> list:
+    """
+    One column as Python values openpyxl accepts; missing values become empty cells
+    将一列转换为 openpyxl 可接受的 Python 值；缺失值写为空单元格
+    """
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        # Excel has no time zones / Excel 不支持时区
+        values = values.dt.tz_localize(None)
+    missing = values.isna().to_numpy()
+    if values.dtype.kind in "biuf" and not isinstance(values.dtype, pd.CategoricalDtype):
+        out = values.to_numpy(dtype=object, copy=True)
+    elif values.dtype.kind == "M":
+        out = np.array(values.dt.to_pydatetime(), dtype=object)
+    else:
+        out = values.to_numpy(dtype=object, copy=True)
+        for i, value in enumerate(out):
+            if isinstance(value, np.generic):
+                # numpy scalars held in object columns / object 列中的 numpy 标量
+                if isinstance(value, np.datetime64):
+                    value = pd.Timestamp(value).to_pydatetime()
+                elif isinstance(value, np.timedelta64):
+                    value = pd.Timedelta(value)
+                else:
+                    value = value.item()
+                out[i] = value
+            if isinstance(value, str):
+                if ILLEGAL_CHARACTERS_RE.search(value):
+                    out[i] = ILLEGAL_CHARACTERS_RE.sub("", value)
+            elif not isinstance(value, (int, float, bool, Decimal, datetime, date, pd.Timedelta)) and value is not None:
+                out[i] = str(value)
+    out[missing] = None
+    return out.tolist()
+
+
+def write_excel_streaming(df: pd.DataFrame, file_path: str, index: bool = True, progress=None) -> dict:
+    """
+    Write df to an .xlsx file in constant memory, splitting it across sheets when needed
+    以恒定内存将 df 写入 .xlsx 文件，必要时拆分到多个工作表
+
+    :param progress: optional callable(rows_written, total_rows) / 可选的进度回调
+    :return: rows, sheets, bytes and seconds / 行数、工作表数、文件字节数和耗时
+    """
+    started = time.perf_counter()
+    workbook = Workbook(write_only=True)
+    headers = _excel_headers(df, index)
+    total = len(df)
+    sheet, sheet_rows, sheets, written = None, 0, 0, 0
+    for start in range(0, max(total, 1), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+        columns = [_excel_column(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+        if index:
+            # Index levels built directly: reset_index() fails when a level shares a column's name
+            # 直接构建索引列：索引层级与列同名时 reset_index() 会失败
+            columns[:0] = [_excel_column(pd.Series(chunk.index.get_level_values(level)))
+                           for level in range(chunk.index.nlevels)]
+        rows = zip(*columns)
+        remaining = len(chunk)
+        while sheet is None or remaining:
+            if sheet is None or sheet_rows >= EXCEL_SHEET_ROWS:
+                sheets += 1
+                sheet = workbook.create_sheet(f"Sheet{sheets}")
+                sheet.append(headers)
+                sheet_rows = 0
+            take = min(remaining, EXCEL_SHEET_ROWS - sheet_rows)
+            for _ in range(take):
+                sheet.append(next(rows))
+            sheet_rows += take
+            remaining -= take
+            written += take
+        if progress is not None:
+            progress(written, total)
+        logger.info("Excel export %s: %d/%d rows (%.0f%%)", os.path.basename(file_path), written, total,
+                    100.0 * written / total if total else 100.0)
+    workbook.save(file_path)
+    return {"rows": total, "sheets": sheets, "bytes": os.path.getsize(file_path),
+            "seconds": time.perf_counter() - started}
+
+# ============================================================================
+# COLUMNAR AND COMPRESSED EXPORTS
+# 列式与压缩格式导出
+# ============================================================================
+# Parquet and Arrow IPC (Feather) files are written batch by batch through
+# pyarrow writers. CSV and NDJSON chunks are compressed independently and
+# appended; concatenated gzip members and zstd frames form one valid stream,
+# so memory stays flat for any number of rows.
+# Parquet 与 Arrow IPC（Feather）文件通过 pyarrow 写入器逐批写入。CSV 与 NDJSON 按块
+# 独立压缩后追加写入；串联的 gzip 成员和 zstd 帧构成一个合法的压缩流，因此无论行数多少，
+# 内存占用都保持平稳。
+# ============================================================================
+
+# Allowed codecs per format, the first is the default / 各格式可用的压缩算法，第一个为默认值
+EXPORT_CODECS = {
+    "parquet": ("zstd", "snappy", "gzip", "lz4", "brotli", "none"),
+    "feather": ("lz4", "zstd", "none"),
+    "csv": ("gzip", "zstd", "none"),
+    "ndjson": ("gzip", "zstd", "none"),
+}
+_CODEC_SUFFIX = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+
+def export_codec(format_type: str, compression: str = "") -> str:
+    """
+    Validated codec for a format ('' picks its default)
+    校验后的压缩算法（'' 表示使用该格式的默认值）
+
+    :raises ValueError: for a codec the format does not support
+    """
+    allowed = EXPORT_CODECS[format_type]
+    codec = (compression or allowed[0]).lower()
+    if codec not in allowed:
+        raise ValueError(f"compression for {format_type} must be one of {', '.join(allowed)}")
+    return codec
+
+
+def export_suffix(format_type: str, codec: str) -> str:
+    if format_type in ("csv", "ndjson"):
+        return f".{format_type}{_CODEC_SUFFIX[codec]}"
+    return f".{format_type}"
+
+
+def _codec_level(codec: str, level: int):
+    """Compression level where the codec has one / 仅对支持压缩级别的算法返回级别"""
+    if codec == "gzip" and not level:
+        # Arrow defaults gzip to level 9, several times slower than 6 for ~3% smaller output
+        # Arrow 的 gzip 默认级别为 9，比级别 6 慢数倍而体积仅小约 3%
+        return 6
+    return (level or None) if codec in ("zstd", "gzip", "brotli") else None
+
+
+def _record_batches(df: pd.DataFrame):
+    """Yield (schema, RecordBatch) per chunk with one schema for the whole frame / 按块生成记录批，整个 DataFrame 使用同一模式"""
+    # Inferred over all rows, so a column that starts with nulls still gets its type / 基于全部行推断，开头为空值的列也能得到正确类型
+    schema = pa.Schema.from_pandas(df, preserve_index=None)
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+        yield schema, pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=None)
+
+
+def _arrow_csv_ok(schema) -> bool:
+    """Whether pyarrow's CSV writer handles every column as pandas would / pyarrow 的 CSV 写入器能否像 pandas 一样处理所有列"""
+    return not any(pa.types.is_nested(f.type) or pa.types.is_duration(f.type) for f in schema)
+
+
+def _text_chunks(df: pd.DataFrame, format_type: str):
+    """Encoded CSV or NDJSON text per chunk; the CSV header comes with the first / 按块生成编码后的 CSV 或 NDJSON 文本"""
+    if format_type == "csv" and len(df):
+        try:
+            batches = _record_batches(df)
+            schema, batch = next(batches)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            schema = None
+        if schema is not None and _arrow_csv_ok(schema):
+            # pyarrow's writer is several times faster than DataFrame.to_csv / pyarrow 写入器比 DataFrame.to_csv 快数倍
+            header = True
+            while batch is not None:
+                sink = pa.BufferOutputStream()
+                pa_csv.write_csv(batch, sink, pa_csv.WriteOptions(include_header=header))
+                header = False
+                yield sink.getvalue().to_pybytes()
+                batch = next(batches, (None, None))[1]
+            return
+    for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+        if format_type == "csv":
+            text = chunk.to_csv(index=False, header=start == 0)
+        else:
+            text = chunk.to_json(orient="records", lines=True, date_format="iso", force_ascii=False)
+            if text and not text.endswith("\n"):
+                text += "\n"
+        yield text.encode("utf-8")
+
+
+def write_columnar(df: pd.DataFrame, file_path: str, format_type: str, codec: str,
+                   level: int = 0, progress=None) -> dict:
+    """
+    Write df as parquet, feather, csv or ndjson in chunks of EXPORT_CHUNK_ROWS
+    以 EXPORT_CHUNK_ROWS 行为一块，将 df 写为 parquet、feather、csv 或 ndjson
+
+    :param level: codec compression level, 0 for its default / 压缩级别，0 表示默认
+    :param progress: optional callable(rows_written, total_rows) / 可选的进度回调
+    """
+    started = time.perf_counter()
+    level = _codec_level(codec, level)
+    if format_type in ("csv", "ndjson") and not isinstance(df.index, pd.RangeIndex):
+        # Keep a meaningful index as columns / 将有意义的索引保留为列
+        df = df.reset_index()
+    total, written = len(df), 0
+    if format_type in ("parquet", "feather"):
+        writer = None
+        try:
+            for schema, batch in _record_batches(df):
+                if writer is None:
+                    if format_type == "parquet":
+                        writer = pq.ParquetWriter(file_path, schema, compression=codec, compression_level=level)
+                    else:
+                        options = pa.ipc.IpcWriteOptions(
+                            compression=None if codec == "none" else pa.Codec(codec, compression_level=level))
+                        writer = pa.ipc.new_file(file_path, schema, options=options)
+                if format_type == "parquet":
+                    writer.write_batch(batch, row_group_size=EXPORT_CHUNK_ROWS)
+                else:
+                    writer.write_batch(batch)
+                written += batch.num_rows
+                if progress is not None:
+                    progress(written, total)
+            if writer is None:
+                # No rows: still write the schema / 没有数据行时仍写出模式
+                table = pa.Table.from_pandas(df, preserve_index=None)
+                if format_type == "parquet":
+                    pq.write_table(table, file_path, compression=codec)
+                else:
+                    feather.write_feather(table, file_path, compression="uncompressed" if codec == "none" else codec)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        compressor = None if codec == "none" else pa.Codec(codec, compression_level=level)
+        with open(file_path, "wb") as f:
+            for data in _text_chunks(df, format_type):
+                f.write(data if compressor is None else compressor.compress(data, asbytes=True))
+                written = min(written + EXPORT_CHUNK_ROWS, total)
+                if progress is not None:
+                    progress(written, total)
+    return {"rows": total, "bytes": os.path.getsize(file_path), "seconds": time.perf_counter() - started}
+
+# ============================================================================
+# PAGINATED PDF REPORTS
+# 分页 PDF 报告
+# ============================================================================
+# Cell text is formatted column by column with vectorised pandas/numpy calls
+# and cut to the column width, so every row is one line of fixed height. The
+# table is then emitted as page-sized LongTable chunks with a repeated header
+# row and precomputed column widths, which keeps reportlab from measuring and
+# splitting one huge table. Figures already rendered by fig_inter can be
+# embedded above the table.
+# 单元格文本按列以向量化的 pandas/numpy 调用格式化，并按列宽截断，使每行都是固定高度的
+# 单行。随后表格以页面大小的 LongTable 分块输出，重复表头行并预先计算列宽，避免 reportlab
+# 测量和拆分一个巨大的表格。fig_inter 已渲染的图像可以嵌入在表格上方。
+# ============================================================================
+
+# Optional cap on the rows rendered into the PDF, stated in the report header; 0 renders every row
+# 可选的 PDF 行数上限，在报告开头注明；0 表示写入全部行
+PDF_MAX_ROWS = int(os.getenv('EXPORT_PDF_MAX_ROWS', '0'))
+# Longest cell text before it is cut with an ellipsis / 单元格文本的最大长度，超出以省略号截断
+PDF_CELL_CHARS = int(os.getenv('EXPORT_PDF_CELL_CHARS', '40'))
+PDF_FONT_SIZES = (8, 7, 6, 5)
+PDF_MARGIN = 36
+# CID font shipped with reportlab, used when the data contains CJK text / reportlab 自带的 CID 字体，数据含中日韩文字时使用
+PDF_CJK_FONT = "STSong-Light"
+
+try:
+    from svglib.svglib import svg2rlg  # optional: vector figures in PDF reports / 可选：在 PDF 报告中嵌入矢量图
+except ImportError:
+    svg2rlg = None
+
+
+def _pdf_column_text(series: pd.Series, max_chars: int) -> np.ndarray:
+    """
+    Column values as display strings, computed without a Python loop per cell
+    列值的显示字符串，不对每个单元格执行 Python 循环
+    """
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=0.0)
+        text = np.char.mod("%.6g", values).astype(object)
+    else:
+        text = series.astype(str).to_numpy(dtype=object)
+    text[missing] = ""
+    return _pdf_cut(text, max_chars)
+
+
+def _pdf_cut(text: np.ndarray, max_chars: int) -> np.ndarray:
+    """Cut strings longer than max_chars, marking the cut with an ellipsis / 截断超过 max_chars 的字符串，并以省略号标记"""
+    lengths = pd.Series(text, dtype=object).str.len().to_numpy()
+    long_rows = lengths > max_chars
+    if long_rows.any():
+        text = text.copy()
+        text[long_rows] = pd.Series(text[long_rows], dtype=object).str.slice(0, max(max_chars - 1, 0)).to_numpy() + "…"
+    return text
+
+
+def _pdf_needs_cjk(df: pd.DataFrame) -> bool:
+    """Whether headers or text columns contain characters Helvetica cannot draw / 表头或文本列是否含 Helvetica 无法绘制的字符"""
+    pattern = r"[^\x00-\xff]"
+    if any(re.search(pattern, str(c)) for c in list(df.columns) + list(df.index.names)):
+        return True
+    for k, dtype in enumerate(df.dtypes):
+        if not pd.api.types.is_numeric_dtype(dtype) and df.iloc[:, k].astype(str).str.contains(pattern).any():
+            return True
+    return False
+
+
+def _pdf_layout(headers: list, sample: list, page_width: float, font: str) -> tuple:
+    """
+    Pick the largest font size whose column widths fit the page; returns (size, widths, chars per column, fits)
+    选择能使列宽适配页面的最大字号；返回（字号、列宽、每列字符数、是否放得下）
+    """
+    padding = 7
+    header_font = 'Helvetica-Bold' if font == "Helvetica" else font
+    # Widths at font size 1 scale linearly with the size / 字号为 1 时的宽度随字号线性缩放
+    unit = [max([pdfmetrics.stringWidth(header, header_font, 1),
+                 *(pdfmetrics.stringWidth(text, font, 1) for text in column)])
+            for header, column in zip(headers, sample)]
+    natural = [max([len(header), *map(len, column)]) for header, column in zip(headers, sample)]
+    for size in PDF_FONT_SIZES:
+        widths = [w * size + padding for w in unit]
+        if sum(widths) <= page_width:
+            return size, widths, natural, True
+    # Still too wide: shrink every column and cut its text to match / 仍然过宽：按比例缩小各列并相应截断文本
+    scale = page_width / sum(widths)
+    chars = [max(1, int(n * (w * scale - padding) / (w - padding))) for n, w in zip(natural, widths)]
+    return size, [w * scale for w in widths], chars, False
+
+
+def _pdf_figure(path: str, max_width: float, max_height: float):
+    """
+    Flowable for a stored fig_inter image scaled to fit, or None when it cannot be embedded
+    将 fig_inter 存储的图像缩放为合适大小的 flowable；无法嵌入时返回 None
+    """
+    base, ext = os.path.splitext(path)
+    if ext == ".svg":
+        if svg2rlg is not None:
+            drawing = svg2rlg(path)
+            scale = min(max_width / drawing.width, max_height / drawing.height, 1.0)
+            drawing.width, drawing.height = drawing.width * scale, drawing.height * scale
+            drawing.scale(scale, scale)
+            return drawing
+        # Without svglib fall back to the raster thumbnail / 没有 svglib 时退回到栅格缩略图
+        path = f"{base}.thumb.png"
+        if not os.path.exists(path):
+            logger.warning("PDF report: %s skipped, svglib is not installed and there is no PNG thumbnail",
+                           os.path.basename(base) + ext)
+            return None
+    width, height = ImageReader(path).getSize()
+    scale = min(max_width / width, max_height / height, 1.0)
+    return Image(path, width=width * scale, height=height * scale)
+
+
+def resolve_figures(figures: str) -> tuple:
+    """
+    Map fig_inter results (paths or markdown) to files under the image store; returns (paths, missing)
+    将 fig_inter 的结果（路径或 markdown）映射为图像存储目录下的文件；返回（路径列表、缺失的引用）
+    """
+    reference = re.compile(r"[^\s,()\[\]]*images/([\w-]+?)(\.thumb\.png|\.svg|\.png|\.webp)(?![\w.])")
+    found = reference.findall(figures or "")
+    # Whatever is left once references and markdown image/link syntax are removed names no stored figure
+    # 去掉图像引用与 markdown 图像/链接语法后剩余的内容都不是已存储的图像
+    rest, previous = reference.sub("", figures or ""), None
+    while rest != previous:
+        rest, previous = re.sub(r"!?\[[^\[\]]*\]\(\s*\)", " ", rest), rest
+    unmatched = [entry for entry in re.split(r"[,\s]+", rest) if entry]
+    # Markdown links a thumbnail to the full image; keep one file per figure, the full one when present
+    # markdown 中缩略图链接到完整图像；每个图像只保留一个文件，优先使用完整图像
+    by_key = {}
+    for key, suffix in found:
+        if suffix != ".thumb.png" or key not in by_key:
+            by_key[key] = key + suffix
+    paths, missing = [], unmatched
+    for name in by_key.values():
+        path = os.path.join(figure_store.directory, name)
+        (paths if os.path.isfile(path) else missing).append(path if os.path.isfile(path) else f"images/{name}")
+    return paths, missing
+
+
+def write_pdf_report(df: pd.DataFrame, file_path: str, title: str, figures: list = (), progress=None) -> dict:
+    """
+    Render a paginated PDF report of df with repeated headers and optional figures
+    将 df 渲染为分页 PDF 报告，带重复表头和可选图像
+
+    :return: {"rows", "total_rows", "pages", "figures", "skipped_figures", "bytes", "seconds"}
+    """
+    started = time.perf_counter()
+    total = len(df)
+    shown = df.head(PDF_MAX_ROWS) if PDF_MAX_ROWS else df
+    if not isinstance(shown.index, pd.RangeIndex):
+        shown = shown.reset_index()
+    headers = [str(c) for c in shown.columns]
+
+    font = "Helvetica"
+    if _pdf_needs_cjk(shown):
+        if PDF_CJK_FONT not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(UnicodeCIDFont(PDF_CJK_FONT))
+        font = PDF_CJK_FONT
+    styles = getSampleStyleSheet()
+    if font == PDF_CJK_FONT:
+        styles['Title'].fontName = styles['Normal'].fontName = font
+
+    # Landscape when the columns do not fit a portrait page / 纵向页面放不下所有列时使用横向
+    # Format every shown cell once; only the longest strings of each column are measured
+    # 每个显示的单元格只格式化一次；每列只测量最长的若干字符串
+    texts = [_pdf_column_text(shown.iloc[:, k], PDF_CELL_CHARS) for k in range(shown.shape[1])]
+    sample = []
+    for text in texts:
+        lengths = pd.Series(text, dtype=object).str.len().to_numpy()
+        longest = np.argpartition(lengths, -20)[-20:] if len(lengths) > 20 else np.arange(len(lengths))
+        sample.append(text[longest].tolist())
+    pagesize = letter
+    size, widths, chars, fits = _pdf_layout(headers, sample, letter[0] - 2 * PDF_MARGIN, font)
+    if not fits:
+        pagesize = landscape(letter)
+        size, widths, chars, fits = _pdf_layout(headers, sample, pagesize[0] - 2 * PDF_MARGIN, font)
+    frame_width, frame_height = pagesize[0] - 2 * PDF_MARGIN, pagesize[1] - 2 * PDF_MARGIN - 12
+    row_height = size + 5
+    rows_per_page = max(1, int(frame_height // row_height) - 2)
+
+    elements = [Paragraph(title, styles['Title']),
+                Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - "
+                          f"{total:,} rows x {df.shape[1]} columns", styles['Normal'])]
+    if total > len(shown):
+        elements.append(Paragraph(f"Truncated: only the first {len(shown):,} of {total:,} rows are shown "
+                                  f"(EXPORT_PDF_MAX_ROWS); export to Excel, CSV or Parquet for the full data.",
+                                  styles['Normal']))
+    elements.append(Spacer(1, 8))
+    embedded, skipped = 0, []
+    for path in figures:
+        figure = _pdf_figure(path, frame_width, frame_height * 0.6)
+        if figure is not None:
+            elements += [figure, Spacer(1, 8)]
+            embedded += 1
+        else:
+            skipped.append(f"images/{os.path.basename(path)}")
+
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font),
+        ('FONTSIZE', (0, 0), (-1, -1), size),
+        ('LEADING', (0, 0), (-1, -1), size + 1),
+        ('TOPPADDING', (0, 0), (-1, -1), 1),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ('LEFTPADDING', (0, 0), (-1, -1), 3),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        # Header row styling / 标题行样式
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold' if font == "Helvetica" else font),
+        # Data rows styling / 数据行样式
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige]),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
+    ])
+    header_row = [text[:n] for text, n in zip(headers, chars)]
+    for start in range(0, len(shown), rows_per_page):
+        columns = [_pdf_cut(text[start:start + rows_per_page], n) for text, n in zip(texts, chars)]
+        data = [header_row] + np.column_stack(columns).tolist()
+        table = LongTable(data, colWidths=widths, rowHeights=row_height, repeatRows=1, hAlign='LEFT')
+        table.setStyle(table_style)
+        elements.append(table)
+    if not len(shown):
+        elements.append(Paragraph("No rows.", styles['Normal']))
+
+    drawn = [0]
+
+    def table_drawn(flowable):
+        # Called per drawn flowable, including each page-sized piece of a split table / 每绘制一个 flowable 调用一次，包括拆分后的表格片段
+        if isinstance(flowable, Table) and progress is not None:
+            drawn[0] += len(flowable._cellvalues) - 1
+            progress(min(drawn[0], total), total)
+
+    def page_footer(canvas, doc):
+        canvas.saveState()
+        canvas.setFont("Helvetica", 7)
+        canvas.drawRightString(pagesize[0] - PDF_MARGIN, PDF_MARGIN / 2, f"Page {doc.page}")
+        canvas.restoreState()
+
+    doc = SimpleDocTemplate(file_path, pagesize=pagesize, leftMargin=PDF_MARGIN, rightMargin=PDF_MARGIN,
+                            topMargin=PDF_MARGIN, bottomMargin=PDF_MARGIN, title=title)
+    doc.afterFlowable = table_drawn
+    doc.build(elements, onFirstPage=page_footer, onLaterPages=page_footer)
+    if progress is not None:
+        progress(total, total)
+    return {"rows": len(shown), "total_rows": total, "pages": doc.page, "figures": embedded, "skipped_figures": skipped,
+            "bytes": os.path.getsize(file_path), "seconds": time.perf_counter() - started}
+
+# ============================================================================
+# BACKGROUND EXPORT JOBS
+# 后台导出任务
+# ============================================================================
+# Large exports run on a small thread pool so the agent turn is not held up.
+# export_data returns a job id at once and export_status reports progress, the
+# final path and size. Every export is written to a hidden temporary file and
+# renamed, so a file under exports/ is always complete.
+# 大型导出在小型线程池中运行，不阻塞智能体当前轮次。export_data 立即返回任务 id，
+# export_status 报告进度、最终路径和大小。所有导出先写入隐藏的临时文件再重命名，
+# 因此 exports/ 下的文件始终是完整的。
+# ============================================================================
+
+# Frames with more cells than this are exported in the background / 单元格数超过该值的 DataFrame 在后台导出
+EXPORT_BACKGROUND_CELLS = int(os.getenv('EXPORT_BACKGROUND_CELLS', '2000000'))
+
+
+@contextmanager
+def staged_file(file_path: str):
+    """
+    Yield a temporary path next to file_path; it replaces file_path only if the block succeeds
+    在 file_path 旁提供临时路径；仅当代码块成功时才替换为 file_path
+    """
+    directory, name = os.path.split(file_path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.{time.time_ns()}.part")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ExportJobs:
+    """
+    Bounded pool of export jobs with pollable status
+    有界的导出任务池，可轮询状态
+    """
+
+    def __init__(self, workers: int, history: int = 100):
+        self.workers = max(1, workers)
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0}
+
+    def submit(self, thread_id: str, description: dict, func) -> str:
+        """
+        Queue func(progress) and return the job id; func returns the result message
+        将 func(progress) 加入队列并返回任务 id；func 返回结果消息
+        """
+        job_id = hashlib.sha1(f"{thread_id}:{time.time_ns()}:{os.urandom(4).hex()}".encode()).hexdigest()[:12]
+        job = {"job_id": job_id, "thread_id": thread_id, "status": "queued", "submitted": time.time(),
+               "started": None, "finished": None, "rows_written": 0, "total_rows": description.get("rows", 0),
+               "result": None, "error": None, **description}
+        with self._lock:
+            self._jobs[job_id] = job
+            self._stats["submitted"] += 1
+            # Forget the oldest finished jobs / 遗忘最早完成的任务
+            finished = [k for k, j in self._jobs.items() if j["finished"]]
+            for key in finished[:max(0, len(self._jobs) - self.history)]:
+                del self._jobs[key]
+        self._executor.submit(self._run, job, func)
+        return job_id
+
+    def _run(self, job: dict, func):
+        def progress(written: int, total: int):
+            job["rows_written"], job["total_rows"] = written, total
+
+        job["status"], job["started"] = "running", time.time()
+        try:
+            job["result"] = func(progress)
+            failed = job["result"].startswith(("Export failed", "Error"))
+        except Exception as e:
+            job["result"], failed = f"Export failed: {e}", True
+        with self._lock:
+            job["finished"] = time.time()
+            job["status"] = "failed" if failed else "completed"
+            if failed:
+                job["error"] = job["result"]
+            elif os.path.exists(job.get("file_path", "")):
+                job["bytes"] = os.path.getsize(job["file_path"])
+            self._stats["failed" if failed else "completed"] += 1
+        logger.info("Export job %s %s in %.1fs: %s", job["job_id"], job["status"],
+                    job["finished"] - job["started"], job["result"])
+
+    def status(self, thread_id: str, job_id: str = "") -> list:
+        """Status of one job, or all of a conversation's jobs / 单个任务或本会话全部任务的状态"""
+        now = time.time()
+        with self._lock:
+            jobs = [j for j in self._jobs.values()
+                    if j["thread_id"] == thread_id and (not job_id or j["job_id"] == job_id)]
+            reports = []
+            for job in jobs:
+                report = {k: job[k] for k in ("job_id", "status", "df_name", "format", "rows_written", "total_rows")}
+                if job["total_rows"]:
+                    report["progress_percent"] = round(100.0 * job["rows_written"] / job["total_rows"], 1)
+                elif job["status"] == "completed":
+                    report["progress_percent"] = 100.0
+                started = job["started"] or now
+                report["elapsed_seconds"] = round((job["finished"] or now) - started, 1) if job["started"] else 0.0
+                if job["status"] == "queued":
+                    report["queued_seconds"] = round(now - job["submitted"], 1)
+                if job["status"] == "completed":
+                    report["path"] = job.get("rel_path")
+                    report["bytes"] = job.get("bytes")
+                    report["size"] = format_bytes(job["bytes"]) if job.get("bytes") is not None else None
+                report["result"] = job["result"]
+                reports.append(report)
+        return reports
+
+    def stats(self) -> dict:
+        with self._lock:
+            states = defaultdict(int)
+            for job in self._jobs.values():
+                states[job["status"]] += 1
+            return {"workers": self.workers, **self._stats, **states}
+
+
+export_jobs = ExportJobs(workers=int(os.getenv('EXPORT_WORKERS', '2')))
+
 # ============================================================================
 # MULTI-FORMAT DATA EXPORT TOOL CONFIGURATION
 # 多格式数据导出工具配置
@@ -382,6 +3195,132 @@ prompt = load_prompt()
 # 该工具提供企业级数据导出功能，用于分享分析结果
 # Supports Excel (business users), JSON (technical users), PDF (executive reports)
 # 支持Excel（业务用户）、JSON（技术用户）、PDF（执行报告）
+# plus Parquet, Feather, CSV and NDJSON (downstream jobs and pipelines)
+# 以及Parquet、Feather、CSV和NDJSON（下游任务和数据管道）
+
+def _write_export(df: pd.DataFrame, df_name: str, format_type: str, filename: str, exports_dir: str,
+                  compression: str = "", compression_level: int = 0, figures: list = (), progress=None) -> str:
+    """
+    Format-specific export step shared by foreground calls and background jobs
+    前台调用和后台任务共用的特定格式导出步骤
+    
+    Every file is written to a temporary name and renamed into exports/ when complete.
+    每个文件都先写入临时名称，完成后再重命名到 exports/。
+    """
+    try:
+        # ========================================================================
+        # STEP 3A: EXCEL FORMAT EXPORT PROCESSING
+        # 步骤3A：Excel格式导出处理
+        # ========================================================================
+        
+        if format_type.lower() == 'excel':
+            # Excel export for business users and data manipulation
+            # 面向业务用户和数据操作的Excel导出
+            file_path = os.path.join(exports_dir, f"{filename}.xlsx")
+            
+            # Export DataFrame to Excel with index for row identification
+            # 将DataFrame导出为Excel，包含索引用于行识别
+            # Write-only openpyxl workbook streams rows instead of holding every cell
+            # openpyxl只写工作簿流式写入行数据，不在内存中保留全部单元格
+            with staged_file(file_path) as tmp_path:
+                result = write_excel_streaming(df, tmp_path, index=True, progress=progress)
+            
+            # Return relative path for web UI access
+            # 返回用于Web UI访问的相对路径
+            rel_path = os.path.join("exports", f"{filename}.xlsx")
+            sheets = f", split across {result['sheets']} sheets" if result["sheets"] > 1 else ""
+            return (f"Excel file exported successfully: {rel_path} ({result['rows']:,} rows{sheets}, "
+                    f"{format_bytes(result['bytes'])}, {result['seconds']:.1f}s)")
+            
+        # ========================================================================
+        # STEP 3B: JSON FORMAT EXPORT PROCESSING
+        # 步骤3B：JSON格式导出处理
+        # ========================================================================
+        
+        elif format_type.lower() == 'json':
+            # JSON export for API integration and web applications
+            # 面向API集成和Web应用的JSON导出
+            file_path = os.path.join(exports_dir, f"{filename}.json")
+            
+            # Export DataFrame as JSON with records orientation
+            # 以records方向将DataFrame导出为JSON
+            # 'records' format: [{col1: val1, col2: val2}, ...] - most API-friendly
+            # 'records'格式：[{col1: val1, col2: val2}, ...] - 最适合API
+            # ISO date format ensures international compatibility
+            # ISO日期格式确保国际兼容性
+            # Pretty printing with indent=2 for readability
+            # 使用indent=2进行美化打印以提高可读性
+            with staged_file(file_path) as tmp_path:
+                df.to_json(tmp_path, orient='records', date_format='iso', indent=2)
+            
+            # Return relative path for web UI access
+            # 返回用于Web UI访问的相对路径
+            rel_path = os.path.join("exports", f"{filename}.json")
+            return f"JSON file exported successfully: {rel_path}"
+            
+        # ========================================================================
+        # STEP 3C: PDF FORMAT EXPORT PROCESSING
+        # 步骤3C：PDF格式导出处理
+        # ========================================================================
+        
+        elif format_type.lower() == 'pdf':
+            # PDF export for executive reports and presentations
+            # 面向执行报告和演示的PDF导出
+            file_path = os.path.join(exports_dir, f"{filename}.pdf")
+            
+            # Paginated tables with repeated headers, plus any fig_inter figures
+            # 带重复表头的分页表格，以及 fig_inter 生成的图像
+            with staged_file(file_path) as tmp_path:
+                result = write_pdf_report(df, tmp_path, f"Data Export: {df_name}", figures, progress=progress)
+            
+            # Return relative path for web UI access
+            # 返回用于Web UI访问的相对路径
+            rel_path = os.path.join("exports", f"{filename}.pdf")
+            shown = (f"{result['rows']:,} rows" if result["rows"] == result["total_rows"]
+                     else f"first {result['rows']:,} of {result['total_rows']:,} rows")
+            embedded = f", {result['figures']} figure(s)" if figures else ""
+            skipped = (f"\nNot embedded (SVG without svglib or a PNG thumbnail; install svglib or re-render "
+                       f"with output_format='png'): {', '.join(result['skipped_figures'])}"
+                       if result["skipped_figures"] else "")
+            return (f"PDF file exported successfully: {rel_path} ({shown}, {result['pages']} pages{embedded}, "
+                    f"{format_bytes(result['bytes'])}, {result['seconds']:.1f}s){skipped}")
+            
+        # ========================================================================
+        # STEP 3D: COLUMNAR AND COMPRESSED TEXT FORMATS
+        # 步骤3D：列式与压缩文本格式
+        # ========================================================================
+        
+        elif format_type.lower() in EXPORT_CODECS:
+            # Chunked pyarrow / compressed writers keep memory flat for large frames
+            # 分块的pyarrow/压缩写入器使大型DataFrame的内存占用保持平稳
+            fmt = format_type.lower()
+            codec = export_codec(fmt, compression)
+            suffix = export_suffix(fmt, codec)
+            file_path = os.path.join(exports_dir, f"{filename}{suffix}")
+            with staged_file(file_path) as tmp_path:
+                result = write_columnar(df, tmp_path, fmt, codec, compression_level, progress=progress)
+            
+            # Return relative path for web UI access
+            # 返回用于Web UI访问的相对路径
+            rel_path = os.path.join("exports", f"{filename}{suffix}")
+            return (f"{fmt.upper()} file exported successfully: {rel_path} ({result['rows']:,} rows, {codec}, "
+                    f"{format_bytes(result['bytes'])}, {result['seconds']:.1f}s)")
+            
+        # ========================================================================
+        # STEP 3E: UNSUPPORTED FORMAT HANDLING
+        # 步骤3E：不支持格式处理
+        # ========================================================================
+        
+        else:
+            # Handle unsupported export formats gracefully
+            # 优雅地处理不支持的导出格式
+            return (f"Error: Unsupported format '{format_type}'. "
+                    "Supported formats: excel, json, pdf, parquet, feather, csv, ndjson")
+            
+    except Exception as e:
+        # Catch and report any unexpected errors during export process
+        # 捕获并报告导出过程中的任何意外错误
+        return f"Export failed: {str(e)}"
 
 # Data export schema definition / 数据导出模式定义
 class DataExportSchema(BaseModel):
@@ -393,11 +3332,16 @@ class DataExportSchema(BaseModel):
     确保导出操作的参数类型和格式验证正确
     """
     df_name: str = Field(description="Name of the pandas DataFrame variable to export / 要导出的pandas DataFrame变量名")
-    format_type: str = Field(description="Export format: 'excel', 'json', or 'pdf' / 导出格式：'excel'、'json'或'pdf'")
+    format_type: str = Field(description="Export format: 'excel', 'json', 'pdf', 'parquet', 'feather', 'csv' or 'ndjson' / 导出格式")
     filename: str = Field(description="Output filename (without extension) / 输出文件名（不包含扩展名）")
+    compression: str = Field(default="", description="Codec for parquet (zstd*, snappy, gzip, lz4, brotli, none), feather (lz4*, zstd, none), csv/ndjson (gzip*, zstd, none); empty uses the default marked * / 压缩算法，留空使用默认值")
+    compression_level: int = Field(default=0, description="Compression level for zstd (1-22), gzip (1-9) or brotli (0-11); 0 uses the codec default / 压缩级别，0 表示默认")
+    figures: str = Field(default="", description="PDF only: comma-separated image paths returned by fig_inter (e.g. images/3f2a.png) to embed above the table / 仅 PDF：要嵌入表格上方的 fig_inter 图像路径，逗号分隔")
+    background: str = Field(default="auto", description="'auto' exports large frames as a background job, 'yes' always, 'no' never; poll background jobs with export_status / 'auto' 在后台导出大型数据，'yes' 总是，'no' 从不；用 export_status 轮询后台任务")
 
 @tool(args_schema=DataExportSchema)
-def export_data(df_name: str, format_type: str, filename: str) -> str:
+def export_data(df_name: str, format_type: str, filename: str, compression: str = "", compression_level: int = 0,
+                figures: str = "", background: str = "auto", config: RunnableConfig = None) -> str:
     """
     MULTI-FORMAT DATA EXPORT FUNCTION
     多格式数据导出功能
@@ -414,200 +3358,104 @@ def export_data(df_name: str, format_type: str, filename: str) -> str:
     EXPORT FORMATS & USE CASES / 导出格式和使用场景:
     1. Excel (.xlsx): Business users, data manipulation, pivot tables / 业务用户、数据操作、数据透视表
     2. JSON (.json): API integration, web applications, data exchange / API集成、Web应用、数据交换
-    3. PDF (.pdf): Executive reports, presentations, documentation / 执行报告、演示、文档
+    3. PDF (.pdf): Executive reports with paginated tables and embedded figures / 带分页表格和嵌入图像的执行报告
+    4. Parquet / Feather (.parquet, .feather): Columnar files for pandas, Spark, DuckDB / 供pandas、Spark、DuckDB使用的列式文件
+    5. CSV / NDJSON (.csv.gz, .ndjson.zst, ...): Compressed text for pipelines / 供数据管道使用的压缩文本
     
     WORKFLOW PROCESS / 工作流程:
     Step 1: Validate DataFrame existence and type / 步骤1：验证DataFrame存在性和类型
     Step 2: Create export directory structure / 步骤2：创建导出目录结构
-    Step 3: Execute format-specific export logic / 步骤3：执行特定格式的导出逻辑
-    Step 4: Return success status and file path / 步骤4：返回成功状态和文件路径
+    Step 3: Execute format-specific export logic, in the background for large frames / 步骤3：执行特定格式的导出逻辑，大型数据在后台执行
+    Step 4: Return success status and file path, or a job id for export_status / 步骤4：返回成功状态和文件路径，或供 export_status 使用的任务 id
     
     :param df_name: Name of the pandas DataFrame variable to export / 要导出的pandas DataFrame变量名
-    :param format_type: Export format - 'excel', 'json', or 'pdf' / 导出格式 - 'excel'、'json'或'pdf'
+    :param format_type: Export format - 'excel', 'json', 'pdf', 'parquet', 'feather', 'csv' or 'ndjson' / 导出格式
     :param filename: Output filename without extension / 不包含扩展名的输出文件名
+    :param compression: Codec for the columnar and text formats, '' for the format default / 压缩算法，''表示默认
+    :param compression_level: Codec level, 0 for its default / 压缩级别，0表示默认
+    :param figures: fig_inter image paths to embed in a PDF report / 要嵌入PDF报告的fig_inter图像路径
+    :param background: 'auto', 'yes' or 'no' - run the export as a background job / 是否作为后台任务导出
     :return: Export status and relative file path for web access / 导出状态和用于Web访问的相对文件路径
     """
+    # Keep the workspace marked in use while reading it / 读取期间将工作区标记为使用中
+    with workspace_manager.use(config) as ws:
+        return _export_data(ws, df_name, format_type, filename, compression, compression_level, figures, background)
+
+
+def _export_data(g: Workspace, df_name: str, format_type: str, filename: str, compression: str, compression_level: int,
+                 figures: str, background: str) -> str:
+    """Body of export_data, reading from the given workspace / export_data 的主体，从给定工作区读取"""
     try:
         # ========================================================================
         # STEP 1: DATAFRAME VALIDATION AND RETRIEVAL
         # 步骤1：DataFrame验证和获取
         # ========================================================================
         
-        # Retrieve DataFrame from global namespace (injected by extract_data or python_inter)
-        # 从全局命名空间获取DataFrame（由extract_data或python_inter注入）
-        g = globals()
+        # Retrieve DataFrame from the session workspace (injected by extract_data or python_inter)
+        # 从会话工作区获取DataFrame（由extract_data或python_inter注入）
         if df_name not in g:
             return f"Error: DataFrame '{df_name}' not found. Please extract or create the DataFrame first."
         
         # Ensure the object is actually a pandas DataFrame
         # 确保对象确实是pandas DataFrame
-        df = g[df_name]
-        if not isinstance(df, pd.DataFrame):
-            return f"Error: '{df_name}' is not a pandas DataFrame."
-        
-        # ========================================================================
-        # STEP 2: EXPORT DIRECTORY SETUP AND FILE PATH MANAGEMENT
-        # 步骤2：导出目录设置和文件路径管理
-        # ========================================================================
-        
-        # Define base directory for web-accessible exports
-        # 定义用于Web可访问导出的基本目录
-        # This path allows the web UI to access exported files
-        # 此路径允许Web UI访问导出的文件
-        base_dir = os.getenv('PUBLIC_DIR', "/app/shared/public")
-        exports_dir = os.path.join(base_dir, "exports")
-        
-        # Create exports directory if it doesn't exist
-        # 如果导出目录不存在则创建
-        os.makedirs(exports_dir, exist_ok=True)
-        
-        # ========================================================================
-        # STEP 3A: EXCEL FORMAT EXPORT PROCESSING
-        # 步骤3A：Excel格式导出处理
-        # ========================================================================
-        
-        if format_type.lower() == 'excel':
-            # Excel export for business users and data manipulation
-            # 面向业务用户和数据操作的Excel导出
-            file_path = os.path.join(exports_dir, f"{filename}.xlsx")
-            
-            # Export DataFrame to Excel with index for row identification
-            # 将DataFrame导出为Excel，包含索引用于行识别
-            # openpyxl engine provides robust Excel compatibility
-            # openpyxl引擎提供强大的Excel兼容性
-            df.to_excel(file_path, index=True, engine='openpyxl')
-            
-            # Return relative path for web UI access
-            # 返回用于Web UI访问的相对路径
-            rel_path = os.path.join("exports", f"{filename}.xlsx")
-            return f"Excel file exported successfully: {rel_path}"
-            
-        # ========================================================================
-        # STEP 3B: JSON FORMAT EXPORT PROCESSING
-        # 步骤3B：JSON格式导出处理
-        # ========================================================================
-        
-        elif format_type.lower() == 'json':
-            # JSON export for API integration and web applications
-            # 面向API集成和Web应用的JSON导出
-            file_path = os.path.join(exports_dir, f"{filename}.json")
-            
-            # Export DataFrame as JSON with records orientation
-            # 以records方向将DataFrame导出为JSON
-            # 'records' format: [{col1: val1, col2: val2}, ...] - most API-friendly
-            # 'records'格式：[{col1: val1, col2: val2}, ...] - 最适合API
-            # ISO date format ensures international compatibility
-            # ISO日期格式确保国际兼容性
-            # Pretty printing with indent=2 for readability
-            # 使用indent=2进行美化打印以提高可读性
-            df.to_json(file_path, orient='records', date_format='iso', indent=2)
-            
-            # Return relative path for web UI access
-            # 返回用于Web UI访问的相对路径
-            rel_path = os.path.join("exports", f"{filename}.json")
-            return f"JSON file exported successfully: {rel_path}"
-            
+        df = g[df_name]
+        if not isinstance(df, pd.DataFrame):
+            return f"Error: '{df_name}' is not a pandas DataFrame."
+        
         # ========================================================================
-        # STEP 3C: PDF FORMAT EXPORT PROCESSING
-        # 步骤3C：PDF格式导出处理
+        # STEP 2: EXPORT DIRECTORY SETUP AND FILE PATH MANAGEMENT
+        # 步骤2：导出目录设置和文件路径管理
         # ========================================================================
         
-        elif format_type.lower() == 'pdf':
-            # PDF export for executive reports and presentations
-            # 面向执行报告和演示的PDF导出
-            file_path = os.path.join(exports_dir, f"{filename}.pdf")
-            
-            # ================================================================
-            # PDF DOCUMENT STRUCTURE INITIALIZATION
-            # PDF文档结构初始化
-            # ================================================================
-            # Create professional PDF document with standard letter size
-            # 创建标准信纸尺寸的专业PDF文档
-            doc = SimpleDocTemplate(file_path, pagesize=letter)
-            elements = []  # Document elements container / 文档元素容器
-            styles = getSampleStyleSheet()  # Professional styling / 专业样式
-            
-            # ================================================================
-            # DOCUMENT HEADER AND METADATA
-            # 文档标题和元数据
-            # ================================================================
-            # Add professional title for the data export
-            # 为数据导出添加专业标题
-            title = Paragraph(f"Data Export: {df_name}", styles['Title'])
-            elements.append(title)
-            
-            # Add timestamp for report tracking and versioning
-            # 添加时间戳用于报告跟踪和版本管理
-            timestamp = Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal'])
-            elements.append(timestamp)
-            
-            # ================================================================
-            # DATA TABLE PREPARATION AND FORMATTING
-            # 数据表格准备和格式化
-            # ================================================================
-            # Convert DataFrame to table format with headers
-            # 将DataFrame转换为带有标题的表格格式
-            data = [df.columns.tolist()]  # Start with column headers / 以列标题开始
-            
-            # Limit rows for PDF readability and performance
-            # 限制行数以提高PDF可读性和性能
-            max_rows = min(50, len(df))  # Maximum 50 rows for optimal PDF rendering / 最多50行以优化PDF渲染
-            
-            # Convert DataFrame rows to string format for PDF compatibility
-            # 将DataFrame行转换为字符串格式以兼容PDF
-            for _, row in df.head(max_rows).iterrows():
-                data.append([str(x) for x in row.tolist()])
-            
-            # ================================================================
-            # PROFESSIONAL TABLE STYLING
-            # 专业表格样式
-            # ================================================================
-            # Create formatted table with professional styling
-            # 创建具有专业样式的格式化表格
-            table = Table(data)
-            table.setStyle(TableStyle([
-                # Header row styling / 标题行样式
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),        # Header background / 标题背景
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),   # Header text color / 标题文本颜色
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),              # Center alignment / 居中对齐
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),    # Bold header font / 粗体标题字体
-                ('FONTSIZE', (0, 0), (-1, 0), 12),                  # Header font size / 标题字体大小
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),             # Header padding / 标题内边距
-                # Data rows styling / 数据行样式
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),     # Data background / 数据背景
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)         # Table grid / 表格网格
-            ]))
-            
-            elements.append(table)
-            
-            # ================================================================
-            # PAGINATION NOTICE FOR LARGE DATASETS
-            # 大型数据集的分页通知
-            # ================================================================
-            # Add note if data was truncated for PDF optimization
-            # 如果为了PDF优化而截断数据，则添加说明
-            if len(df) > max_rows:
-                note = Paragraph(f"Note: Only first {max_rows} rows shown. Total rows: {len(df)}", styles['Normal'])
-                elements.append(note)
-            
-            # Build the PDF document with all elements
-            # 使用所有元素构建PDF文档
-            doc.build(elements)
-            
-            # Return relative path for web UI access
-            # 返回用于Web UI访问的相对路径
-            rel_path = os.path.join("exports", f"{filename}.pdf")
-            return f"PDF file exported successfully: {rel_path}"
-            
+        # Define base directory for web-accessible exports
+        # 定义用于Web可访问导出的基本目录
+        # This path allows the web UI to access exported files
+        # 此路径允许Web UI访问导出的文件
+        base_dir = os.getenv('PUBLIC_DIR', "/app/shared/public")
+        exports_dir = os.path.join(base_dir, "exports")
+        
+        # Create exports directory if it doesn't exist
+        # 如果导出目录不存在则创建
+        os.makedirs(exports_dir, exist_ok=True)
+        
         # ========================================================================
-        # STEP 3D: UNSUPPORTED FORMAT HANDLING
-        # 步骤3D：不支持格式处理
+        # STEP 2B: FOREGROUND OR BACKGROUND EXPORT
+        # 步骤2B：前台或后台导出
         # ========================================================================
         
+        # Reject bad formats and codecs before queueing anything
+        # 在排队之前拒绝无效的格式和压缩算法
+        fmt = format_type.lower()
+        if fmt in ("excel", "json", "pdf"):
+            suffix = {"excel": ".xlsx", "json": ".json", "pdf": ".pdf"}[fmt]
+        elif fmt in EXPORT_CODECS:
+            suffix = export_suffix(fmt, export_codec(fmt, compression))
         else:
-            # Handle unsupported export formats gracefully
-            # 优雅地处理不支持的导出格式
-            return f"Error: Unsupported format '{format_type}'. Supported formats: excel, json, pdf"
+            return (f"Error: Unsupported format '{format_type}'. "
+                    "Supported formats: excel, json, pdf, parquet, feather, csv, ndjson")
+        figure_paths, unknown = resolve_figures(figures) if fmt == "pdf" else ([], [])
+        if unknown:
+            return f"Error: figures not found in the image store: {', '.join(unknown)}. Pass paths returned by fig_inter."
+        mode = (background or "auto").lower()
+        if mode not in ("auto", "yes", "no"):
+            return f"Error: background must be 'auto', 'yes' or 'no', got '{background}'."
+        if mode == "no" or (mode == "auto" and df.size <= EXPORT_BACKGROUND_CELLS):
+            return _write_export(df, df_name, format_type, filename, exports_dir, compression, compression_level,
+                                 figures=figure_paths)
+        
+        # Shallow copy under copy-on-write (always on since pandas 3): later edits to the variable do not reach the job
+        # 写时复制下的浅拷贝（pandas 3 起始终启用）：之后对变量的修改不会影响导出任务
+        snapshot = df.copy(deep=False)
+        rel_path = os.path.join("exports", f"{filename}{suffix}")
+        job_id = export_jobs.submit(
+            g.thread_id,
+            {"df_name": df_name, "format": fmt, "rows": len(snapshot), "rel_path": rel_path,
+             "file_path": os.path.join(exports_dir, f"{filename}{suffix}")},
+            lambda progress: _write_export(snapshot, df_name, format_type, filename, exports_dir,
+                                           compression, compression_level, figures=figure_paths,
+                                           progress=progress))
+        return (f"Export job {job_id} queued: {len(snapshot):,} rows of '{df_name}' to {rel_path}. "
+                f"Call export_status with job_id='{job_id}' to follow progress; the file appears once it is complete.")
             
     except Exception as e:
         # ========================================================================
@@ -618,6 +3466,411 @@ def export_data(df_name: str, format_type: str, filename: str) -> str:
         # 捕获并报告导出过程中的任何意外错误
         return f"Export failed: {str(e)}"
 
+class ExportStatusSchema(BaseModel):
+    job_id: str = Field(default="", description="Job id returned by export_data; empty lists every export job of this conversation / export_data 返回的任务 id；为空则列出本会话的所有导出任务")
+
+
+@tool(args_schema=ExportStatusSchema)
+def export_status(job_id: str = "", config: RunnableConfig = None) -> str:
+    """
+    Poll background export jobs: status, rows written, and the final path and size once completed.
+    轮询后台导出任务：状态、已写入行数，以及完成后的最终路径和大小。
+
+    :param job_id: Job id from export_data, or empty for all jobs of this conversation
+    :return: JSON list of job reports
+    """
+    reports = export_jobs.status(thread_id_of(config), job_id.strip())
+    if job_id.strip() and not reports:
+        return f"Error: export job '{job_id}' not found in this conversation."
+    if not reports:
+        return "No export jobs in this conversation."
+    return json.dumps(reports, ensure_ascii=False, indent=2)
+
+# ============================================================================
+# COLUMN PROFILES
+# 列画像
+# ============================================================================
+# data_preview and data_quality_check read their statistics from one column
+# profile: memory, missing counts and distinct counts per column, and a single
+# numpy pass over the numeric block for min/max/mean/std/quartiles. Profiles
+# are cached against the variable's workspace version, which changes whenever
+# code rebinds or mutates it, so asking again about an unchanged frame costs
+# nothing and no hashing pass is needed to find out.
+# data_preview 和 data_quality_check 从同一份列画像读取统计信息：每列的内存、缺失数和
+# 唯一值数，以及对数值列整体做一次 numpy 计算得到的最小/最大/均值/标准差/四分位数。画像按
+# 变量在工作区中的版本缓存（代码重新绑定或修改变量时版本都会变化），因此再次查询未改变的
+# DataFrame 几乎没有开销，也无需额外的哈希计算。
+# ============================================================================
+
+# Columns with at most this many distinct values get their top values listed / 唯一值不超过该数量的列列出高频值
+PROFILE_TOP_DISTINCT = 10
+PROFILE_TOP_VALUES = 5
+
+
+def _profile_kind(dtype) -> str:
+    """numeric / categorical / datetime / other, matching the select_dtypes groups the reports used / 与报告原先使用的 select_dtypes 分组一致"""
+    if pd.api.types.is_bool_dtype(dtype):
+        return "other"
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_complex_dtype(dtype):
+        return "numeric"
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        return "categorical"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    return "other"
+
+
+def profile_frame(df: pd.DataFrame) -> dict:
+    """
+    Per-column statistics of df, each computed once for the whole frame
+    df 的逐列统计信息，每项统计对整个 DataFrame 只计算一次
+
+    :return: {"rows", "memory_bytes", "columns": [{"name", "dtype", "kind", "memory", "missing",
+              "unique" (categorical), "top" (few distinct values), "min", "max", "mean", "std", "q1", "median",
+              "q3" (numeric)}], "seconds"}
+    """
+    started = time.perf_counter()
+    memory = df.memory_usage(deep=True, index=False).to_numpy()
+    missing = df.isna().sum().to_numpy()
+    columns = []
+    for k, (name, dtype) in enumerate(zip(df.columns, df.dtypes)):
+        column = df.iloc[:, k]
+        kind = _profile_kind(dtype)
+        unique = None
+        # Distinct counts are only reported for text/category columns / 只有文本/分类列需要唯一值数
+        if kind == "categorical":
+            try:
+                unique = int(column.nunique())
+            except TypeError:
+                pass  # unhashable values such as lists / 不可哈希的值（如列表）
+        info = {"name": name, "dtype": str(dtype), "kind": kind, "memory": int(memory[k]),
+                "missing": int(missing[k]), "unique": unique}
+        if unique is not None and unique <= PROFILE_TOP_DISTINCT:
+            info["top"] = list(column.value_counts().head(PROFILE_TOP_VALUES).index)
+        columns.append(info)
+
+    # One pass over the numeric block instead of describe() per report / 对数值列整体计算一次，而非每份报告调用 describe()
+    numeric = [k for k, info in enumerate(columns) if info["kind"] == "numeric"]
+    if numeric:
+        values = df.iloc[:, numeric].to_numpy(dtype=np.float64, na_value=np.nan)
+        if len(df):
+            with np.errstate(all="ignore"), warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                stats = {"min": np.nanmin(values, axis=0), "max": np.nanmax(values, axis=0),
+                         "mean": np.nanmean(values, axis=0), "std": np.nanstd(values, axis=0, ddof=1)}
+                stats["q1"], stats["median"], stats["q3"] = np.nanpercentile(values, [25, 50, 75], axis=0)
+        else:
+            stats = {key: np.full(len(numeric), np.nan) for key in ("min", "max", "mean", "std", "q1", "median", "q3")}
+        for j, k in enumerate(numeric):
+            columns[k].update({key: float(stat[j]) for key, stat in stats.items()})
+    return {"rows": len(df), "memory_bytes": int(memory.sum()) + int(df.index.memory_usage(deep=True)),
+            "columns": columns, "seconds": time.perf_counter() - started}
+
+
+class ProfileCache:
+    """
+    LRU cache of frame profiles and reports keyed by (frame version, kind)
+    按（DataFrame 版本、类型）缓存的画像与报告 LRU 缓存
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "compute_seconds": 0.0}
+
+    def get(self, key, compute) -> tuple:
+        """
+        (value, cached) for key, calling compute() on a miss; a None key is never cached
+        返回 key 对应的 (value, cached)，未命中时调用 compute()；key 为 None 时不缓存
+        """
+        if key is not None:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return self._entries[key], True
+        started = time.perf_counter()
+        value = compute()
+        with self._lock:
+            self._stats["misses"] += 1
+            self._stats["compute_seconds"] += time.perf_counter() - started
+            if key is not None:
+                self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+        return value, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, **self._stats}
+
+
+profile_cache = ProfileCache(int(os.getenv('PROFILE_CACHE_SIZE', '64')))
+
+
+def cached_profile(ws, name: str, kind: str, compute) -> tuple:
+    """
+    (value, cached) for a workspace frame, cached against its workspace version
+    工作区 DataFrame 的 (value, cached)，按其工作区版本缓存
+    """
+    version = ws.versions.get(name)
+    key = (ws.thread_id, ws.created, name, version, kind) if version is not None else None
+    return profile_cache.get(key, compute)
+
+# ============================================================================
+# APPROXIMATE PROFILES FOR LARGE FRAMES
+# 大型 DataFrame 的近似画像
+# ============================================================================
+# Above PROFILE_APPROX_ROWS rows the exact distinct counts, quantiles, deep
+# memory sizes and duplicate scans cost minutes. The approximate profile keeps
+# the cheap statistics exact (missing counts, min/max/mean/std) and replaces
+# the rest:
+#   - distinct counts: HyperLogLog over 64-bit value hashes (about ±1.6% at 95%)
+#   - quartiles, top values, text checks: a uniform row sample, with a
+#     Dvoretzky-Kiefer-Wolfowitz bound on the quantile rank error
+#   - duplicates: equal 64-bit row hashes instead of sorting whole rows
+# The frame is in memory, so sample rows are drawn directly instead of through
+# a streaming reservoir. Reports state the bounds, the time taken and the
+# exact-path time extrapolated from the sample.
+# 超过 PROFILE_APPROX_ROWS 行时，精确的唯一值计数、分位数、深度内存统计和重复检测需要数分钟。
+# 近似画像保留廉价统计的精确值（缺失数、最小/最大/均值/标准差），其余部分替换为：
+#   - 唯一值计数：基于 64 位值哈希的 HyperLogLog（95% 置信度下约 ±1.6%）
+#   - 四分位数、高频值、文本检查：均匀行样本，分位数秩误差由 DKW 不等式给出上界
+#   - 重复行：比较 64 位行哈希，而不是对整行排序
+# DataFrame 位于内存中，因此直接抽取样本行，无需流式蓄水池抽样。报告会注明误差界、耗时，
+# 以及根据样本外推的精确路径耗时。
+# ============================================================================
+
+PROFILE_APPROX_ROWS = int(os.getenv('PROFILE_APPROX_ROWS', '5000000'))
+PROFILE_SAMPLE_ROWS = int(os.getenv('PROFILE_SAMPLE_ROWS', '200000'))
+# 2**14 registers: 16 KB per column, standard error 1.04 / sqrt(2**14) / 2**14 个寄存器：每列 16 KB，标准误差 1.04 / sqrt(2**14)
+HLL_PRECISION = 14
+_HASH_BLOCK = 1 << 16
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finaliser, vectorised over uint64 / 向量化的 splitmix64 混合函数"""
+    values = values.copy()
+    with np.errstate(over="ignore"):
+        values ^= values >> np.uint64(30)
+        values *= np.uint64(0xBF58476D1CE4E5B9)
+        values ^= values >> np.uint64(27)
+        values *= np.uint64(0x94D049BB133111EB)
+        values ^= values >> np.uint64(31)
+    return values
+
+
+def _arrow_string_hashes(array) -> np.ndarray:
+    """
+    64-bit hashes of an Arrow string array, computed on its byte buffers block by block
+    直接在字节缓冲区上分块计算 Arrow 字符串数组的 64 位哈希
+    """
+    array = array.combine_chunks() if isinstance(array, pa.ChunkedArray) else array
+    array = array.cast(pa.large_string())
+    _, offsets, data = array.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    data = np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, dtype=np.uint8)
+    lengths = np.diff(offsets)
+    # Odd per-position multipliers: a position-weighted byte sum / 每个位置一个奇数乘数：按位置加权的字节和
+    weights = _mix64(np.arange(1, int(lengths.max(initial=0)) + 1, dtype=np.uint64)) | np.uint64(1)
+    sums = np.zeros(len(array), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for start in range(0, len(array), _HASH_BLOCK):
+            end = min(start + _HASH_BLOCK, len(array))
+            block_offsets, block_lengths = offsets[start:end + 1], lengths[start:end]
+            starts = block_offsets[:-1] - block_offsets[0]
+            chunk = data[block_offsets[0]:block_offsets[-1]]
+            position = np.arange(len(chunk)) - np.repeat(starts, block_lengths)
+            terms = (chunk.astype(np.uint64) + np.uint64(1)) * weights[position]
+            filled = block_lengths > 0
+            if filled.any():
+                sums[start:end][filled] = np.add.reduceat(terms, starts[filled])
+        hashes = _mix64(sums ^ (lengths.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)))
+    if array.null_count:
+        hashes[np.asarray(array.is_null())] = np.uint64(0x5A5A5A5A5A5A5A5A)  # nulls differ from "" / 空值与空字符串区分
+    return hashes
+
+
+def column_hashes(series: pd.Series) -> np.ndarray:
+    """
+    64-bit hash per value; the fastest route for the column's storage
+    每个值的 64 位哈希；按列的存储方式选择最快的计算路径
+
+    :raises TypeError: for unhashable values such as lists / 列表等不可哈希的值
+    """
+    array = series.array
+    if isinstance(array, pd.arrays.ArrowStringArray) or (
+            hasattr(array, "_pa_array") and pa.types.is_string(array._pa_array.type)):
+        return _arrow_string_hashes(array._pa_array)
+    if series.dtype == object:
+        values = series.to_numpy()
+        if pd.api.types.infer_dtype(values, skipna=True) not in ("string", "empty"):
+            # Mixed objects: factorise so that 1, 1.0 and True hash alike, as duplicated() compares them
+            # 混合对象：先因子化，使 1、1.0 和 True 的哈希相同，与 duplicated() 的比较一致
+            return pd.util.hash_array(pd.factorize(values)[0])
+        # Low-cardinality text hashes its distinct values once; factorising first is slower on high-cardinality text
+        # 低基数文本只对唯一值哈希一次；高基数文本先因子化更慢
+        categorize = len(pd.unique(values[:_HASH_BLOCK])) < _HASH_BLOCK // 64
+        return pd.util.hash_array(values, categorize=categorize)
+    if series.dtype.kind == "f":
+        series = series + 0.0  # -0.0 and 0.0 compare equal / -0.0 与 0.0 相等
+    return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-bit hash of every row, combined from the column hashes / 由各列哈希组合得到的每行 64 位哈希"""
+    combined = np.full(len(df), 0x243F6A8885A308D3, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        # Column hashes are already mixed: combine them as a polynomial, then mix once
+        # 列哈希已充分混合：按多项式组合后只做一次混合
+        for k in range(df.shape[1]):
+            combined *= np.uint64(0x100000001B3)
+            combined += column_hashes(df.iloc[:, k])
+    return _mix64(combined)
+
+
+def _hashable_value(value):
+    """Hashable stand-in that compares like value: containers become tuples / 与原值比较结果一致的可哈希替代值：容器转为元组"""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_hashable_value(v) for v in value)
+    if isinstance(value, dict):
+        return frozenset((k, _hashable_value(v)) for k, v in value.items())
+    if isinstance(value, set):
+        return frozenset(value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def hashable_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """df with unhashable cells replaced by hashable stand-ins, so duplicated() works / 将不可哈希的单元格替换为可哈希值，使 duplicated() 可用"""
+    out = df.copy(deep=False)
+    for k in range(df.shape[1]):
+        if df.dtypes.iloc[k] == object:
+            values = df.iloc[:, k].to_numpy()
+            try:
+                pd.factorize(values)
+            except TypeError:
+                out.isetitem(k, [_hashable_value(v) for v in values])
+    return out
+
+
+def hll_distinct(hashes: np.ndarray, precision: int = HLL_PRECISION) -> int:
+    """
+    HyperLogLog distinct-count estimate from 64-bit hashes
+    基于 64 位哈希的 HyperLogLog 唯一值数估计
+    """
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    if len(hashes):
+        index = (hashes >> np.uint64(64 - precision)).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+        # Leading zeros + 1 of the remaining bits; frexp is exact below 2**53 / 剩余位的前导零个数 + 1；低于 2**53 时 frexp 是精确的
+        rank = ((64 - precision) - np.frexp(rest.astype(np.float64))[1] + 1).astype(np.uint8)
+        np.maximum.at(registers, index, rank)
+    m = float(len(registers))
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)  # linear counting for small sets / 小基数时使用线性计数
+    return int(round(estimate))
+
+
+def profile_sample(df: pd.DataFrame) -> pd.DataFrame:
+    """Uniform sample of PROFILE_SAMPLE_ROWS rows, the same on every call / 均匀抽取的 PROFILE_SAMPLE_ROWS 行样本，每次调用相同"""
+    if len(df) <= PROFILE_SAMPLE_ROWS:
+        return df
+    rows = np.sort(np.random.default_rng(0).choice(len(df), PROFILE_SAMPLE_ROWS, replace=False))
+    return df.iloc[rows]
+
+
+def quantile_rank_error(sample_rows: int, confidence: float = 0.95) -> float:
+    """DKW bound: sample quantiles are within this rank distance of the true ones / DKW 界：样本分位数与真实分位数的秩距离不超过该值"""
+    return float(np.sqrt(np.log(2 / (1 - confidence)) / (2 * max(sample_rows, 1))))
+
+
+def use_approximate(df: pd.DataFrame, mode: str) -> bool:
+    """Whether mode ('auto', 'exact' or 'approx') selects the approximate path for df / mode 是否为 df 选择近似路径"""
+    return mode == "approx" or (mode == "auto" and PROFILE_APPROX_ROWS and len(df) > PROFILE_APPROX_ROWS)
+
+
+def approximate_profile(df: pd.DataFrame) -> dict:
+    """
+    profile_frame for very large frames: exact cheap statistics, sketches and a sample for the rest
+    用于超大 DataFrame 的 profile_frame：廉价统计保持精确，其余使用草图和样本
+
+    :return: profile_frame's layout plus "approx": {"sample_rows", "quantile_rank_error", "distinct_error",
+             "duplicate_false_matches", "exact_seconds_estimate"}
+    """
+    started = time.perf_counter()
+    sample = profile_sample(df)
+    profile = profile_frame(sample)
+    rows, scale = len(df), len(df) / max(len(sample), 1)
+    missing = df.isna().sum().to_numpy()
+    memory = 0
+    for k, info in enumerate(profile["columns"]):
+        column = df.iloc[:, k]
+        info["missing"] = int(missing[k])
+        # Deep sizes of Python objects are scaled up from the sample / Python 对象的深度内存由样本按比例估算
+        info["memory"] = int(info["memory"] * scale) if column.dtype == object else int(
+            column.memory_usage(deep=True, index=False))
+        memory += info["memory"]
+        if info["kind"] == "categorical":
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                info["unique"] = int(column.nunique())
+            else:
+                try:
+                    hashes = column_hashes(column)
+                    info["unique"] = hll_distinct(hashes[column.notna().to_numpy()])
+                    info["approx_unique"] = True
+                except TypeError:
+                    # Unhashable values such as lists have no distinct count, as in profile_frame
+                    # 列表等不可哈希的值不统计唯一值数，与 profile_frame 一致
+                    info["unique"] = None
+            if info["unique"] is None:
+                info.pop("top", None)
+            elif info["unique"] > PROFILE_TOP_DISTINCT:
+                info.pop("top", None)
+            elif "top" not in info:
+                info["top"] = list(sample.iloc[:, k].value_counts().head(PROFILE_TOP_VALUES).index)
+        elif info["kind"] == "numeric" and rows:
+            # Moments and extremes stay exact: one cheap pass per column / 矩和极值保持精确：每列一次廉价计算
+            values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+            with np.errstate(all="ignore"), warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                info.update(min=float(np.nanmin(values)), max=float(np.nanmax(values)),
+                            mean=float(np.nanmean(values)), std=float(np.nanstd(values, ddof=1)))
+    exact_estimate = profile["seconds"] * scale
+    profile.update(rows=rows, memory_bytes=memory + int(df.index.memory_usage(deep=False)),
+                   seconds=time.perf_counter() - started)
+    profile["approx"] = {
+        "sample_rows": len(sample),
+        "quantile_rank_error": quantile_rank_error(len(sample)),
+        "distinct_error": 2 * 1.04 / np.sqrt(1 << HLL_PRECISION),
+        # Expected number of row pairs whose 64-bit hashes collide / 64 位哈希发生碰撞的期望行对数
+        "duplicate_false_matches": rows * (rows - 1) / 2 / 2.0 ** 64,
+        "exact_seconds_estimate": exact_estimate,
+    }
+    return profile
+
+
+def approximation_notes(profile: dict) -> list:
+    """Report lines stating the error bounds and timing of an approximate profile / 说明近似画像误差界和耗时的报告行"""
+    approx = profile["approx"]
+    return [
+        f"≈ APPROXIMATE MODE ({profile['rows']:,} rows; pass mode='exact' for exact statistics):",
+        f"  • Quartiles, top values and text checks from a {approx['sample_rows']:,}-row uniform sample; "
+        f"quantile rank error ≤ ±{approx['quantile_rank_error'] * 100:.2f} percentile points (95%, DKW bound)",
+        f"  • Distinct counts of text columns by HyperLogLog: ±{approx['distinct_error'] * 100:.1f}% (95%)",
+        f"  • Duplicates by 64-bit row hashes: expected false matches {approx['duplicate_false_matches']:.1e}",
+        "  • Missing counts, min/max/mean/std are exact; memory of object columns is scaled from the sample",
+        f"  • Profiled in {profile['seconds']:.1f}s; exact path estimated at ~{approx['exact_seconds_estimate']:.0f}s "
+        f"(linear extrapolation from the sample)",
+    ]
+
 # ============================================================================
 # COMPREHENSIVE DATA PREVIEW TOOL CONFIGURATION
 # 综合数据预览工具配置
@@ -642,9 +3895,14 @@ class DataPreviewSchema(BaseModel):
         ge=1,      # Minimum 1 row / 最少 1 行
         le=100     # Maximum 100 rows for performance / 最多 100 行以保证性能
     )
+    
+    mode: str = Field(
+        default="auto",
+        description="'auto' uses approximate statistics above PROFILE_APPROX_ROWS rows; 'exact' or 'approx' forces one / 'auto' 在超过 PROFILE_APPROX_ROWS 行时使用近似统计；'exact' 或 'approx' 强制指定"
+    )
 
 @tool(args_schema=DataPreviewSchema)
-def data_preview(df_name: str, rows: int = 10) -> str:
+def data_preview(df_name: str, rows: int = 10, mode: str = "auto", config: RunnableConfig = None) -> str:
     """
     Enterprise-grade data preview and exploration tool for comprehensive dataset analysis
     企业级数据预览和探索工具，用于综合数据集分析
@@ -688,14 +3946,18 @@ def data_preview(df_name: str, rows: int = 10) -> str:
     - Timestamp tracking for audit trails
     - 用于审计跟踪的时间戳记录
     
-    :param df_name: Name of DataFrame variable in global scope for analysis
-                   全局作用域中用于分析的 DataFrame 变量名
+    :param df_name: Name of DataFrame variable in the session workspace for analysis
+                   会话工作区中用于分析的 DataFrame 变量名
     :type df_name: str
     
     :param rows: Number of representative sample rows to display
                 要显示的代表性样本行数
     :type rows: int
     
+    :param mode: 'auto', 'exact' or 'approx' statistics for very large frames
+                超大 DataFrame 使用 'auto'、'exact' 或 'approx' 统计
+    :type mode: str
+    
     :return: Comprehensive formatted data preview report
              综合格式化数据预览报告
     :rtype: str
@@ -708,9 +3970,15 @@ def data_preview(df_name: str, rows: int = 10) -> str:
         # Returns comprehensive preview with 15 sample rows
         # 返回包含 15 个样本行的综合预览
     """
+    # Keep the workspace marked in use while reading it / 读取期间将工作区标记为使用中
+    with workspace_manager.use(config) as ws:
+        return _data_preview(ws, df_name, rows, mode)
+
+
+def _data_preview(g: Workspace, df_name: str, rows: int, mode: str) -> str:
+    """Body of data_preview, reading from the given workspace / data_preview 的主体，从给定工作区读取"""
     try:
-        # Get DataFrame from global variables
-        g = globals()
+        # Get DataFrame from the session workspace
         if df_name not in g:
             return f"Error: DataFrame '{df_name}' not found. Please extract or create the DataFrame first."
         
@@ -718,6 +3986,18 @@ def data_preview(df_name: str, rows: int = 10) -> str:
         if not isinstance(df, pd.DataFrame):
             return f"Error: '{df_name}' is not a pandas DataFrame."
         
+        mode = (mode or "auto").lower()
+        if mode not in ("auto", "exact", "approx"):
+            return f"Error: mode must be 'auto', 'exact' or 'approx', got '{mode}'."
+        
+        # Column statistics come from one cached profile pass over the frame
+        # 列统计信息来自对 DataFrame 的一次画像计算（已缓存）
+        if use_approximate(df, mode):
+            profile, cached = cached_profile(g, df_name, "profile:approx", lambda: approximate_profile(df))
+        else:
+            profile, cached = cached_profile(g, df_name, "profile", lambda: profile_frame(df))
+        columns = profile["columns"]
+        
         # =======================================================================
         # COMPREHENSIVE PREVIEW REPORT GENERATION
         # 综合预览报告生成
@@ -741,13 +4021,15 @@ def data_preview(df_name: str, rows: int = 10) -> str:
         # Calculate comprehensive structural metrics
         # 计算综合结构指标
         total_cells = df.shape[0] * df.shape[1]
-        memory_mb = df.memory_usage(deep=True).sum() / 1024**2
+        memory_mb = profile["memory_bytes"] / 1024**2
         memory_per_row = memory_mb / df.shape[0] if df.shape[0] > 0 else 0
         
         preview_report.append("📊 DATASET STRUCTURE & PERFORMANCE | 数据集结构和性能:")
         preview_report.append(f"  • Dimensions: {df.shape[0]:,} rows × {df.shape[1]} columns ({total_cells:,} total cells)")
         preview_report.append(f"  • Memory Usage: {memory_mb:.2f} MB ({memory_per_row:.3f} MB per row)")
         preview_report.append(f"  • Index Type: {type(df.index).__name__} (Range: {df.index[0]} to {df.index[-1]} if len(df) > 0 else 'Empty')")
+        profile_note = "reused (data unchanged)" if cached else f"computed in {profile['seconds']:.2f}s"
+        preview_report.append(f"  • Column Profile: {profile_note}")
         
         # Performance assessment
         # 性能评估
@@ -757,6 +4039,9 @@ def data_preview(df_name: str, rows: int = 10) -> str:
             preview_report.append(f"  ⚠️  High dimensionality ({df.shape[1]} columns) - feature selection recommended")
             
         preview_report.append("")
+        if "approx" in profile:
+            preview_report.extend(approximation_notes(profile))
+            preview_report.append("")
         
         # =======================================================================
         # DATA TYPE ANALYSIS WITH OPTIMIZATION RECOMMENDATIONS
@@ -765,9 +4050,9 @@ def data_preview(df_name: str, rows: int = 10) -> str:
         
         # Analyze data types and provide optimization insights
         # 分析数据类型并提供优化洞察
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        categorical_cols = df.select_dtypes(include=['object', 'category']).columns
-        datetime_cols = df.select_dtypes(include=['datetime']).columns
+        numeric_cols = pd.Index([c["name"] for c in columns if c["kind"] == "numeric"])
+        categorical_cols = pd.Index([c["name"] for c in columns if c["kind"] == "categorical"])
+        datetime_cols = pd.Index([c["name"] for c in columns if c["kind"] == "datetime"])
         
         preview_report.append("🏷️  DATA TYPE ANALYSIS | 数据类型分析:")
         preview_report.append(f"  🔢 Numeric Columns ({len(numeric_cols)}): {', '.join(numeric_cols[:5])}{'...' if len(numeric_cols) > 5 else ''}")
@@ -777,49 +4062,48 @@ def data_preview(df_name: str, rows: int = 10) -> str:
         # Detailed type breakdown with optimization suggestions
         # 详细类型分解及优化建议
         preview_report.append("  \n  🔍 Detailed Type Breakdown:")
-        for col, dtype in df.dtypes.items():
-            memory_usage = df[col].memory_usage(deep=True) / 1024**2
-            if str(dtype) == 'object' and df[col].nunique() < len(df) * 0.5:
+        for info in columns:
+            col, dtype = info["name"], info["dtype"]
+            memory_usage = info["memory"] / 1024**2
+            if dtype in ('object', 'str') and info["unique"] is not None and info["unique"] < len(df) * 0.5:
                 preview_report.append(f"    • {col}: {dtype} ({memory_usage:.2f}MB) - Consider category type for memory optimization")
-            elif 'int64' in str(dtype) and df[col].max() < 2**31:
+            elif 'int64' in dtype and info.get("max", np.nan) < 2**31:
                 preview_report.append(f"    • {col}: {dtype} ({memory_usage:.2f}MB) - Could use int32 to save memory")
             else:
                 preview_report.append(f"    • {col}: {dtype} ({memory_usage:.2f}MB)")
         preview_report.append("")
         
         # Missing values analysis
-        missing = df.isnull().sum()
-        missing_pct = (missing / len(df) * 100).round(2)
         preview_report.append("❓ MISSING VALUES:")
-        for col in df.columns:
-            if missing[col] > 0:
-                preview_report.append(f"  • {col}: {missing[col]} ({missing_pct[col]}%)")
-        if missing.sum() == 0:
+        for info in columns:
+            if info["missing"] > 0:
+                preview_report.append(f"  • {info['name']}: {info['missing']} ({round(info['missing'] / len(df) * 100, 2)}%)")
+        if not any(info["missing"] for info in columns):
             preview_report.append("  • No missing values found ✓")
         preview_report.append("")
         
         # Numeric columns summary
-        numeric_cols = df.select_dtypes(include=['number']).columns
         if len(numeric_cols) > 0:
             preview_report.append("📈 NUMERIC COLUMNS SUMMARY:")
-            desc = df[numeric_cols].describe()
-            for col in numeric_cols:
-                preview_report.append(f"  • {col}:")
-                preview_report.append(f"    - Range: {desc.loc['min', col]:.2f} to {desc.loc['max', col]:.2f}")
-                preview_report.append(f"    - Mean: {desc.loc['mean', col]:.2f}")
-                preview_report.append(f"    - Std: {desc.loc['std', col]:.2f}")
+            for info in columns:
+                if info["kind"] != "numeric":
+                    continue
+                preview_report.append(f"  • {info['name']}:")
+                preview_report.append(f"    - Range: {info['min']:.2f} to {info['max']:.2f}")
+                preview_report.append(f"    - Mean: {info['mean']:.2f}")
+                preview_report.append(f"    - Std: {info['std']:.2f}")
             preview_report.append("")
         
         # Categorical columns info
-        cat_cols = df.select_dtypes(include=['object', 'category']).columns
-        if len(cat_cols) > 0:
+        if len(categorical_cols) > 0:
             preview_report.append("🏷️  CATEGORICAL COLUMNS:")
-            for col in cat_cols:
-                unique_count = df[col].nunique()
-                preview_report.append(f"  • {col}: {unique_count} unique values")
-                if unique_count <= 10:
-                    values = df[col].value_counts().head(5)
-                    preview_report.append(f"    - Top values: {list(values.index)}")
+            for info in columns:
+                if info["kind"] != "categorical":
+                    continue
+                unique = f"~{info['unique']:,}" if info.get("approx_unique") else info['unique']
+                preview_report.append(f"  • {info['name']}: {unique} unique values")
+                if "top" in info:
+                    preview_report.append(f"    - Top values: {info['top']}")
             preview_report.append("")
         
         # =======================================================================
@@ -865,7 +4149,7 @@ def data_preview(df_name: str, rows: int = 10) -> str:
     except KeyError:
         # Handle case where DataFrame variable doesn't exist
         # 处理 DataFrame 变量不存在的情况
-        return f"Error: DataFrame '{df_name}' not found in global scope. Use extract_data tool first to load data."
+        return f"Error: DataFrame '{df_name}' not found in the session workspace. Use extract_data tool first to load data."
         
     except TypeError as type_error:
         # Handle case where variable exists but isn't a DataFrame
@@ -980,6 +4264,152 @@ def query_history(action: str, query: str = "", query_id: int = 0, description:
     except Exception as e:
         return f"Query history operation failed: {str(e)}"
 
+# ============================================================================
+# SHARED QUALITY SCANS
+# 共享的质量扫描
+# ============================================================================
+# data_quality_check builds every finding from one set of shared scans run in
+# parallel across column groups:
+#   - missing counts and quartiles come from the cached column profile (one
+#     percentile call for all numeric columns)
+#   - duplicates: rows whose 64-bit hashes collide are the only candidates
+#     passed to df.duplicated(), so the exact count costs about one hash pass
+#   - text checks run on each column's distinct values, not on every row
+#   - outliers are counted for a block of numeric columns at a time
+# data_quality_check 的所有检查结果都基于一组共享扫描，并按列分组并行执行：
+#   - 缺失值计数与四分位数取自缓存的列画像（所有数值列一次百分位计算）
+#   - 重复行：只有 64 位哈希相同的行才作为候选交给 df.duplicated()，精确计数约等于一次哈希扫描
+#   - 文本检查基于每列的唯一值，而非逐行执行
+#   - 异常值按数值列块批量计数
+# ============================================================================
+
+QUALITY_WORKERS = int(os.getenv('QUALITY_WORKERS', '4'))
+_QUALITY_BLOCK_ROWS = 1 << 20
+
+
+def duplicate_count(df: pd.DataFrame, exact: bool = True) -> int:
+    """
+    Number of rows repeating an earlier row, found through row hashes
+    通过行哈希统计与之前行重复的行数
+
+    :param exact: verify hash matches with df.duplicated(); otherwise equal hashes count as duplicates
+                  是否用 df.duplicated() 验证哈希匹配；否则哈希相同即视为重复
+    """
+    try:
+        hashes = row_hashes(df)
+    except TypeError:
+        # Unhashable cells such as lists: df.duplicated() raises too, so compare hashable stand-ins
+        # 列表等不可哈希的单元格：df.duplicated() 同样会失败，因此比较其可哈希替代值
+        return int(hashable_frame(df).duplicated().sum())
+    if not exact:
+        return len(df) - len(pd.unique(hashes))
+    candidates = pd.Series(hashes).duplicated(keep=False).to_numpy()
+    if not candidates.any():
+        return 0
+    return int(df[candidates].duplicated().sum())
+
+
+def text_column_issues(series: pd.Series) -> list:
+    """
+    Numeric-as-text and inconsistent-case findings of one text column, checked on its distinct values
+    基于唯一值检查单个文本列的"数值以文本存储"与"大小写不一致"问题
+    """
+    issues = []
+    try:
+        values = pd.Series(pd.unique(series.dropna().array))
+    except TypeError:
+        return issues  # Unhashable values such as lists / 列表等不可哈希的值
+    if values.empty:
+        return issues
+    try:
+        # Every distinct value converts, so every row does; the first values usually settle it early
+        # 所有唯一值都可转换，则所有行都可转换；通常前若干个值即可提前得出结论
+        if pd.to_numeric(values.iloc[:1000], errors='coerce').notna().all() and \
+                pd.to_numeric(values, errors='coerce').notna().all():
+            issues.append("Numeric data stored as text")
+    except (TypeError, ValueError):
+        pass  # Skip values that can't be analyzed / 跳过无法分析的值
+    if len(values) < len(series) * 0.5:  # Likely categorical / 可能是分类数据
+        text = values.astype(str)
+        # Distinct values stay distinct as text unless non-string objects collide, e.g. 1 and "1"
+        # 唯一值转为文本后仍唯一，除非非字符串对象发生重合，例如 1 和 "1"
+        distinct = text.nunique() if values.dtype == object else len(text)
+        if text.str.lower().nunique() < distinct:
+            issues.append("Inconsistent case in categorical data")
+    return issues
+
+
+def outlier_counts(block: pd.DataFrame, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """Per-column count of values outside [lower, upper], scanned in row blocks / 按行块扫描，统计每列落在 [lower, upper] 之外的值数量"""
+    counts = np.zeros(block.shape[1], dtype=np.int64)
+    for start in range(0, len(block), _QUALITY_BLOCK_ROWS):
+        values = block.iloc[start:start + _QUALITY_BLOCK_ROWS].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            counts += ((values < lower) | (values > upper)).sum(axis=0)
+    return counts
+
+
+def quality_scans(df: pd.DataFrame, profile: dict, check_types: str) -> dict:
+    """
+    Run the shared scans of the selected checks in parallel across column groups
+    按列分组并行执行所选检查的共享扫描
+
+    :return: {"duplicates", "text_issues": [(column, issues)], "outliers": [(column, count)], "sample_seconds"}
+    """
+    checks = check_types.lower()
+    approx = "approx" in profile
+    columns = profile["columns"]
+    scans = {"sample_seconds": 0.0}
+
+    def timed_text_issues(series):
+        started = time.perf_counter()
+        return text_column_issues(series), time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=max(1, QUALITY_WORKERS), thread_name_prefix="quality") as executor:
+        duplicates = text = outliers = None
+        if checks in ('all', 'duplicates'):
+            duplicates = executor.submit(duplicate_count, df, not approx)
+        if checks in ('all', 'types'):
+            # Text columns (object or str, not category); large frames are checked on the profile sample
+            # 文本列（object 或 str，不含 category）；大型数据在画像样本上检查
+            source = profile_sample(df) if approx else df
+            text = [(info["name"], executor.submit(timed_text_issues, source.iloc[:, k]))
+                    for k, info in enumerate(columns)
+                    if info["kind"] == "categorical" and not isinstance(df.dtypes.iloc[k], pd.CategoricalDtype)]
+        if checks in ('all', 'outliers'):
+            positions = [k for k in range(df.shape[1]) if pd.api.types.is_numeric_dtype(df.dtypes.iloc[k])
+                         and not pd.api.types.is_bool_dtype(df.dtypes.iloc[k])]
+            quartiles = np.array([[columns[k].get("q1", np.nan), columns[k].get("q3", np.nan)] for k in positions],
+                                 dtype=np.float64).reshape(-1, 2)
+            pending = [k for k in positions if "q1" not in columns[k]]
+            if pending:
+                # Columns without profile quartiles, in one call / 画像中没有四分位数的列，一次计算
+                extra = df.iloc[:, pending].quantile([0.25, 0.75]).to_numpy().T
+                quartiles[[positions.index(k) for k in pending]] = extra
+            iqr = quartiles[:, 1] - quartiles[:, 0]
+            lower, upper = quartiles[:, 0] - 1.5 * iqr, quartiles[:, 1] + 1.5 * iqr
+            groups = np.array_split(np.arange(len(positions)), min(len(positions), max(1, QUALITY_WORKERS)) or 1)
+            outliers = [(group, executor.submit(outlier_counts, df.iloc[:, [positions[i] for i in group]],
+                                                lower[group], upper[group]))
+                        for group in groups if len(group)]
+            scans["numeric_columns"] = [columns[k]["name"] for k in positions]
+
+        if duplicates is not None:
+            scans["duplicates"] = duplicates.result()
+        if text is not None:
+            scans["text_issues"] = []
+            for name, future in text:
+                issues, seconds = future.result()
+                scans["text_issues"].append((name, issues))
+                scans["sample_seconds"] += seconds if approx else 0.0
+        if outliers is not None:
+            counts = np.zeros(len(scans["numeric_columns"]), dtype=np.int64)
+            for group, future in outliers:
+                counts[group] = future.result()
+            scans["outliers"] = list(zip(scans["numeric_columns"], counts.tolist()))
+    return scans
+
+
 # ============================================================================
 # COMPREHENSIVE DATA QUALITY ASSESSMENT TOOL
 # 综合数据质量评估工具
@@ -989,6 +4419,265 @@ def query_history(action: str, query: str = "", query_id: int = 0, description:
 # Key features: Missing value analysis, duplicate detection, outlier identification, data type validation
 # 主要功能：缺失值分析、重复值检测、异常值识别、数据类型验证
 
+def quality_findings(df: pd.DataFrame, profile: dict, check_types: str = "all") -> list:
+    """
+    Report lines of the selected data quality checks (steps 3 and 4 of data_quality_check)
+    所选数据质量检查的报告行（data_quality_check 的步骤3和步骤4）
+    
+    Missing counts and quartiles come from the column profile, everything else from quality_scans;
+    the result is cached by frame version. With an approximate profile, duplicates are unverified
+    row-hash matches, type checks use a sample and outliers the sample quartiles.
+    缺失值计数和四分位数取自列画像，其余来自 quality_scans；结果按 DataFrame 版本缓存。
+    使用近似画像时，重复检测为未验证的行哈希匹配，类型检查使用样本，异常值使用样本四分位数。
+    """
+    report = []
+    missing_total = sum(info["missing"] for info in profile["columns"])
+    approx = profile.get("approx")
+    started = time.perf_counter()
+    if approx:
+        report.extend(approximation_notes(profile)[:-1])
+        report.append("")
+    
+    # One set of shared scans, run in parallel, feeds every check below
+    # 下面所有检查共用一组并行执行的扫描结果
+    scans = quality_scans(df, profile, check_types)
+    
+    # Initialize issue counter for overall quality scoring
+    # 初始化问题计数器，用于整体质量评分
+    issues_found = 0
+    
+    # ========================================================================
+    # STEP 3A: MISSING VALUES ANALYSIS
+    # 步骤3A：缺失值分析
+    # ========================================================================
+    
+    # Perform comprehensive missing value detection and analysis
+    # 执行综合缺失值检测和分析
+    if check_types.lower() in ['all', 'missing']:
+        report.append("🔍 MISSING VALUES ANALYSIS:")
+        
+        # Missing values count and percentage for each column, from the column profile
+        # 每列的缺失值数量和百分比，取自列画像
+        missing = [(info["name"], info["missing"]) for info in profile["columns"]]  # Count of missing values per column / 每列缺失值数量
+        
+        # Evaluate overall missing data situation
+        # 评估整体缺失数据情况
+        if missing_total == 0:
+            report.append("  ✅ No missing values found")
+        else:
+            # Add to global issues counter for quality scoring
+            # 添加到全局问题计数器用于质量评分
+            issues_found += missing_total
+            report.append(f"  ⚠️  Total missing values: {missing_total}")
+            
+            # Analyze each column with missing values and assign severity levels
+            # 分析每个有缺失值的列并分配严重性级别
+            for col, count in missing:
+                if count > 0:
+                    missing_pct = round(count / len(df) * 100, 2)  # Percentage of missing values / 缺失值百分比
+                    # Severity classification based on missing percentage
+                    # 基于缺失百分比的严重性分类
+                    # Red: >50% missing (critical), Yellow: >10% missing (warning), Green: <10% missing (minor)
+                    # 红色：>50%缺失（严重），黄色：>10%缺失（警告），绿色：<10%缺失（轻微）
+                    severity = "🔴" if missing_pct > 50 else "🟡" if missing_pct > 10 else "🟢"
+                    report.append(f"    {severity} {col}: {count} ({missing_pct}%)")
+        report.append("")
+    
+    # ========================================================================
+    # STEP 3B: DUPLICATE RECORDS DETECTION AND ANALYSIS
+    # 步骤3B：重复记录检测和分析
+    # ========================================================================
+    
+    # Identify complete duplicate rows that may skew analysis results
+    # 识别可能歪曲分析结果的完整重复行
+    if check_types.lower() in ['all', 'duplicates']:
+        report.append("🔍 DUPLICATE RECORDS ANALYSIS:")
+        
+        # Count total duplicate rows: rows sharing a row hash, confirmed by duplicated()
+        # 计算总重复行数：行哈希相同的行，经 duplicated() 确认
+        # This identifies rows that are exact duplicates of previous rows
+        # 这识别与之前行完全重复的行
+        duplicates = scans["duplicates"]
+        
+        # Evaluate duplicate data situation
+        # 评估重复数据情况
+        if duplicates == 0:
+            report.append("  ✅ No duplicate rows found")
+        else:
+            # Add duplicates to issues counter for overall quality assessment
+            # 将重复值添加到问题计数器用于整体质量评估
+            issues_found += duplicates
+            
+            # Calculate percentage of duplicate records
+            # 计算重复记录的百分比
+            duplicate_pct = round(duplicates / len(df) * 100, 2)
+            
+            # Assign severity level based on duplicate percentage
+            # 根据重复百分比分配严重性级别
+            # Red: >10% duplicates (critical data integrity issue)
+            # Yellow: >5% duplicates (moderate concern)
+            # Green: <5% duplicates (minor issue)
+            # 红色：>10%重复（严重数据完整性问题）
+            # 黄色：>5%重复（中等关注）
+            # 绿色：<5%重复（轻微问题）
+            severity = "🔴" if duplicate_pct > 10 else "🟡" if duplicate_pct > 5 else "🟢"
+            report.append(f"  {severity} Duplicate rows: {duplicates} ({duplicate_pct}%)")
+        report.append("")
+    
+    # ========================================================================
+    # STEP 3C: DATA TYPE CONSISTENCY AND FORMAT VALIDATION
+    # 步骤3C：数据类型一致性和格式验证
+    # ========================================================================
+    
+    # Analyze data type appropriateness and detect format inconsistencies
+    # 分析数据类型适当性并检测格式不一致性
+    if check_types.lower() in ['all', 'types']:
+        report.append("🔍 DATA TYPE ANALYSIS:")
+        type_issues = 0  # Counter for data type related issues / 数据类型相关问题计数器
+        
+        # Large frames are checked on the profile sample / 大型数据在画像样本上检查
+        if approx:
+            report.append(f"  (checked on {approx['sample_rows']:,} sampled rows; issues in fewer than "
+                          f"{3 / max(approx['sample_rows'], 1) * 100:.4f}% of rows may be missed, 95%)")
+        
+        # Text columns (object or str) may hide two kinds of issues, checked on their distinct values:
+        # numbers stored as text, which prevent proper statistical analysis, and mixed case in
+        # categorical data, which creates artificial categories and skews analysis
+        # 文本列（object 或 str）可能存在两类隐藏问题，基于唯一值检查：
+        # 以文本存储的数值（妨碍正常统计分析），以及分类数据中的混合大小写（产生人工分类并歪曲分析）
+        for col, issues in scans["text_issues"]:
+            for issue in issues:
+                type_issues += 1
+                report.append(f"    🟡 {col}: {issue}")
+        
+        # Summarize data type analysis results
+        # 总结数据类型分析结果
+        if type_issues == 0:
+            report.append("  ✅ No data type issues found")
+        else:
+            issues_found += type_issues
+            report.append(f"  ⚠️  Data type issues found: {type_issues}")
+        report.append("")
+    
+    # ========================================================================
+    # STEP 3D: STATISTICAL OUTLIER DETECTION AND ANALYSIS
+    # 步骤3D：统计异常值检测和分析
+    # ========================================================================
+    
+    # Identify statistical outliers using Interquartile Range (IQR) method
+    # 使用四分位数范围(IQR)方法识别统计异常值
+    if check_types.lower() in ['all', 'outliers']:
+        report.append("🔍 OUTLIERS ANALYSIS:")
+        
+        # Numeric columns for outlier analysis, as selected by quality_scans
+        # 异常值分析使用的数值列，由 quality_scans 选出
+        numeric_cols = scans["numeric_columns"]
+        
+        # Check if any numeric columns exist for analysis
+        # 检查是否存在可分析的数值列
+        if len(numeric_cols) == 0:
+            report.append("  ℹ️  No numeric columns to check for outliers")
+        else:
+            outlier_cols = 0  # Counter for columns with outliers / 有异常值的列计数器
+            
+            # ============================================================
+            # IQR METHOD FOR OUTLIER DETECTION
+            # IQR方法检测异常值
+            # ============================================================
+            # This method defines outliers as values outside Q1-1.5*IQR to Q3+1.5*IQR,
+            # with quartiles of all numeric columns from the profile's single percentile pass
+            # 该方法将异常值定义为在Q1-1.5*IQR到Q3+1.5*IQR范围外的值，
+            # 所有数值列的四分位数来自画像的一次百分位计算
+            for col, outliers in scans["outliers"]:
+                # Report outliers if found
+                # 如果发现异常值则报告
+                if outliers > 0:
+                    outlier_cols += 1
+                    
+                    # Calculate percentage of outliers
+                    # 计算异常值百分比
+                    outlier_pct = round(outliers / len(df) * 100, 2)
+                    
+                    # Assign severity based on outlier percentage
+                    # 根据异常值百分比分配严重性
+                    # Red: >10% outliers (potential data quality issue)
+                    # Yellow: >5% outliers (worth investigating)
+                    # Green: <5% outliers (normal statistical variation)
+                    # 红色：>10%异常值（潜在数据质量问题）
+                    # 黄色：>5%异常值（值得调查）
+                    # 绿色：<5%异常值（正常统计变化）
+                    severity = "🔴" if outlier_pct > 10 else "🟡" if outlier_pct > 5 else "🟢"
+                    report.append(f"    {severity} {col}: {outliers} outliers ({outlier_pct}%)")
+            
+            # Summarize outlier analysis results
+            # 总结异常值分析结果
+            if outlier_cols == 0:
+                report.append("  ✅ No significant outliers found")
+            else:
+                issues_found += outlier_cols
+        report.append("")
+    
+    # ========================================================================
+    # STEP 4: COMPREHENSIVE QUALITY SUMMARY AND STRATEGIC RECOMMENDATIONS
+    # 步骤4：综合质量总结和战略建议
+    # ========================================================================
+    
+    # Generate executive summary with overall quality assessment
+    # 生成包含整体质量评估的执行总结
+    report.append("📊 QUALITY SUMMARY:")
+    # Evaluate overall data quality based on total issues found
+    # 根据发现的总问题数评估整体数据质量
+    if issues_found == 0:
+        # Perfect quality scenario - rare but excellent for analysis
+        # 完美质量场景 - 罕见但对分析极佳
+        report.append("  🎉 Excellent! No major data quality issues detected")
+    else:
+        # Quality scoring system based on issue severity and count
+        # 基于问题严重性和数量的质量评分系统
+        # Poor: >20 issues (requires significant cleanup before analysis)
+        # Fair: >10 issues (moderate issues, proceed with caution)
+        # Good: <10 issues (minor issues, analysis can proceed)
+        # 差：>20个问题（分析前需要大量清理）
+        # 一般：>10个问题（中等问题，谨慎进行）
+        # 好：<10个问题（轻微问题，可以进行分析）
+        severity = "🔴 Poor" if issues_found > 20 else "🟡 Fair" if issues_found > 10 else "🟢 Good"
+        report.append(f"  Data Quality: {severity}")
+        report.append(f"  Total issues detected: {issues_found}")
+        
+        # ================================================================
+        # ACTIONABLE RECOMMENDATIONS BASED ON DETECTED ISSUES
+        # 基于检测问题的可操作建议
+        # ================================================================
+        # Provide specific, prioritized recommendations for data improvement
+        # 为数据改进提供具体的、优先化的建议
+        report.append("\n💡 RECOMMENDATIONS:")
+        
+        # Missing values recommendation / 缺失值建议
+        if check_types.lower() in ['all', 'missing'] and missing_total > 0:
+            report.append("  • Handle missing values using imputation or removal")
+        
+        # Duplicate records recommendation / 重复记录建议
+        if check_types.lower() in ['all', 'duplicates'] and duplicates > 0:
+            report.append("  • Remove or investigate duplicate records")
+        
+        # Data type optimization recommendation / 数据类型优化建议
+        if check_types.lower() in ['all', 'types']:
+            report.append("  • Convert data types for better performance and accuracy")
+        
+        # Outlier investigation recommendation / 异常值调查建议
+        if check_types.lower() in ['all', 'outliers'] and len(scans["numeric_columns"]) > 0:
+            report.append("  • Investigate outliers - they may be errors or important insights")
+    
+    if approx:
+        # Sample-bound work scales with the row count on the exact path / 精确路径中样本相关的计算随行数线性增长
+        elapsed = time.perf_counter() - started
+        scale = len(df) / max(approx["sample_rows"], 1)
+        exact = elapsed + scans["sample_seconds"] * (scale - 1)
+        report.append(f"\n⏱️  Checks took {elapsed:.2f}s (exact checks estimated at ~{exact:.1f}s)")
+    
+    return report
+
+
 # Data quality assessment schema / 数据质量评估模式
 class DataQualitySchema(BaseModel):
     """
@@ -1000,9 +4689,10 @@ class DataQualitySchema(BaseModel):
     """
     df_name: str = Field(description="Name of the pandas DataFrame variable to check / 要检查的pandas DataFrame变量名")
     check_types: str = Field(default="all", description="Types of checks: 'all', 'missing', 'duplicates', 'outliers', 'types' / 检查类型：'all'(全部), 'missing'(缺失值), 'duplicates'(重复值), 'outliers'(异常值), 'types'(数据类型)")
+    mode: str = Field(default="auto", description="'auto' uses approximate checks above PROFILE_APPROX_ROWS rows; 'exact' or 'approx' forces one / 'auto' 在超过 PROFILE_APPROX_ROWS 行时使用近似检查；'exact' 或 'approx' 强制指定")
 
 @tool(args_schema=DataQualitySchema)
-def data_quality_check(df_name: str, check_types: str = "all") -> str:
+def data_quality_check(df_name: str, check_types: str = "all", mode: str = "auto", config: RunnableConfig = None) -> str:
     """
     COMPREHENSIVE DATA QUALITY ASSESSMENT FUNCTION
     综合数据质量评估功能
@@ -1033,17 +4723,24 @@ def data_quality_check(df_name: str, check_types: str = "all") -> str:
     
     :param df_name: Name of the pandas DataFrame variable to check / 要检查的pandas DataFrame变量名
     :param check_types: Types of checks to perform - 'all', 'missing', 'duplicates', 'outliers', 'types' / 要执行的检查类型
+    :param mode: 'auto', 'exact' or 'approx' checks for very large frames / 超大DataFrame使用'auto'、'exact'或'approx'检查
     :return: Comprehensive data quality report with severity indicators and recommendations / 包含严重性指标和建议的综合数据质量报告
     """
+    # Keep the workspace marked in use while reading it / 读取期间将工作区标记为使用中
+    with workspace_manager.use(config) as ws:
+        return _data_quality_check(ws, df_name, check_types, mode)
+
+
+def _data_quality_check(g: Workspace, df_name: str, check_types: str, mode: str) -> str:
+    """Body of data_quality_check, reading from the given workspace / data_quality_check 的主体，从给定工作区读取"""
     try:
         # ========================================================================
         # STEP 1: DATAFRAME VALIDATION AND INITIALIZATION
         # 步骤1：DataFrame验证和初始化
         # ========================================================================
         
-        # Retrieve DataFrame from global namespace (where extract_data saves it)
-        # 从全局命名空间获取DataFrame（extract_data保存的位置）
-        g = globals()
+        # Retrieve DataFrame from the session workspace (where extract_data saves it)
+        # 从会话工作区获取DataFrame（extract_data保存的位置）
         if df_name not in g:
             return f"Error: DataFrame '{df_name}' not found. Please extract or create the DataFrame first."
         
@@ -1066,281 +4763,26 @@ def data_quality_check(df_name: str, check_types: str = "all") -> str:
         report.append(f"Dataset: {df.shape[0]} rows × {df.shape[1]} columns")
         report.append("")
         
-        # Initialize issue counter for overall quality scoring
-        # 初始化问题计数器，用于整体质量评分
-        issues_found = 0
-        
-        # ========================================================================
-        # STEP 3A: MISSING VALUES ANALYSIS
-        # 步骤3A：缺失值分析
-        # ========================================================================
-        
-        # Perform comprehensive missing value detection and analysis
-        # 执行综合缺失值检测和分析
-        if check_types.lower() in ['all', 'missing']:
-            report.append("🔍 MISSING VALUES ANALYSIS:")
-            
-            # Calculate missing values count and percentage for each column
-            # 计算每列的缺失值数量和百分比
-            missing = df.isnull().sum()  # Count of missing values per column / 每列缺失值数量
-            missing_pct = (missing / len(df) * 100).round(2)  # Percentage of missing values / 缺失值百分比
-            
-            # Evaluate overall missing data situation
-            # 评估整体缺失数据情况
-            if missing.sum() == 0:
-                report.append("  ✅ No missing values found")
-            else:
-                # Add to global issues counter for quality scoring
-                # 添加到全局问题计数器用于质量评分
-                issues_found += missing.sum()
-                report.append(f"  ⚠️  Total missing values: {missing.sum()}")
-                
-                # Analyze each column with missing values and assign severity levels
-                # 分析每个有缺失值的列并分配严重性级别
-                for col in df.columns:
-                    if missing[col] > 0:
-                        # Severity classification based on missing percentage
-                        # 基于缺失百分比的严重性分类
-                        # Red: >50% missing (critical), Yellow: >10% missing (warning), Green: <10% missing (minor)
-                        # 红色：>50%缺失（严重），黄色：>10%缺失（警告），绿色：<10%缺失（轻微）
-                        severity = "🔴" if missing_pct[col] > 50 else "🟡" if missing_pct[col] > 10 else "🟢"
-                        report.append(f"    {severity} {col}: {missing[col]} ({missing_pct[col]}%)")
-            report.append("")
-        
-        # ========================================================================
-        # STEP 3B: DUPLICATE RECORDS DETECTION AND ANALYSIS
-        # 步骤3B：重复记录检测和分析
-        # ========================================================================
-        
-        # Identify complete duplicate rows that may skew analysis results
-        # 识别可能歪曲分析结果的完整重复行
-        if check_types.lower() in ['all', 'duplicates']:
-            report.append("🔍 DUPLICATE RECORDS ANALYSIS:")
-            
-            # Count total duplicate rows using pandas duplicated() method
-            # 使用pandas duplicated()方法计算总重复行数
-            # This identifies rows that are exact duplicates of previous rows
-            # 这识别与之前行完全重复的行
-            duplicates = df.duplicated().sum()
-            
-            # Evaluate duplicate data situation
-            # 评估重复数据情况
-            if duplicates == 0:
-                report.append("  ✅ No duplicate rows found")
-            else:
-                # Add duplicates to issues counter for overall quality assessment
-                # 将重复值添加到问题计数器用于整体质量评估
-                issues_found += duplicates
-                
-                # Calculate percentage of duplicate records
-                # 计算重复记录的百分比
-                duplicate_pct = (duplicates / len(df) * 100).round(2)
-                
-                # Assign severity level based on duplicate percentage
-                # 根据重复百分比分配严重性级别
-                # Red: >10% duplicates (critical data integrity issue)
-                # Yellow: >5% duplicates (moderate concern)
-                # Green: <5% duplicates (minor issue)
-                # 红色：>10%重复（严重数据完整性问题）
-                # 黄色：>5%重复（中等关注）
-                # 绿色：<5%重复（轻微问题）
-                severity = "🔴" if duplicate_pct > 10 else "🟡" if duplicate_pct > 5 else "🟢"
-                report.append(f"  {severity} Duplicate rows: {duplicates} ({duplicate_pct}%)")
-            report.append("")
-        
         # ========================================================================
-        # STEP 3C: DATA TYPE CONSISTENCY AND FORMAT VALIDATION
-        # 步骤3C：数据类型一致性和格式验证
+        # STEPS 3-4: QUALITY CHECKS, CACHED BY FRAME VERSION
+        # 步骤3-4：质量检查，按DataFrame版本缓存
         # ========================================================================
         
-        # Analyze data type appropriateness and detect format inconsistencies
-        # 分析数据类型适当性并检测格式不一致性
-        if check_types.lower() in ['all', 'types']:
-            report.append("🔍 DATA TYPE ANALYSIS:")
-            type_issues = 0  # Counter for data type related issues / 数据类型相关问题计数器
-            
-            # Iterate through each column to check data type appropriateness
-            # 遍历每列检查数据类型适当性
-            for col in df.columns:
-                col_type = df[col].dtype
-                
-                # Focus on 'object' type columns which may have hidden issues
-                # 专注于'object'类型列，可能存在隐藏问题
-                if col_type == 'object':
-                    
-                    # ================================================================
-                    # SUB-CHECK 1: NUMERIC DATA STORED AS TEXT
-                    # 子检查1：以文本形式存储的数值数据
-                    # ================================================================
-                    # This can cause performance issues and prevent proper statistical analysis
-                    # 这可能导致性能问题并阻止正常的统计分析
-                    try:
-                        # Attempt to convert to numeric, 'coerce' makes non-numeric values NaN
-                        # 尝试转换为数值，'coerce'使非数值变为NaN
-                        numeric_conversion = pd.to_numeric(df[col], errors='coerce')
-                        
-                        # Count how many values couldn't be converted (excluding original NaNs)
-                        # 计算无法转换的值数量（排除原始NaN）
-                        non_numeric = numeric_conversion.isnull().sum() - df[col].isnull().sum()
-                        
-                        # If all non-null values can be converted to numeric, flag as issue
-                        # 如果所有非空值都可以转换为数值，标记为问题
-                        if non_numeric == 0 and not df[col].isnull().all():
-                            type_issues += 1
-                            report.append(f"    🟡 {col}: Numeric data stored as text")
-                    except:
-                        pass  # Skip columns that can't be analyzed / 跳过无法分析的列
-                    
-                    # ================================================================
-                    # SUB-CHECK 2: INCONSISTENT CASE IN CATEGORICAL DATA
-                    # 子检查2：分类数据中的不一致大小写
-                    # ================================================================
-                    # Mixed case can create artificial categories and skew analysis
-                    # 混合大小写可能创建人工分类并歪曲分析
-                    if df[col].nunique() < len(df) * 0.5:  # Likely categorical if unique values < 50% of total rows
-                        # 如果唯一值 < 总行数50%，则可能是分类数据
-                        unique_vals = df[col].dropna().astype(str)
-                        
-                        # Check if lowercasing reduces the number of unique values
-                        # 检查转换为小写是否减少了唯一值的数量
-                        case_variants = unique_vals.str.lower().nunique() < unique_vals.nunique()
-                        if case_variants:
-                            type_issues += 1
-                            report.append(f"    🟡 {col}: Inconsistent case in categorical data")
-            
-            # Summarize data type analysis results
-            # 总结数据类型分析结果
-            if type_issues == 0:
-                report.append("  ✅ No data type issues found")
-            else:
-                issues_found += type_issues
-                report.append(f"  ⚠️  Data type issues found: {type_issues}")
-            report.append("")
-        
-        # ========================================================================
-        # STEP 3D: STATISTICAL OUTLIER DETECTION AND ANALYSIS
-        # 步骤3D：统计异常值检测和分析
-        # ========================================================================
-        
-        # Identify statistical outliers using Interquartile Range (IQR) method
-        # 使用四分位数范围(IQR)方法识别统计异常值
-        if check_types.lower() in ['all', 'outliers']:
-            report.append("🔍 OUTLIERS ANALYSIS:")
-            
-            # Select only numeric columns for outlier analysis
-            # 仅选择数值列进行异常值分析
-            numeric_cols = df.select_dtypes(include=['number']).columns
-            
-            # Check if any numeric columns exist for analysis
-            # 检查是否存在可分析的数值列
-            if len(numeric_cols) == 0:
-                report.append("  ℹ️  No numeric columns to check for outliers")
-            else:
-                outlier_cols = 0  # Counter for columns with outliers / 有异常值的列计数器
-                
-                # Analyze each numeric column for statistical outliers
-                # 分析每个数值列的统计异常值
-                for col in numeric_cols:
-                    # ============================================================
-                    # IQR METHOD FOR OUTLIER DETECTION
-                    # IQR方法检测异常值
-                    # ============================================================
-                    # This method defines outliers as values outside Q1-1.5*IQR to Q3+1.5*IQR
-                    # 该方法将异常值定义为在Q1-1.5*IQR到Q3+1.5*IQR范围外的值
-                    
-                    # Calculate quartiles for the column
-                    # 计算列的四分位数
-                    Q1 = df[col].quantile(0.25)  # First quartile (25th percentile) / 第一四分位数（25%百分位数）
-                    Q3 = df[col].quantile(0.75)  # Third quartile (75th percentile) / 第三四分位数（75%百分位数）
-                    IQR = Q3 - Q1  # Interquartile Range / 四分位数范围
-                    
-                    # Define outlier boundaries using 1.5 * IQR rule
-                    # 使用1.5 * IQR规则定义异常值边界
-                    lower_bound = Q1 - 1.5 * IQR  # Values below this are outliers / 低于此值的为异常值
-                    upper_bound = Q3 + 1.5 * IQR  # Values above this are outliers / 高于此值的为异常值
-                    
-                    # Count outliers in the column
-                    # 计算列中的异常值
-                    outliers = ((df[col] < lower_bound) | (df[col] > upper_bound)).sum()
-                    
-                    # Report outliers if found
-                    # 如果发现异常值则报告
-                    if outliers > 0:
-                        outlier_cols += 1
-                        
-                        # Calculate percentage of outliers
-                        # 计算异常值百分比
-                        outlier_pct = (outliers / len(df) * 100).round(2)
-                        
-                        # Assign severity based on outlier percentage
-                        # 根据异常值百分比分配严重性
-                        # Red: >10% outliers (potential data quality issue)
-                        # Yellow: >5% outliers (worth investigating)
-                        # Green: <5% outliers (normal statistical variation)
-                        # 红色：>10%异常值（潜在数据质量问题）
-                        # 黄色：>5%异常值（值得调查）
-                        # 绿色：<5%异常值（正常统计变化）
-                        severity = "🔴" if outlier_pct > 10 else "🟡" if outlier_pct > 5 else "🟢"
-                        report.append(f"    {severity} {col}: {outliers} outliers ({outlier_pct}%)")
-                
-                # Summarize outlier analysis results
-                # 总结异常值分析结果
-                if outlier_cols == 0:
-                    report.append("  ✅ No significant outliers found")
-                else:
-                    issues_found += outlier_cols
-            report.append("")
-        
-        # ========================================================================
-        # STEP 4: COMPREHENSIVE QUALITY SUMMARY AND STRATEGIC RECOMMENDATIONS
-        # 步骤4：综合质量总结和战略建议
-        # ========================================================================
-        
-        # Generate executive summary with overall quality assessment
-        # 生成包含整体质量评估的执行总结
-        report.append("📊 QUALITY SUMMARY:")
-        # Evaluate overall data quality based on total issues found
-        # 根据发现的总问题数评估整体数据质量
-        if issues_found == 0:
-            # Perfect quality scenario - rare but excellent for analysis
-            # 完美质量场景 - 罕见但对分析极佳
-            report.append("  🎉 Excellent! No major data quality issues detected")
+        # An unchanged frame reuses both its column profile and its findings
+        # 未改变的DataFrame会复用其列画像和检查结果
+        mode = (mode or "auto").lower()
+        if mode not in ("auto", "exact", "approx"):
+            return f"Error: mode must be 'auto', 'exact' or 'approx', got '{mode}'."
+        if use_approximate(df, mode):
+            profile, _ = cached_profile(g, df_name, "profile:approx", lambda: approximate_profile(df))
         else:
-            # Quality scoring system based on issue severity and count
-            # 基于问题严重性和数量的质量评分系统
-            # Poor: >20 issues (requires significant cleanup before analysis)
-            # Fair: >10 issues (moderate issues, proceed with caution)
-            # Good: <10 issues (minor issues, analysis can proceed)
-            # 差：>20个问题（分析前需要大量清理）
-            # 一般：>10个问题（中等问题，谨慎进行）
-            # 好：<10个问题（轻微问题，可以进行分析）
-            severity = "🔴 Poor" if issues_found > 20 else "🟡 Fair" if issues_found > 10 else "🟢 Good"
-            report.append(f"  Data Quality: {severity}")
-            report.append(f"  Total issues detected: {issues_found}")
-            
-            # ================================================================
-            # ACTIONABLE RECOMMENDATIONS BASED ON DETECTED ISSUES
-            # 基于检测问题的可操作建议
-            # ================================================================
-            # Provide specific, prioritized recommendations for data improvement
-            # 为数据改进提供具体的、优先化的建议
-            report.append("\n💡 RECOMMENDATIONS:")
-            
-            # Missing values recommendation / 缺失值建议
-            if check_types.lower() in ['all', 'missing'] and df.isnull().sum().sum() > 0:
-                report.append("  • Handle missing values using imputation or removal")
-            
-            # Duplicate records recommendation / 重复记录建议
-            if check_types.lower() in ['all', 'duplicates'] and df.duplicated().sum() > 0:
-                report.append("  • Remove or investigate duplicate records")
-            
-            # Data type optimization recommendation / 数据类型优化建议
-            if check_types.lower() in ['all', 'types']:
-                report.append("  • Convert data types for better performance and accuracy")
-            
-            # Outlier investigation recommendation / 异常值调查建议
-            if check_types.lower() in ['all', 'outliers'] and len(df.select_dtypes(include=['number']).columns) > 0:
-                report.append("  • Investigate outliers - they may be errors or important insights")
+            profile, _ = cached_profile(g, df_name, "profile", lambda: profile_frame(df))
+        findings, cached = cached_profile(g, df_name, f"quality:{'approx' if 'approx' in profile else 'exact'}:{check_types.lower()}",
+                                          lambda: quality_findings(df, profile, check_types))
+        if cached:
+            report.append("(Reused findings - data unchanged since the last check)")
+            report.append("")
+        report.extend(findings)
         
         return "\n".join(report)
         
@@ -1352,13 +4794,16 @@ def data_quality_check(df_name: str, check_types: str = "all") -> str:
 # 1. INFORMATION RETRIEVAL / 信息检索: search_tool (web search capabilities)
 # 2. CODE EXECUTION / 代码执行: python_inter (Python environment)
 # 3. VISUALIZATION / 可视化: fig_inter (matplotlib/seaborn plotting)
-# 4. DATABASE OPERATIONS / 数据库操作: sql_inter, extract_data (MySQL integration)
+# 4. DATABASE OPERATIONS / 数据库操作: sql_inter, schema_catalog, extract_data (MySQL integration)
 # 5. DATA MANAGEMENT / 数据管理: export_data (multi-format export)
 # 6. QUALITY ASSURANCE / 质量保证: data_preview, data_quality_check (data validation)
 # 7. EFFICIENCY TOOLS / 效率工具: query_history (SQL management)
 
-tools = [search_tool, python_inter, fig_inter, sql_inter, extract_data, 
-         export_data, data_preview, query_history, data_quality_check]
+python_workers.start()
+render_pool.start()
+
+tools = [search_tool, python_inter, fig_inter, sql_inter, schema_catalog, extract_data, 
+         export_data, export_status, data_preview, query_history, data_quality_check, clear_workspace]
 
 model = ChatOpenAI(
     model=os.getenv('MODEL_NAME'),        
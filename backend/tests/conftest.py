@@ -0,0 +1,24 @@
+import os
+import sys
+import tempfile
+
+# graph reads its settings at import time / graph 在导入时读取配置
+_ROOT = tempfile.mkdtemp(prefix="easydataagent-tests-")
+os.environ.update(
+    OPENAI_API_KEY="test", TAVILY_API_KEY="test", MODEL_NAME="test-model",
+    PROJECT_ROOT=os.path.join(_ROOT, "project"), PUBLIC_DIR=os.path.join(_ROOT, "public"),
+    PYTHON_WORKERS="1", FIG_RENDER_WORKERS="0",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import graph  # noqa: E402, F401
+from workspace import Workspace  # noqa: E402
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    ws = Workspace("test", str(tmp_path / "spill"))
+    yield ws
+    ws.clear()
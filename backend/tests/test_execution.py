@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from execution import CodeCache, run_code, summarize_assignments, summarize_value, workspace_builtins
+
+
+def test_large_frames_are_summarised_instead_of_formatted():
+    df = pd.DataFrame({"id": np.arange(100_000), "name": ["n"] * 100_000})
+    text = summarize_value(df)
+    assert text.startswith("DataFrame: 100,000 rows × 2 columns")
+    assert "columns: id int64" in text and "head(5):" in text
+    assert len(text.splitlines()) < 12
+
+
+def test_small_frames_are_shown_in_full():
+    df = pd.DataFrame({"id": range(3)})
+    assert summarize_value(df) == str(df)
+
+
+def test_large_containers_report_their_size():
+    assert summarize_value(list(range(10_000))).startswith("list with 10,000 items: [0, 1, 2")
+
+
+def test_assignments_share_the_output_budget():
+    text = summarize_assignments({"a": "x" * 5000, "b": np.arange(1000)}, max_chars=1000)
+    assert text.startswith("a =\n'xxx") and "[output truncated" in text
+    assert "b =\nndarray: shape (1000,)" in text
+    assert len(text) <= 1000 + 100
+
+
+def test_run_code_reports_only_new_and_rebound_names():
+    g = workspace_builtins()
+    g.update(kept=1, df=pd.DataFrame({"id": range(3)}))
+    assert run_code(g, "total = df['id'].sum()\nkept = kept") == "total = 3"
+    assert run_code(g, "df.loc[0, 'id'] = 5") == "Code executed successfully"
+    assert run_code(g, "df['id'].max()") == "5"
+
+
+def test_run_code_records_compile_and_execute_timings():
+    timings = {}
+    run_code(workspace_builtins(), "x = 1 + 1", timings=timings)
+    assert set(timings) == {"cached", "compile", "execute", "summarize"}
+
+
+def test_code_cache_compiles_each_snippet_once():
+    cache = CodeCache(max_entries=4)
+    snippet, cached = cache.compile("x = 1", "<python_inter>")
+    assert cached is False and snippet.expression is False
+    again, cached = cache.compile("x = 1", "<python_inter>")
+    assert cached is True and again is snippet
+    assert cache.compile("x = 1", "<fig_inter>")[1] is False
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_code_cache_tells_expressions_from_statements():
+    cache = CodeCache()
+    assert cache.compile("df.shape", "<test>")[0].expression is True
+    assert cache.compile("print(1)\ndf.shape", "<test>")[0].expression is False
+
+
+def test_code_cache_evicts_the_least_recently_used_snippet():
+    cache = CodeCache(max_entries=2)
+    cache.compile("a = 1", "<test>")
+    cache.compile("b = 1", "<test>")
+    cache.compile("a = 1", "<test>")
+    cache.compile("c = 1", "<test>")
+    assert cache.compile("a = 1", "<test>")[1] is True
+    assert cache.compile("b = 1", "<test>")[1] is False
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_syntax_errors_are_reported_not_cached():
+    cache = CodeCache()
+    with pytest.raises(SyntaxError):
+        cache.compile("x = (", "<test>")
+    assert cache.stats()["entries"] == 0
+    assert run_code(workspace_builtins(), "x = (").startswith("Code execution error:")
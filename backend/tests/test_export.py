@@ -0,0 +1,169 @@
+import gzip
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from openpyxl import load_workbook
+
+import graph
+
+
+def excel_rows(path) -> list:
+    return list(load_workbook(path).active.iter_rows(values_only=True))
+
+
+def test_excel_index_may_share_a_column_name(tmp_path):
+    df = pd.DataFrame({"id": [1, 2]}, index=pd.Index([10, 11], name="id"))
+    graph.write_excel_streaming(df, str(tmp_path / "out.xlsx"))
+    assert excel_rows(tmp_path / "out.xlsx") == [("id", "id"), (10, 1), (11, 2)]
+
+
+def test_excel_writes_numpy_scalars_in_object_columns_as_values(tmp_path):
+    df = pd.DataFrame({"v": pd.Series([np.int64(5), None, np.float32(1.5)], dtype=object)})
+    graph.write_excel_streaming(df, str(tmp_path / "out.xlsx"), index=False)
+    assert excel_rows(tmp_path / "out.xlsx") == [("v",), (5,), (None,), (1.5,)]
+
+
+def test_resolve_figures_reports_entries_that_name_no_stored_figure():
+    os.makedirs(graph.figure_store.directory, exist_ok=True)
+    for name in ("f1.svg", "f1.thumb.png"):
+        open(os.path.join(graph.figure_store.directory, name), "wb").close()
+    markdown = "[![sales, by month](images/f1.thumb.png)](images/f1.svg)"
+    paths, missing = graph.resolve_figures(f"{markdown}, images/none.png, chart.jpg")
+    assert paths == [os.path.join(graph.figure_store.directory, "f1.svg")]
+    assert missing == ["chart.jpg", "images/none.png"]
+
+
+def test_pdf_report_renders_every_row_by_default(tmp_path):
+    df = pd.DataFrame({"id": range(2500), "name": ["row"] * 2500})
+    result = graph.write_pdf_report(df, str(tmp_path / "out.pdf"), "All rows")
+    assert result["rows"] == result["total_rows"] == 2500
+    assert result["pages"] > 1
+
+
+def test_pdf_report_cap_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(graph, "PDF_MAX_ROWS", 100)
+    df = pd.DataFrame({"id": range(500)})
+    result = graph.write_pdf_report(df, str(tmp_path / "out.pdf"), "Capped")
+    assert (result["rows"], result["total_rows"]) == (100, 500)
+
+
+def frame(rows: int = 250) -> pd.DataFrame:
+    return pd.DataFrame({"id": range(rows), "city": ["Paris", None, "Rome", "Oslo", "Lima"] * (rows // 5),
+                         "day": pd.date_range("2024-01-01", periods=rows, freq="h")})
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(graph, "EXPORT_CHUNK_ROWS", 100)
+
+
+def test_parquet_is_written_in_row_groups_per_chunk(tmp_path, small_chunks):
+    path = str(tmp_path / "out.parquet")
+    graph.write_columnar(frame(), path, "parquet", graph.export_codec("parquet"), level=3)
+    assert pq.ParquetFile(path).num_row_groups == 3
+    assert pq.ParquetFile(path).metadata.row_group(0).column(0).compression == "ZSTD"
+    pd.testing.assert_frame_equal(pd.read_parquet(path), frame())
+
+
+def test_feather_round_trips(tmp_path, small_chunks):
+    path = str(tmp_path / "out.feather")
+    graph.write_columnar(frame(), path, "feather", "lz4")
+    pd.testing.assert_frame_equal(pd.read_feather(path), frame())
+
+
+def test_compressed_text_exports_write_one_header(tmp_path, small_chunks):
+    progress = []
+    csv_path, ndjson_path = str(tmp_path / "out.csv.gz"), str(tmp_path / "out.ndjson.gz")
+    graph.write_columnar(frame(), csv_path, "csv", "gzip", progress=lambda done, total: progress.append(done))
+    graph.write_columnar(frame(), ndjson_path, "ndjson", "gzip")
+    assert progress == [100, 200, 250]
+    with gzip.open(csv_path, "rt") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 251 and lines[0].replace('"', '') == "id,city,day"
+    records = pd.read_json(ndjson_path, lines=True, compression="gzip")
+    assert records["id"].tolist() == list(range(250))
+
+
+def test_export_codec_validates_per_format():
+    assert graph.export_codec("csv") == "gzip"
+    assert graph.export_suffix("ndjson", "zstd") == ".ndjson.zst"
+    assert graph.export_suffix("parquet", "zstd") == ".parquet"
+    with pytest.raises(ValueError, match="compression for feather"):
+        graph.export_codec("feather", "gzip")
+
+
+def wait_for(jobs, thread_id, job_id) -> dict:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        report, = jobs.status(thread_id, job_id)
+        if report["status"] in ("completed", "failed"):
+            return report
+        time.sleep(0.02)
+    raise AssertionError("the export job did not finish")
+
+
+def test_staged_file_only_appears_when_complete(tmp_path):
+    path = str(tmp_path / "out.csv")
+    with pytest.raises(RuntimeError):
+        with graph.staged_file(path) as tmp:
+            open(tmp, "w").write("partial")
+            raise RuntimeError("boom")
+    assert os.listdir(tmp_path) == []
+    with graph.staged_file(path) as tmp:
+        open(tmp, "w").write("done")
+    assert os.listdir(tmp_path) == ["out.csv"]
+
+
+def test_export_jobs_report_progress_and_result(tmp_path):
+    jobs = graph.ExportJobs(workers=1)
+    release = threading.Event()
+    path = str(tmp_path / "out.bin")
+
+    def export(progress):
+        progress(5, 10)
+        release.wait(5)
+        open(path, "wb").write(b"x" * 2048)
+        progress(10, 10)
+        return "exported"
+
+    job_id = jobs.submit("t1", {"df_name": "df", "format": "csv", "rows": 10, "rel_path": "exports/out.bin",
+                                "file_path": path}, export)
+    deadline = time.monotonic() + 5
+    while jobs.status("t1", job_id)[0]["rows_written"] != 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    running, = jobs.status("t1", job_id)
+    assert running["status"] == "running" and running["progress_percent"] == 50.0
+    assert jobs.status("t2") == []
+    release.set()
+    report = wait_for(jobs, "t1", job_id)
+    assert report["status"] == "completed" and report["path"] == "exports/out.bin"
+    assert report["bytes"] == 2048 and report["size"] == "2.0 KB"
+
+
+def test_failed_export_jobs_keep_the_error():
+    jobs = graph.ExportJobs(workers=1)
+
+    def export(progress):
+        raise OSError("disk full")
+
+    report = wait_for(jobs, "t1", jobs.submit("t1", {"df_name": "df", "format": "csv"}, export))
+    assert report["status"] == "failed" and report["result"] == "Export failed: disk full"
+    assert jobs.stats()["failed"] == 1
+
+
+def test_background_export_writes_the_file_once_done(workspace, monkeypatch):
+    jobs = graph.ExportJobs(workers=1)
+    monkeypatch.setattr(graph, "export_jobs", jobs)
+    workspace.set("df", frame())
+    text = graph._export_data(workspace, "df", "parquet", "bg", "", 0, "", "yes")
+    job_id = text.split()[2]
+    assert text.startswith(f"Export job {job_id} queued: 250 rows")
+    report = wait_for(jobs, workspace.thread_id, job_id)
+    assert report["status"] == "completed" and report["path"] == "exports/bg.parquet"
+    path = os.path.join(os.getenv("PUBLIC_DIR"), report["path"])
+    pd.testing.assert_frame_equal(pd.read_parquet(path), frame())
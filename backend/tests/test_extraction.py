@@ -0,0 +1,216 @@
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+import graph
+
+
+def raw_chunk() -> pd.DataFrame:
+    # Dtypes as pandas builds them from pymysql rows / pandas 由 pymysql 行构建时的数据类型
+    return pd.DataFrame({
+        "id": [1, 2, 3, 4],
+        "city": ["Paris", "Paris", "Rome", "Paris"],
+        "price": [1.5, 2.25, 3.0, 4.5],
+        "day": [datetime.date(2024, 1, d) for d in range(1, 5)],
+    })
+
+
+def test_compact_chunk_downcasts_with_the_extraction_plan():
+    plan = {}
+    chunk = graph.compact_chunk(raw_chunk(), plan)
+    assert plan == {"id": "int", "city": "category", "price": "float", "day": "datetime"}
+    assert str(chunk["id"].dtype) == "int8"
+    assert isinstance(chunk["city"].dtype, pd.CategoricalDtype)
+    assert str(chunk["price"].dtype) == "float32"
+    assert pd.api.types.is_datetime64_any_dtype(chunk["day"])
+
+
+class RowCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.description = [("id",), ("city",), ("price",)]
+
+    def execute(self, sql):
+        pass
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        pass
+
+
+class RowConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.closed = False
+
+    def cursor(self, cursor_class=None):
+        return RowCursor(self.rows)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def rows_pool(monkeypatch):
+    released = []
+    rows = [(i, ["Paris", "Rome"][i % 2], i * 0.5) for i in range(1000)]
+    monkeypatch.setattr(graph.db_pool, "acquire", lambda: RowConnection(rows))
+    monkeypatch.setattr(graph.db_pool, "release", lambda conn, discard=False: released.append(discard))
+    return released
+
+
+def test_read_sql_chunked_streams_compact_chunks(rows_pool):
+    budget = graph.ExtractionBudget(64)
+    df = graph.read_sql_chunked("SELECT * FROM t", budget, chunk_rows=300)
+    assert len(df) == 1000 and df["id"].tolist() == list(range(1000))
+    assert isinstance(df["city"].dtype, pd.CategoricalDtype)
+    assert set(df["city"].cat.categories) == {"Paris", "Rome"}
+    assert str(df["price"].dtype) == "float32"
+    assert 0 < budget.used <= budget.peak
+    assert rows_pool == [False]
+
+
+def test_read_sql_chunked_stops_at_the_memory_budget(rows_pool):
+    budget = graph.ExtractionBudget(0.001)
+    with pytest.raises(graph.MemoryBudgetExceeded, match="after 300 rows"):
+        graph.read_sql_chunked("SELECT * FROM t", budget, chunk_rows=300)
+    # The unread remainder is dropped with the connection / 未读取的剩余数据随连接一起丢弃
+    assert rows_pool == [True]
+
+
+def test_settle_dtypes_compacts_columns_first_seen_empty():
+    df = pd.DataFrame({"n": pd.Series([None, 7, 300], dtype=object)})
+    df = graph.settle_dtypes(df, {"n": "int"})
+    assert str(df["n"].dtype) == "float32"
+
+
+class FailingCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        raise graph.pymysql.err.OperationalError(1054, "Unknown column 'created' in 'field list'")
+
+
+class FailingConnection:
+    def cursor(self):
+        return FailingCursor()
+
+
+def test_plan_partitions_falls_back_when_the_column_is_not_selected(monkeypatch):
+    @graph.contextmanager
+    def connection():
+        yield FailingConnection()
+
+    monkeypatch.setattr(graph.db_pool, "connection", connection)
+    with pytest.raises(graph.ExtractionFallback, match="Unknown column"):
+        graph.plan_partitions("SELECT id, created AS day FROM orders ORDER BY created", "created", 4)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return graph.ExtractCache(str(tmp_path / "extracts"), max_bytes=1 << 30, max_age=3600, max_parts=3)
+
+
+STATE = {"update_times": {}, "tables_complete": False, "watermark_column": "", "watermark": None}
+
+
+def events(start: int, stop: int) -> pd.DataFrame:
+    return pd.DataFrame({"id": range(start, stop), "kind": ["a", "b"] * ((stop - start) // 2)})
+
+
+def test_extract_cache_appends_new_rows_as_parts(cache):
+    sql = "SELECT * FROM events"
+    revision = cache.store(sql, events(0, 100), STATE)
+    base_file = os.path.join(cache.directory, cache.key(sql) + ".arrow")
+    written = os.path.getmtime(base_file)
+    revision = cache.append(sql, revision, 100, events(100, 110), STATE)
+    # Tail rows replaced by a dedup refresh are cut, not rewritten / 去重刷新替换的尾部行被截去而非重写
+    revision = cache.append(sql, revision, 108, events(108, 120), STATE)
+    assert os.path.getmtime(base_file) == written
+    df, current = cache.peek(sql)
+    assert current == revision
+    pd.testing.assert_frame_equal(df, events(0, 120), check_dtype=False)
+
+
+def test_extract_cache_append_without_new_rows_writes_no_data(cache):
+    sql = "SELECT * FROM events"
+    revision = cache.store(sql, events(0, 10), STATE)
+    files = sorted(os.listdir(cache.directory))
+    assert cache.append(sql, revision, 10, events(0, 0), dict(STATE, watermark="9")) == revision + 1
+    assert sorted(os.listdir(cache.directory)) == files
+
+
+def test_extract_cache_append_refuses_a_changed_entry_and_compacts(cache):
+    sql = "SELECT * FROM events"
+    revision = cache.store(sql, events(0, 10), STATE)
+    assert cache.append(sql, revision - 1, 10, events(10, 12), STATE) is None
+    revision = cache.append(sql, revision, 10, events(10, 12), STATE)
+    revision = cache.append(sql, revision, 12, events(12, 14), STATE)
+    # max_parts reached: the caller stores in full / 达到分段上限：调用方完整写入
+    assert cache.append(sql, revision, 14, events(14, 16), STATE) is None
+    cache.store(sql, events(0, 16), STATE)
+    assert sorted(os.listdir(cache.directory)) == sorted(os.path.basename(p) for p in cache._paths(cache.key(sql)))
+
+
+def test_incremental_refresh_ignores_partition_column_and_appends(workspace, cache, monkeypatch):
+    sql = "SELECT * FROM events"
+    monkeypatch.setattr(graph, "extract_cache", cache)
+    monkeypatch.setattr(cache, "freshness_state", lambda *args: STATE)
+    monkeypatch.setattr(graph, "read_sql_chunked",
+                        lambda query, budget, *args: events(100, 110) if "_inc" in query else events(0, 100))
+
+    def partitioned(*args):
+        raise AssertionError("the refresh must not re-extract in full")
+
+    monkeypatch.setattr(graph, "read_sql_partitioned", partitioned)
+    graph._extract_into(workspace, sql, "ev", 2048, "", 8, 4, True, "", "", "")
+    result = graph._extract_into(workspace, sql, "ev", 2048, "id", 8, 4, True, "", "id", "")
+    assert "Incremental refresh from the existing DataFrame: fetched 10 rows" in result
+    assert len(workspace.get("ev")) == 110
+    assert len(cache._parts(cache.key(sql), cache._read_meta(cache._paths(cache.key(sql))[1]))) == 2
+
+
+def test_extract_cache_key_ignores_layout_but_not_literals(cache):
+    assert cache.key("SELECT *\n  FROM events") == cache.key("SELECT * FROM events")
+    assert cache.key("SELECT * FROM events WHERE k = 'a  b'") != cache.key("SELECT * FROM events WHERE k = 'a b'")
+
+
+def test_extract_cache_hit_until_the_table_changes(cache):
+    sql = "SELECT * FROM events"
+    state = dict(STATE, update_times={"events": "2024-01-01 00:00:00"}, tables_complete=True)
+    cache.store(sql, events(0, 10), state)
+    df, meta = cache.lookup(sql, state)
+    pd.testing.assert_frame_equal(df, events(0, 10), check_dtype=False)
+    assert meta["rows"] == 10
+    changed = dict(state, update_times={"events": "2024-01-02 00:00:00"})
+    assert cache.lookup(sql, changed) == (None, None)
+    assert cache.stats()["stale"] == 1 and os.listdir(cache.directory) == []
+
+
+def test_extract_cache_watermark_decides_freshness(cache):
+    sql = "SELECT * FROM events"
+    state = dict(STATE, watermark_column="id", watermark="9")
+    cache.store(sql, events(0, 10), state)
+    assert cache.lookup(sql, state)[0] is not None
+    assert cache.lookup(sql, dict(state, watermark="11")) == (None, None)
+
+
+def test_extract_cache_evicts_the_least_recently_used_entry(cache):
+    cache.store("SELECT 1", events(0, 100), STATE)
+    size = cache._read_meta(cache._paths(cache.key("SELECT 1"))[1])["bytes"]
+    cache.max_bytes = int(size * 2.5)
+    cache.store("SELECT 2", events(0, 100), STATE)
+    assert cache.lookup("SELECT 1", STATE)[0] is not None
+    cache.store("SELECT 3", events(0, 100), STATE)
+    assert cache.stats()["evictions"] == 1
+    assert cache.peek("SELECT 2") == (None, None)
+    assert cache.peek("SELECT 1")[0] is not None and cache.peek("SELECT 3")[0] is not None
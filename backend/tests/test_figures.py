@@ -0,0 +1,139 @@
+import os
+import pickle
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+import figures
+import graph
+from workers import WorkerPool
+from workspace import workspace_manager
+
+CODE = "chart, ax = plt.subplots()\nax.plot(scale(df['id']))\ndf['id'] = 0\nextra = 1"
+
+
+@pytest.fixture
+def config():
+    config = {"configurable": {"thread_id": "figures-test"}}
+    with workspace_manager.use(config) as ws:
+        ws.set("df", pd.DataFrame({"id": range(10)}))
+        ws.define("scale", "def scale(values):\n    return values * 2")
+    yield config
+    with workspace_manager.use(config) as ws:
+        ws.clear()
+
+
+def test_render_job_returns_image_bytes():
+    inputs = {"df": pickle.dumps(pd.DataFrame({"id": range(10)}))}
+    definitions = {"scale": "def scale(values):\n    return values * 2"}
+    result = figures.render_figure(CODE, "chart", inputs, definitions, figures.output_profile("svg"))
+    assert b"<svg" in result["saved"]["images"][".svg"]
+    assert result["saved"]["images"][".thumb.png"].startswith(b"\x89PNG")
+    assert plt.get_fignums() == []
+
+
+def test_plotting_code_does_not_change_the_workspace(config):
+    text = graph._fig_inter(CODE, "chart", 10, "auto", 0, config)
+    assert text.startswith("Image saved successfully")
+    with workspace_manager.use(config) as ws:
+        assert ws.get("df")["id"].sum() == 45
+        assert "extra" not in ws and "chart" not in ws
+
+
+def test_render_workers_return_the_image(config, monkeypatch):
+    pool = WorkerPool("fig_inter", size=1, warm=("figures",))
+    monkeypatch.setattr(graph, "render_pool", pool)
+    try:
+        text = graph._fig_inter(CODE, "chart", 30, "png", 0, config)
+    finally:
+        pool.close_all()
+    path = text.split(": ", 1)[1].split(" ", 1)[0]
+    with open(os.path.join(os.path.dirname(graph.figure_store.directory), path), "rb") as f:
+        assert f.read(4) == b"\x89PNG"
+    with workspace_manager.use(config) as ws:
+        assert ws.get("df")["id"].sum() == 45
+
+
+def test_output_profile_validates_format_and_clamps_dpi():
+    assert figures.output_profile("PNG", 1000)["dpi"] == 300
+    assert figures.output_profile("auto", 0)["dpi"] == figures.FIG_DPI
+    with pytest.raises(ValueError, match="output_format"):
+        figures.output_profile("gif")
+
+
+def test_auto_profile_uses_svg_for_light_charts_and_raster_for_dense_ones():
+    profile = dict(figures.output_profile(), svg_max_points=500, rasterize_points=200)
+    light, ax = plt.subplots()
+    ax.plot(range(50))
+    dense, ax = plt.subplots()
+    scatter = ax.scatter(range(1000), range(1000))
+    try:
+        assert figures.prepare_figure(light, profile) == ("svg", 50, 0)
+        assert figures.prepare_figure(dense, profile) == ("png", 1000, 1)
+        assert scatter.get_rasterized()
+    finally:
+        plt.close("all")
+
+
+def test_thumbnail_only_for_wide_figures():
+    profile = dict(figures.output_profile("png", 100), thumb_width=480)
+    narrow, _ = plt.subplots(figsize=(4, 3))
+    wide, _ = plt.subplots(figsize=(10, 4))
+    try:
+        assert set(figures.save_figure(narrow, profile)["images"]) == {".png"}
+        assert set(figures.save_figure(wide, profile)["images"]) == {".png", ".thumb.png"}
+    finally:
+        plt.close("all")
+
+
+def test_figure_store_publishes_under_the_content_key(tmp_path):
+    store = graph.FigureStore(str(tmp_path / "images"), max_bytes=1 << 20)
+    stored = store.publish("k1", {".svg": b"<svg/>", ".thumb.png": b"png"})
+    assert stored == {".svg": "images/k1.svg", ".thumb.png": "images/k1.thumb.png"}
+    assert store.lookup("k1") == stored
+    assert sorted(os.listdir(tmp_path / "images")) == ["k1.svg", "k1.thumb.png"]
+    markdown = graph.image_markdown(stored, "SVG")
+    assert "[![Visualization](images/k1.thumb.png)](images/k1.svg)" in markdown
+
+
+def test_lttb_keeps_the_end_points_and_the_spike():
+    y = np.zeros(10_000)
+    y[4321] = 100
+    index = figures.lttb_indices(np.arange(10_000), y, 200)
+    assert len(index) == 200 and index[0] == 0 and index[-1] == 9_999
+    assert 4321 in index
+
+
+def test_minmax_keeps_every_bucket_extreme():
+    y = np.sin(np.linspace(0, 20, 10_000))
+    y[9_999] = -5
+    index = figures.minmax_indices(y, 100)
+    assert len(index) <= 100 and np.all(np.diff(index) > 0)
+    assert y[index].max() == y.max() and 9_999 in index
+
+
+def test_fastplot_reduces_large_inputs_and_says_so():
+    helpers = figures.PlotHelpers(threshold=1000, line_points=100)
+    _, ax = plt.subplots()
+    try:
+        line, = helpers.line(ax, np.arange(5000), np.random.default_rng(0).normal(size=5000))
+        assert len(line.get_xdata()) == 100
+        assert helpers.scatter(ax, np.arange(5000), np.arange(5000)).__class__.__name__ == "PolyCollection"
+        sample = helpers.scatter(ax, np.arange(5000), np.arange(5000), kind="sample", sample=500)
+        assert len(sample.get_offsets()) == 500
+        helpers.hist(ax, np.arange(5000), bins=10)
+        small = figures.PlotHelpers(threshold=1000)
+        small.line(ax, range(10))
+    finally:
+        plt.close("all")
+    assert [note.split(":")[0] for note in helpers.notes] == ["line", "scatter", "scatter", "hist"]
+    assert small.notes == []
+
+
+def test_fig_inter_reports_downsampling(config):
+    with workspace_manager.use(config) as ws:
+        ws.set("big", pd.Series(np.arange(100_000)))
+    text = graph._fig_inter("chart, ax = plt.subplots()\nfastplot.line(ax, big)", "chart", 30, "png", 0, config)
+    assert "downsampled: line: 100,000 →" in text
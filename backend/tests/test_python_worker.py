@@ -0,0 +1,86 @@
+import os
+
+import pandas as pd
+import pytest
+
+from execution import code_cache
+from workspace import python_workers, run_python_in_worker
+
+pytestmark = pytest.mark.skipif(not python_workers.enabled, reason="python_inter workers are disabled")
+
+
+@pytest.fixture
+def ws(workspace):
+    workspace.set("df", pd.DataFrame({"id": range(100), "name": [f"n{i}" for i in range(100)]}))
+    yield workspace
+    workspace.clear()
+
+
+def run(ws, code: str) -> str:
+    with ws.lock:
+        return run_python_in_worker(ws, code, 10)
+
+
+def test_code_runs_in_another_process_without_the_server_module(ws):
+    run(ws, "import os, sys\npid = os.getpid()\nloaded = 'graph' in sys.modules")
+    assert ws.get("pid") != os.getpid()
+    assert ws.get("loaded") is False
+
+
+def test_reading_sends_nothing_back(ws):
+    original, version = ws.namespace["df"], ws.versions["df"]
+    assert run(ws, "total = df['id'].sum()") == "total = 4950"
+    assert ws.namespace["df"] is original
+    assert ws.versions["df"] == version
+
+
+def test_in_place_writes_come_back(ws):
+    version = ws.versions["df"]
+    run(ws, "df.loc[0, 'id'] = -1")
+    assert ws.get("df").loc[0, "id"] == -1
+    assert ws.versions["df"] != version
+
+
+def test_definitions_are_kept_as_source_and_replayed(ws):
+    run(ws, "import math as m\n\ndef mark(frame):\n    frame['flag'] = m.floor(1.5)")
+    assert set(ws.definitions) == {"m", "mark"}
+    assert "def mark(frame)" in ws.definitions["mark"]
+    run(ws, "mark(df)")
+    assert ws.get("df")["flag"].eq(1).all()
+
+
+def test_rebinding_a_definition_keeps_the_value(ws):
+    run(ws, "def f():\n    return 1")
+    run(ws, "f = 2")
+    assert "f" not in ws.definitions and ws.get("f") == 2
+
+
+def test_values_that_cannot_leave_the_worker_are_reported(ws):
+    text = run(ws, "gen = (i for i in range(3))\nkept = 1")
+    assert "Not kept" in text and "gen" in text
+    assert "gen" not in ws and ws.get("kept") == 1
+
+
+def test_deleted_names_are_forgotten(ws):
+    run(ws, "tmp = 1")
+    run(ws, "del tmp")
+    assert "tmp" not in ws
+
+
+def test_spilled_frames_are_sent(ws):
+    ws.spill("df")
+    assert run(ws, "len(df)") == "100"
+
+
+def test_a_crashed_worker_leaves_the_workspace_unchanged(ws):
+    text = run(ws, "df['id'] = 0\nimport os, signal\nos.kill(os.getpid(), signal.SIGKILL)")
+    assert text.startswith("Code execution error: the Python worker")
+    assert ws.get("df")["id"].sum() == 4950
+    assert run(ws, "1 + 1") == "2"
+
+
+def test_definitions_follow_the_last_top_level_binding():
+    snippet, _ = code_cache.compile("import os, json as j\ndef f():\n    pass\nf = 1\ng = lambda x: x\n",
+                                    "<test>")
+    assert set(snippet.definitions) == {"os", "j", "g"}
+    assert snippet.definitions["g"] == "g = lambda x: x"
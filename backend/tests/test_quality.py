@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+import graph
+
+
+def list_frame() -> pd.DataFrame:
+    return pd.DataFrame({"tags": [[1, 2], [1, 2], [3], {"k": [1]}, {"k": [1]}] * 4, "n": [1, 1, 2, 3, 3] * 4})
+
+
+def test_duplicates_compare_list_cells_by_value():
+    assert graph.duplicate_count(list_frame()) == 17
+    assert graph.duplicate_count(list_frame(), exact=False) == 17
+
+
+def test_approximate_profile_skips_distinct_count_of_list_columns():
+    column = graph.approximate_profile(list_frame())["columns"][0]
+    assert column["unique"] is None and "approx_unique" not in column
+
+
+def big_frame(rows: int = 50_000) -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({"code": [f"c{i}" for i in rng.integers(0, 20_000, rows)],
+                         "value": rng.normal(size=rows), "flag": rng.integers(0, 2, rows)})
+
+
+def test_hll_distinct_is_within_its_error_bound():
+    for n in (10, 1000, 200_000):
+        hashes = graph.column_hashes(pd.Series([f"v{i}" for i in range(n)], dtype=object))
+        assert abs(graph.hll_distinct(hashes) - n) <= max(1, 0.033 * n)
+
+
+def test_duplicate_count_matches_pandas():
+    df = pd.DataFrame({"a": [1, 1, 2, 2, 3] * 200, "b": [0.0, -0.0, 1.5, 1.5, None] * 200})
+    expected = int(df.duplicated().sum())
+    assert graph.duplicate_count(df) == expected
+    assert graph.duplicate_count(df, exact=False) == expected
+
+
+def test_use_approximate_follows_mode_and_threshold(monkeypatch):
+    monkeypatch.setattr(graph, "PROFILE_APPROX_ROWS", 100)
+    small, large = pd.DataFrame({"a": range(100)}), pd.DataFrame({"a": range(101)})
+    assert not graph.use_approximate(small, "auto") and graph.use_approximate(large, "auto")
+    assert graph.use_approximate(small, "approx") and not graph.use_approximate(large, "exact")
+
+
+def test_approximate_profile_keeps_cheap_statistics_exact(monkeypatch):
+    monkeypatch.setattr(graph, "PROFILE_SAMPLE_ROWS", 2000)
+    df = big_frame()
+    df.loc[::10, "value"] = np.nan
+    profile = graph.approximate_profile(df)
+    code, value, _ = profile["columns"]
+    assert profile["rows"] == 50_000 and profile["approx"]["sample_rows"] == 2000
+    assert value["missing"] == 5000
+    assert value["min"] == df["value"].min() and value["max"] == df["value"].max()
+    assert abs(value["mean"] - df["value"].mean()) < 1e-12
+    assert code["approx_unique"] and abs(code["unique"] - df["code"].nunique()) <= 0.033 * df["code"].nunique()
+    notes = "\n".join(graph.approximation_notes(profile))
+    assert "APPROXIMATE MODE (50,000 rows" in notes and "2,000-row uniform sample" in notes
+    assert "exact path estimated" in notes
@@ -0,0 +1,65 @@
+import pytest
+
+import graph
+
+
+@pytest.mark.parametrize("sql, tables", [
+    ("SELECT * FROM orders", {"orders"}),
+    ("SELECT * FROM shop.orders o, `items` i WHERE o.id = i.order_id", {"orders", "items"}),
+    ("SELECT * FROM a JOIN b ON a.id = b.id, c", {"a", "b", "c"}),
+    ("SELECT * FROM (SELECT id FROM a) AS t JOIN b USING (id)", {"a", "b"}),
+    ("WITH recent AS (SELECT * FROM orders) SELECT * FROM recent, customers", {"orders", "customers"}),
+    ("UPDATE a, b SET a.x = b.x WHERE a.id = b.id", {"a", "b"}),
+    ("INSERT INTO log (msg) VALUES ('from fake')", {"log"}),
+])
+def test_sql_tables(sql, tables):
+    assert graph.sql_tables(sql) == tables
+
+
+def test_sql_table_refs_marks_table_functions_incomplete():
+    refs, complete = graph.sql_table_refs(
+        "SELECT * FROM a JOIN JSON_TABLE(a.j, '$[*]' COLUMNS (x INT PATH '$')) jt")
+    assert refs == {("", "a")}
+    assert not complete
+    refs, complete = graph.sql_table_refs("SELECT * FROM other.a, b")
+    assert refs == {("other", "a"), ("", "b")}
+    assert complete
+
+
+@pytest.mark.parametrize("sql, verb, read_only", [
+    ("SELECT 1", "select", True),
+    ("  (SELECT * FROM a)", "select", True),
+    ("WITH x AS (SELECT 1) SELECT * FROM x", "select", True),
+    ("WITH x AS (SELECT id FROM a) DELETE FROM a WHERE id IN (SELECT id FROM x)", "delete", False),
+    ("SHOW TABLES", "show", True),
+    ("\n  drop table a;", "drop", False),
+])
+def test_statement_verb(sql, verb, read_only):
+    assert graph.statement_verb(sql) == verb
+    assert graph.is_read_only_sql(sql) is read_only
+
+
+@pytest.fixture
+def orders_catalog(monkeypatch):
+    catalog = {"tables": {"orders": {"columns": [
+        {"name": "id", "type": "int(11)", "key": "PRI"},
+        {"name": "day", "type": "date", "key": "MUL"},
+    ]}}}
+    monkeypatch.setattr(graph.schema_catalog_cache, "get", lambda *args, **kwargs: catalog)
+
+
+def test_resolve_partition_column_uses_primary_key(orders_catalog):
+    assert graph.resolve_partition_column("SELECT * FROM orders", "auto") == "id"
+    with pytest.raises(graph.ExtractionFallback):
+        graph.resolve_partition_column("SELECT * FROM orders, items", "auto")
+
+
+@pytest.mark.parametrize("sql, column", [
+    ("SELECT * FROM orders", "day"),
+    ("SELECT day, COUNT(*) FROM orders GROUP BY day", "day"),
+    ("SELECT DISTINCT id FROM orders", "id"),
+    ("SELECT * FROM orders ORDER BY day LIMIT 10", "day"),
+])
+def test_plan_partitions_falls_back(orders_catalog, sql, column):
+    with pytest.raises(graph.ExtractionFallback):
+        graph.plan_partitions(sql, column, 4)
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import graph
+from execution import CancelScope
+from workers import WorkerPool, WorkerStopped
+from workspace import python_workers, run_python_in_worker
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool("test", size=1)
+    yield pool
+    pool.close_all()
+
+
+def test_a_call_past_its_timeout_kills_the_worker(pool):
+    with pytest.raises(WorkerStopped) as stopped:
+        pool.call(time.sleep, (30,), timeout=0.5)
+    assert stopped.value.reason == "timeout" and stopped.value.elapsed < 5
+    assert pool.stats()["timeouts"] == 1
+    assert pool.call(abs, (-1,)) == 1
+
+
+def test_cancelling_a_call_kills_the_worker(pool):
+    cancel = CancelScope()
+    threading.Timer(0.5, cancel.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(WorkerStopped) as stopped:
+        pool.call(time.sleep, (30,), timeout=60, cancel=cancel)
+    assert stopped.value.reason == "cancelled" and time.monotonic() - started < 5
+    assert pool.stats()["cancelled"] == 1
+    assert pool.call(abs, (-2,)) == 2
+
+
+@pytest.mark.skipif(not python_workers.enabled, reason="python_inter workers are disabled")
+def test_python_inter_timeout_reports_and_keeps_the_workspace(workspace):
+    workspace.set("df", pd.DataFrame({"id": range(10)}))
+    with workspace.lock:
+        text = run_python_in_worker(workspace, "df['id'] = 0\nwhile True:\n    pass", 1)
+    report = json.loads(text)
+    assert report["status"] == "timeout" and report["worker_restarted"] is True
+    assert workspace.get("df")["id"].sum() == 45
+
+
+@pytest.mark.skipif(not python_workers.enabled, reason="python_inter workers are disabled")
+def test_cancelling_the_run_stops_python_inter():
+    config = {"configurable": {"thread_id": "limits-test"}}
+    cancelled = python_workers.stats()["cancelled"]
+
+    async def cancel_soon():
+        task = asyncio.ensure_future(graph.python_inter.coroutine("import time\ntime.sleep(30)", 60, config))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_soon())
+    deadline = time.monotonic() + 5
+    while python_workers.stats()["cancelled"] == cancelled and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert python_workers.stats()["cancelled"] == cancelled + 1
+
+
+def test_fig_inter_timeout_in_a_render_worker(monkeypatch):
+    pool = WorkerPool("fig_inter", size=1, warm=("figures",))
+    monkeypatch.setattr(graph, "render_pool", pool)
+    try:
+        text = graph._fig_inter("chart, ax = plt.subplots()\nwhile True:\n    pass", "chart", 1, "auto", 0,
+                                {"configurable": {"thread_id": "limits-test"}})
+    finally:
+        pool.close_all()
+    report = json.loads(text)
+    assert report["status"] == "timeout" and report["note"].startswith("The code was stopped")
+    assert "No image was saved." in report["note"]
@@ -0,0 +1,55 @@
+import pandas as pd
+
+import graph
+
+
+def frame(rows: int = 1000) -> pd.DataFrame:
+    return pd.DataFrame({"id": range(rows), "value": [i * 0.5 for i in range(rows)]})
+
+
+def test_spill_and_reload_keep_value_and_version(workspace):
+    workspace.set("df", frame())
+    version = workspace.versions["df"]
+    freed = workspace.spill("df")
+    assert freed > 0
+    assert "df" in workspace.spilled and "df" not in workspace.namespace
+    assert workspace.nbytes == 0
+    reloaded = workspace.get("df")
+    pd.testing.assert_frame_equal(reloaded, frame())
+    assert workspace.versions["df"] == version
+    assert not workspace.spilled
+
+
+def test_rebinding_a_spilled_name_drops_the_file(workspace):
+    workspace.set("df", frame())
+    workspace.spill("df")
+    workspace.set("df", frame(10))
+    assert not workspace.spilled
+    assert len(workspace.get("df")) == 10
+
+
+def test_ensure_reloads_frames_read_by_workspace_functions(workspace):
+    workspace.set("df", frame())
+    exec("def total():\n    return helper() + len(df)\ndef helper():\n    return len(df)", workspace.namespace)
+    workspace.account()
+    workspace.spill("df")
+    workspace.ensure({"total"})
+    assert "df" in workspace.namespace
+    assert eval("total()", workspace.namespace) == 2000
+
+
+def test_spill_candidates_skip_aliased_frames(workspace):
+    df = frame()
+    workspace.set("a", df)
+    workspace.set("b", df)
+    workspace.set("c", frame())
+    assert [name for _, name, _ in workspace.spill_candidates(0)] == ["c"]
+
+
+def test_figure_inputs_leave_spilled_frames_on_disk(workspace):
+    workspace.set("df", frame())
+    snippet, _ = graph.code_cache.compile("chart, ax = plt.subplots()\nax.plot(df['id'])", "<fig_inter>")
+    before = graph.figure_inputs(workspace, snippet)
+    workspace.spill("df")
+    assert graph.figure_inputs(workspace, snippet) == before
+    assert "df" in workspace.spilled
@@ -0,0 +1,425 @@
+"""
+Worker processes for python_inter code
+python_inter 代码的工作进程
+
+Workers are plain multiprocessing processes (forkserver where available, else spawn), so
+none of them inherits the server's threads, locks or database connections. Jobs are
+stateless: each call sends the workspace values its code reads and gets back the values it
+changed. The worker imports this module and execution, never graph.
+工作进程是普通的 multiprocessing 进程（可用时使用 forkserver，否则使用 spawn），因此不会继承
+服务进程的线程、锁或数据库连接。任务是无状态的：每次调用发送代码读取的工作区变量，并取回
+其修改过的变量。工作进程只导入本模块与 execution，从不导入 graph。
+"""
+import time
+import pickle
+import signal
+import hashlib
+import logging
+import threading
+import multiprocessing
+import multiprocessing.connection
+
+import matplotlib
+
+from execution import code_cache, run_code, workspace_builtins
+
+try:
+    import resource  # POSIX only; used for the worker CPU and memory limits / 仅限 POSIX，用于工作进程的 CPU 与内存限制
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerStopped(Exception):
+    """
+    The worker process was stopped, or died, before it replied; it has been replaced
+    工作进程在回复前被终止或退出；已被替换
+
+    reason is "timeout", "cancelled", "cpu_limit" or "crashed".
+    reason 为 "timeout"、"cancelled"、"cpu_limit" 或 "crashed"。
+    """
+
+    def __init__(self, reason: str, message: str, elapsed: float):
+        super().__init__(message)
+        self.reason = reason
+        self.elapsed = elapsed
+
+# ============================================================================
+# WORKER PROCESS SIDE
+# 工作进程端
+# ============================================================================
+
+def _set_cpu_limit(cpu_seconds: float):
+    """Allow cpu_seconds more CPU time from now; returns the limit to restore / 从现在起再允许 cpu_seconds 的 CPU 时间；返回需恢复的限制"""
+    previous = resource.getrlimit(resource.RLIMIT_CPU)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1, previous[1]
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    return previous
+
+
+def _serve(conn, memory_bytes: int, cpu_seconds: float, warm: tuple):
+    """
+    Request loop of a worker process: run func(*args) for each (func, args) received
+    工作进程的请求循环：对收到的每个 (func, args) 执行 func(*args)
+    """
+    # Ctrl-C in the server's terminal is for the server / 服务终端中的 Ctrl-C 只针对服务进程
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if resource is not None and memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    matplotlib.use('Agg')
+    # Pre-warm the heavy imports analysis code usually needs / 预先导入分析代码常用的重量级库
+    for module in warm:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        func, args = request
+        # Past the limit the kernel sends SIGXCPU, which ends the process / 超过限制时内核发送 SIGXCPU 结束进程
+        limit = _set_cpu_limit(cpu_seconds) if resource is not None and cpu_seconds else None
+        try:
+            reply = ("ok", func(*args))
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        finally:
+            if limit is not None:
+                resource.setrlimit(resource.RLIMIT_CPU, limit)
+        try:
+            conn.send(reply)
+        except (EOFError, OSError):
+            break
+        except Exception as e:
+            conn.send(("error", f"the result could not be sent back: {type(e).__name__}: {e}"))
+
+# ============================================================================
+# SERVER SIDE
+# 服务进程端
+# ============================================================================
+
+# Modules the forkserver imports before it forks any worker, shared by every pool
+# forkserver 在 fork 任何工作进程之前导入的模块，由所有进程池共用
+_preload = ["workers"]
+
+
+def _start_method() -> str:
+    # Never fork: the server is multi-threaded by the time workers start / 不使用 fork：启动工作进程时服务进程已是多线程
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class Worker:
+    """One worker process and its pipe, used by one call at a time / 单个工作进程及其管道，同一时刻只处理一个调用"""
+
+    def __init__(self, context, name: str, memory_bytes: int, cpu_seconds: float, warm: tuple):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, memory_bytes, cpu_seconds, warm),
+                                       name=name, daemon=True)
+        self.process.start()
+        child.close()
+        self.tasks = 0
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of worker processes, one call per process at a time, with limits and recycling
+    固定大小的工作进程池，每个进程同一时刻只处理一个调用，带资源限制与回收
+
+    A call that runs past its timeout, or whose run is cancelled, gets its worker
+    killed and replaced: nothing inside the worker has to cooperate. A worker is also
+    replaced after it crashes or after max_tasks calls.
+    超时或被取消的调用会导致其工作进程被终止并替换，无需工作进程内部配合。工作进程崩溃或
+    执行满 max_tasks 次后也会被替换。
+    """
+
+    def __init__(self, name: str, size: int, max_tasks: int = 0, cpu_seconds: float = 0,
+                 memory_bytes: int = 0, warm: tuple = ()):
+        self.name = name
+        self.size = size
+        self.max_tasks = max_tasks
+        self.cpu_seconds = cpu_seconds if resource is not None else 0
+        self.memory_bytes = memory_bytes
+        self.warm = warm
+        self.enabled = size > 0
+        self._context = multiprocessing.get_context(_start_method())
+        if _start_method() == "forkserver":
+            # Workers fork from a server that already imported these; pools are
+            # created before the first worker starts the server
+            # 工作进程由已导入这些模块的 forkserver fork 出来；进程池在首个工作进程启动 forkserver 之前创建
+            _preload.extend(module for module in warm if module not in _preload)
+            self._context.set_forkserver_preload(_preload)
+        self._idle = []
+        self._count = 0
+        self._cond = threading.Condition()
+        self._stats = {"started": 0, "calls": 0, "timeouts": 0, "cancelled": 0, "crashed": 0, "recycled": 0}
+
+    def _new_worker(self) -> Worker:
+        worker = Worker(self._context, f"{self.name}-worker", self.memory_bytes, self.cpu_seconds, self.warm)
+        with self._cond:
+            self._stats["started"] += 1
+        logger.info("Started %s worker pid %s", self.name, worker.pid)
+        return worker
+
+    def start(self):
+        """Start the missing workers in the background, so the first call does not wait / 在后台启动缺少的工作进程，首次调用无需等待"""
+        def fill():
+            while True:
+                with self._cond:
+                    if self._count >= self.size:
+                        return
+                    self._count += 1
+                try:
+                    worker = self._new_worker()
+                except Exception as e:
+                    logger.warning("Starting a %s worker failed: %s", self.name, e)
+                    worker = None
+                self._release(worker)
+                if worker is None:
+                    return
+
+        if self.enabled:
+            threading.Thread(target=fill, name=f"{self.name}-start", daemon=True).start()
+
+    def _acquire(self) -> Worker:
+        with self._cond:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.process.is_alive():
+                        return worker
+                    self._count -= 1
+                    worker.kill()
+                if self._count < self.size:
+                    self._count += 1
+                    break
+                self._cond.wait()
+        try:
+            return self._new_worker()
+        except BaseException:
+            self._release(None)
+            raise
+
+    def _release(self, worker):
+        """Return a worker to the pool, or give up its slot when it is None / 将工作进程归还进程池；为 None 时释放其名额"""
+        with self._cond:
+            if worker is None:
+                self._count -= 1
+            else:
+                self._idle.append(worker)
+            self._cond.notify()
+
+    def call(self, func, args: tuple, timeout: float = None, cancel=None):
+        """
+        Run func(*args) in a free worker and return its result; func must be importable without graph
+        在空闲的工作进程中执行 func(*args) 并返回其结果；func 必须无需 graph 即可导入
+
+        :param cancel: an execution.CancelScope; cancelling it kills the worker
+        :raises WorkerStopped: on timeout, cancellation or when the worker dies
+        :raises RuntimeError: when func raised, with its message
+        """
+        worker = self._acquire()
+        cancelled = threading.Event()
+        if cancel is not None:
+            cancel.on_cancel(cancelled.set)
+        started = time.monotonic()
+        stopped = None
+        try:
+            worker.conn.send((func, args))
+            while True:
+                elapsed = time.monotonic() - started
+                if cancelled.is_set():
+                    stopped = WorkerStopped("cancelled", "was stopped because the run was cancelled", elapsed)
+                elif timeout is not None and elapsed >= timeout:
+                    stopped = WorkerStopped("timeout", f"did not finish within {timeout:.0f}s", elapsed)
+                if stopped is not None:
+                    break
+                # Wake up for the reply, the worker's exit, or to check the clock / 收到回复、进程退出或需要检查时间时唤醒
+                wait = 0.1 if timeout is None else min(0.1, timeout - elapsed)
+                ready = multiprocessing.connection.wait([worker.conn, worker.process.sentinel], max(wait, 0))
+                if worker.conn in ready:
+                    try:
+                        reply = worker.conn.recv()
+                        break
+                    except (EOFError, OSError):
+                        pass
+                if ready:
+                    worker.process.join(timeout=5)
+                    stopped = self._crash(worker, time.monotonic() - started)
+                    break
+        except (EOFError, OSError):
+            worker.process.join(timeout=1)
+            stopped = self._crash(worker, time.monotonic() - started)
+        finally:
+            if cancel is not None:
+                cancel.remove(cancelled.set)
+            if stopped is not None:
+                worker.kill()
+                self._release(None)
+                with self._cond:
+                    self._stats[{"timeout": "timeouts", "cancelled": "cancelled"}.get(stopped.reason, "crashed")] += 1
+        if stopped is not None:
+            logger.warning("%s worker pid %s %s", self.name, worker.pid, stopped)
+            raise stopped
+        worker.tasks += 1
+        with self._cond:
+            self._stats["calls"] += 1
+            recycle = self.max_tasks and worker.tasks >= self.max_tasks
+            if recycle:
+                self._stats["recycled"] += 1
+        if recycle:
+            worker.stop()
+            self._release(None)
+        else:
+            self._release(worker)
+        if reply[0] == "error":
+            raise RuntimeError(reply[1])
+        return reply[1]
+
+    def _crash(self, worker: Worker, elapsed: float) -> WorkerStopped:
+        code = worker.process.exitcode
+        if hasattr(signal, "SIGXCPU") and code == -signal.SIGXCPU:
+            return WorkerStopped("cpu_limit", f"exceeded its CPU time limit ({self.cpu_seconds:.0f}s)", elapsed)
+        if hasattr(signal, "SIGKILL") and code == -signal.SIGKILL:
+            return WorkerStopped("crashed", "was killed (signal 9), possibly for running out of memory", elapsed)
+        return WorkerStopped("crashed", f"exited unexpectedly (exit code {code})", elapsed)
+
+    def close_all(self):
+        with self._cond:
+            workers, self._idle = self._idle, []
+            self._count -= len(workers)
+        for worker in workers:
+            worker.stop()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"enabled": self.enabled, "size": self.size, "start_method": _start_method(),
+                    "workers": self._count, "idle": [w.pid for w in self._idle], **self._stats}
+
+# ============================================================================
+# PYTHON_INTER JOBS
+# python_inter 任务
+# ============================================================================
+# A python_inter job runs in a fresh namespace holding the workspace builtins,
+# the values its code reads and the workspace's definitions (functions,
+# classes, imports) replayed from source. It returns the values it created or
+# changed as pickles, its own definitions as source, and what it deleted.
+# Inputs count as changed when their pickled form changed, so read-only code
+# sends nothing back.
+# python_inter 任务在全新命名空间中运行，其中只有工作区内置名称、代码读取的变量，以及按
+# 源码重新执行的工作区定义（函数、类、导入）。任务以 pickle 形式返回其创建或修改的变量，
+# 以源码形式返回其新定义，并报告删除的名称。输入只有在其 pickle 结果变化时才视为已修改，
+# 因此只读代码不会传回任何数据。
+# ============================================================================
+
+class _HashWriter:
+    """File-like sink hashing what pickle writes, without building the bytes / 对 pickle 写出的内容计算哈希，而不构建完整字节串"""
+
+    def __init__(self):
+        self.digest = hashlib.sha1()
+
+    def write(self, data):
+        self.digest.update(data)
+
+
+def pickle_digest(value) -> bytes:
+    """Hash of a value's pickled form / 值的 pickle 结果的哈希"""
+    writer = _HashWriter()
+    pickle.Pickler(writer, protocol=pickle.HIGHEST_PROTOCOL).dump(value)
+    return writer.digest.digest()
+
+
+def replay_definitions(ns: dict, definitions: dict) -> dict:
+    """
+    Run definition sources in ns; ones that need a later definition are retried after it
+    在 ns 中执行定义源码；依赖后续定义的会在其后重试
+
+    :return: {name: error} of the definitions that could not be run again
+    """
+    pending, failed = dict(definitions), {}
+    while pending:
+        progress = False
+        for name, source in list(pending.items()):
+            try:
+                snippet, _ = code_cache.compile(source, "<python_inter>")
+                exec(snippet.code, ns)
+            except NameError as e:
+                failed[name] = f"{type(e).__name__}: {e}"
+                continue
+            except Exception as e:
+                failed[name] = f"{type(e).__name__}: {e}"
+            pending.pop(name)
+            progress = True
+        if not progress:
+            break
+    return {name: failed[name] for name in definitions if name in failed and name not in ns}
+
+
+def run_python(py_code: str, inputs: dict, definitions: dict) -> dict:
+    """
+    Run one python_inter call in a fresh namespace (inside a worker)
+    在全新的命名空间中执行一次 python_inter 调用（在工作进程中）
+
+    :param inputs: {name: pickled value} of the workspace variables the code reads
+    :param definitions: {name: source} of the workspace definitions the code reads
+    :return: {"text", "values": {name: pickled value}, "definitions": {name: source},
+             "deleted": [names], "failed": {name: why it cannot be sent back},
+             "unavailable": {name: why its definition could not be run}, "timings"}
+    """
+    ns = workspace_builtins()
+    base = set(ns)
+    digests = {}
+    for name, payload in inputs.items():
+        ns[name] = pickle.loads(payload)
+        digests[name] = pickle_digest(ns[name])
+    unavailable = replay_definitions(ns, definitions)
+    replayed = {name: id(ns[name]) for name in definitions if name in ns}
+    timings = {}
+    text = run_code(ns, py_code, timings=timings)
+    try:
+        snippet, _ = code_cache.compile(py_code, "<python_inter>")
+        defined = snippet.definitions
+    except (SyntaxError, ValueError):
+        defined = {}
+    values, new_definitions, failed = {}, {}, {}
+    for name, value in ns.items():
+        if name in base or name.startswith("__"):
+            continue
+        if name in defined:
+            new_definitions[name] = defined[name]
+            continue
+        if replayed.get(name) == id(value):
+            continue
+        try:
+            if name in digests and pickle_digest(value) == digests[name]:
+                continue
+            values[name] = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            failed[name] = f"{type(e).__name__}: {e}"
+    deleted = [name for name in [*inputs, *definitions] if name not in ns and name not in unavailable]
+    return {"text": text, "values": values, "definitions": new_definitions, "deleted": deleted,
+            "failed": failed, "unavailable": unavailable, "timings": timings}
+
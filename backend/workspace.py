@@ -0,0 +1,690 @@
+"""
+Per-thread workspaces of the agent's tools, and running python_inter code for them in worker processes
+智能体工具的按线程工作区，以及在工作进程中为其运行 python_inter 代码
+"""
+import os
+import sys
+import time
+import pickle
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import matplotlib
+import matplotlib.pyplot as plt
+
+from execution import (CancelScope, code_cache, code_names, code_object_names, interruption_report, log_timings,
+                       workspace_builtins)
+from workers import WorkerPool, WorkerStopped, run_python
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# DATAFRAME FILES AND FINGERPRINTS
+# DataFrame 文件与指纹
+# ============================================================================
+# Sizes, Arrow IPC files and content hashes of workspace values, shared by the
+# workspace spill files, the extract cache and the figure store.
+# 工作区变量的大小、Arrow IPC 文件与内容哈希，供工作区溢写文件、提取缓存与图像存储共用。
+# ============================================================================
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Deep memory usage of a DataFrame in bytes / DataFrame 的深度内存占用（字节）"""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def save_frame(df: pd.DataFrame, path: str, compression: str = "uncompressed") -> int:
+    """
+    Atomically write a DataFrame as an Arrow IPC file; returns the file size
+    以原子方式将 DataFrame 写为 Arrow IPC 文件，返回文件大小
+    """
+    table = pa.Table.from_pandas(df, preserve_index=None)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        feather.write_feather(table, tmp_path, compression=compression)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return os.path.getsize(path)
+
+
+def load_frame(path: str) -> pd.DataFrame:
+    """
+    Memory-map an Arrow IPC file back into a DataFrame
+    通过内存映射将 Arrow IPC 文件加载为 DataFrame
+    """
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def data_fingerprint(value):
+    """
+    Content hash of a workspace value, or None when it cannot be fingerprinted
+    工作区变量的内容哈希；无法计算时返回 None
+    """
+    digest = hashlib.sha256()
+    try:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            digest.update(type(value).__name__.encode())
+            digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+            digest.update(repr(list(value.dtypes) if isinstance(value, pd.DataFrame) else value.dtype).encode())
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        elif isinstance(value, np.ndarray) and value.dtype != object:
+            digest.update(f"{value.dtype}{value.shape}".encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            digest.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return None
+    return digest.hexdigest()
+
+# ============================================================================
+# PER-THREAD WORKSPACES
+# 按会话线程隔离的工作区
+# ============================================================================
+# Every LangGraph thread gets its own namespace for DataFrames, figures and
+# helper variables instead of sharing the server module's globals(). Variables are
+# size-accounted, idle workspaces are evicted least-recently-used first, and a
+# workspace can be torn down explicitly when its conversation ends.
+# 每个 LangGraph 线程拥有独立的命名空间存放 DataFrame、图像和辅助变量，而不是共享
+# 服务模块的 globals()。变量按内存占用计量，空闲工作区按最近最少使用顺序淘汰，
+# 会话结束时也可以显式销毁工作区。
+# ============================================================================
+
+def object_nbytes(value) -> int:
+    """Approximate memory held by a workspace variable / 工作区变量的近似内存占用"""
+    if isinstance(value, pd.DataFrame):
+        return frame_nbytes(value)
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    try:
+        return sys.getsizeof(value)
+    except TypeError:
+        return 0
+
+
+class Workspace:
+    """
+    Namespace of one conversation thread with per-variable memory accounting
+    单个会话线程的命名空间，按变量计量内存
+
+    DataFrames may be spilled to an Arrow file under spill_dir; they leave the
+    namespace and are reloaded the first time a tool asks for them again.
+    DataFrame 可被溢写到 spill_dir 下的 Arrow 文件；溢写后从命名空间移除，
+    并在工具再次访问时重新加载。
+
+    Functions, classes and imports that python_inter defined in a worker process
+    are kept as source in `definitions` and run again wherever code needs them.
+    python_inter 在工作进程中定义的函数、类与导入以源码形式保存在 `definitions` 中，
+    在代码需要时重新执行。
+
+    `origins` maps a variable to the (extract cache key, version, cache revision) it was extracted as.
+    `origins` 记录变量提取时对应的 (提取缓存键, 版本, 缓存修订号)。
+
+    `references` holds the globals each workspace function or class reads, so a
+    call to it brings back the spilled frames it needs.
+    `references` 记录每个工作区函数或类读取的全局名称，以便调用时重新加载其所需的已溢写 DataFrame。
+    """
+
+    def __init__(self, thread_id: str, spill_dir: str = None, manager=None):
+        self.thread_id = thread_id
+        self.namespace = workspace_builtins()
+        self._base = set(self.namespace)
+        self.sizes = {}
+        self._ids = {}
+        self.touched = {}
+        self.spilled = {}
+        self.spill_dir = spill_dir
+        self.manager = manager
+        self.versions = {}
+        self._version_seq = 0
+        self.fingerprints = {}
+        self.origins = {}
+        self.references = {}
+        self.definitions = {}
+        self.created = time.time()
+        self.last_used = self.created
+        self.active = 0
+        # Serialises code execution and writes within one workspace
+        # 串行化同一工作区内的代码执行与写入
+        self.lock = threading.RLock()
+
+    def user_names(self) -> list:
+        """Variables created in this workspace and held in memory / 本工作区中创建且驻留内存的变量"""
+        return [name for name in self.namespace if name not in self._base and not name.startswith("__")]
+
+    def get(self, name: str, default=None):
+        if name in self.spilled:
+            self.reload(name)
+        if name in self.sizes:
+            self.touched[name] = time.time()
+        return self.namespace.get(name, default)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.namespace or name in self.spilled or name in self.definitions
+
+    def __getitem__(self, name: str):
+        if name in self.spilled:
+            self.reload(name)
+        return self.namespace[name]
+
+    def set(self, name: str, value):
+        with self.lock:
+            self._drop_spill(name)
+            self.definitions.pop(name, None)
+            self.namespace[name] = value
+            self.account([name])
+
+    def define(self, name: str, source: str):
+        """
+        Record a function, class or import defined in a worker process, as its source
+        以源码形式记录在工作进程中定义的函数、类或导入
+        """
+        with self.lock:
+            self.discard(name)
+            self.definitions[name] = source
+            try:
+                snippet, _ = code_cache.compile(source, "<python_inter>")
+                self.references[name] = snippet.names - {name}
+            except (SyntaxError, ValueError):
+                pass
+            self._version_seq += 1
+            self.versions[name] = self._version_seq
+
+    def discard(self, name: str) -> bool:
+        with self.lock:
+            found = (self.namespace.pop(name, None) is not None or name in self.spilled
+                     or self.definitions.pop(name, None) is not None)
+            self.versions.pop(name, None)
+            self.origins.pop(name, None)
+            self.references.pop(name, None)
+            self._drop_spill(name)
+            self.sizes.pop(name, None)
+            self._ids.pop(name, None)
+            self.touched.pop(name, None)
+            return found
+
+    def referenced(self, names) -> set:
+        """
+        The given names plus the globals read by the workspace functions and classes among them, transitively
+        给定名称，加上其中工作区函数与类（递归）读取的全局名称
+        """
+        found, pending = set(), list(names)
+        while pending:
+            name = pending.pop()
+            if name not in found:
+                found.add(name)
+                pending.extend(self.references.get(name, ()))
+        return found
+
+    def ensure(self, names):
+        """
+        Reload any of the given names that were spilled, before code reads them; names read
+        by workspace functions the code calls count as read too
+        在代码读取之前，重新加载给定名称中已溢写的变量；代码调用的工作区函数所读取的名称也计入
+        """
+        names = self.referenced(names)
+        now = time.time()
+        for name in [n for n in names if n in self.spilled]:
+            self.reload(name)
+        for name in [n for n in names if n in self.definitions and n not in self.namespace]:
+            # Code running here needs the definition itself / 在本进程中运行的代码需要定义本身
+            try:
+                exec(code_cache.compile(self.definitions[name], "<python_inter>")[0].code, self.namespace)
+            except Exception as e:
+                logger.warning("Defining %s/%s failed: %s", self.thread_id, name, e)
+        for name in names:
+            if name in self.sizes:
+                self.touched[name] = now
+
+    def fingerprint(self, name: str):
+        """
+        Data fingerprint of a loaded variable, remembered per version
+        已加载变量的数据指纹，按版本缓存
+        """
+        with self.lock:
+            version = self.versions.get(name)
+            cached = self.fingerprints.get(name)
+            if cached is not None and version is not None and cached[0] == version:
+                return cached[1]
+            fingerprint = data_fingerprint(self.namespace[name])
+            self.fingerprints[name] = (version, fingerprint)
+            return fingerprint
+
+    def snapshot(self) -> dict:
+        """Object ids of user variables, to detect what a piece of code rebound / 用户变量的对象 id，用于检测代码重新绑定了哪些变量"""
+        return {name: id(self.namespace[name]) for name in self.user_names()}
+
+    def changed_since(self, before: dict) -> list:
+        """Names added or rebound since snapshot() / 自 snapshot() 以来新增或重新绑定的变量"""
+        return [name for name in self.user_names() if before.get(name) != id(self.namespace[name])]
+
+    def account(self, names=None, mutated=()):
+        """
+        Re-measure the given variables (all when None) and forget deleted ones;
+        names in mutated get a new version even when the object is the same
+        重新计量给定变量（None 表示全部），并移除已删除变量的记录；
+        mutated 中的名称即使对象未变也会获得新版本
+        """
+        with self.lock:
+            now = time.time()
+            for name in list(self.sizes):
+                if name not in self.namespace:
+                    self.sizes.pop(name, None)
+                    self._ids.pop(name, None)
+                    self.touched.pop(name, None)
+                    if name not in self.definitions:
+                        self.references.pop(name, None)
+            targets = self.user_names() if names is None else [n for n in names if n in self.namespace]
+            for name in targets:
+                if name in self._base or name.startswith("__"):
+                    continue
+                # Code that rebinds a spilled name makes the file obsolete / 代码重新绑定已溢写的名称后，文件即作废
+                self._drop_spill(name)
+                value = self.namespace[name]
+                if self._ids.get(name) != id(value) or name in mutated:
+                    # Never reused, even after a name is deleted / 版本号不会复用，即使变量被删除过
+                    self._version_seq += 1
+                    self.versions[name] = self._version_seq
+                self.sizes[name] = object_nbytes(value)
+                self._ids[name] = id(value)
+                self.touched[name] = now
+                self.references[name] = value_global_names(value, self.namespace) - {name}
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in memory; spilled frames are not counted / 驻留内存的字节数，不含已溢写的 DataFrame"""
+        return sum(self.sizes.values())
+
+    def spill_candidates(self, min_bytes: int) -> list:
+        """
+        (last touched, name, bytes) of DataFrames that can be spilled
+        可溢写 DataFrame 的 (最近访问时间, 名称, 字节数)
+
+        Frames also bound to another name are skipped: spilling one name would not free them.
+        同时绑定到其他名称的 DataFrame 会被跳过：只溢写一个名称并不能释放内存。
+        """
+        counts = defaultdict(int)
+        for name in self.sizes:
+            counts[self._ids.get(name)] += 1
+        return [(self.touched.get(name, 0), name, size) for name, size in self.sizes.items()
+                if size >= min_bytes and counts[self._ids.get(name)] == 1
+                and isinstance(self.namespace.get(name), pd.DataFrame)]
+
+    def _spill_path(self, name: str) -> str:
+        return os.path.join(self.spill_dir, f"{name}.arrow")
+
+    def spill(self, name: str) -> int:
+        """
+        Write a DataFrame to disk and drop it from memory; returns the bytes freed
+        将 DataFrame 写入磁盘并从内存中移除；返回释放的字节数
+        """
+        with self.lock:
+            df = self.namespace.get(name)
+            if not isinstance(df, pd.DataFrame) or not self.spill_dir:
+                return 0
+            started = time.perf_counter()
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = self._spill_path(name)
+            file_size = save_frame(df, path)
+            nbytes = self.sizes.pop(name, 0)
+            del self.namespace[name]
+            self.spilled[name] = {"path": path, "bytes": nbytes, "file_bytes": file_size, "spilled": time.time()}
+            self._ids.pop(name, None)
+            self.touched.pop(name, None)
+        elapsed = time.perf_counter() - started
+        if self.manager is not None:
+            self.manager.record("spills", nbytes, elapsed)
+        logger.info("Spilled %s/%s to disk: %.1f MB in memory, %.1f MB on disk, %.3fs",
+                    self.thread_id, name, nbytes / 1024**2, file_size / 1024**2, elapsed)
+        return nbytes
+
+    def reload(self, name: str):
+        """Load a spilled DataFrame back into the namespace / 将已溢写的 DataFrame 重新载入命名空间"""
+        with self.lock:
+            entry = self.spilled.get(name)
+            if entry is None:
+                return
+            started = time.perf_counter()
+            self.namespace[name] = load_frame(entry["path"])
+            # Same value as before the spill: keep its version / 与溢写前相同的值：保留其版本
+            self._ids[name] = id(self.namespace[name])
+            self._drop_spill(name)
+            self.account([name])
+        elapsed = time.perf_counter() - started
+        if self.manager is not None:
+            self.manager.record("reloads", self.sizes.get(name, 0), elapsed)
+        logger.info("Reloaded %s/%s from disk in %.3fs (spilled %.0fs earlier)",
+                    self.thread_id, name, elapsed, time.time() - entry["spilled"])
+
+    def value_key(self, name: str) -> str:
+        """Identifies the current value of name across processes: workspace uid and version / 跨进程标识 name 当前值：工作区标识与版本"""
+        return f"{id(self)}:{self.created}:{name}:{self.versions.get(name)}"
+
+    def extracted_as(self, name: str, key: str) -> bool:
+        """
+        Whether name still holds, unchanged, the extract with this cache key
+        name 是否仍未经修改地持有该缓存键对应的提取结果
+        """
+        return (self.versions.get(name) is not None
+                and self.origins.get(name, ())[:2] == (key, self.versions.get(name)))
+
+    def _drop_spill(self, name: str):
+        entry = self.spilled.pop(name, None)
+        if entry is not None:
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+
+    def clear(self):
+        """Drop every variable, spill file and figure / 删除全部变量、溢写文件与图像"""
+        with self.lock:
+            for name in self.user_names():
+                value = self.namespace.get(name)
+                if isinstance(value, matplotlib.figure.Figure):
+                    plt.close(value)
+            for name in list(self.spilled):
+                self._drop_spill(name)
+            if self.spill_dir:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.namespace.clear()
+            self.namespace.update(workspace_builtins())
+            for table in (self.sizes, self._ids, self.touched, self.versions, self.fingerprints,
+                          self.origins, self.references, self.definitions):
+                table.clear()
+
+    def stats(self) -> dict:
+        return {"variables": len(self.sizes), "bytes": self.nbytes, "active": self.active,
+                "spilled": len(self.spilled), "spilled_bytes": sum(e["bytes"] for e in self.spilled.values()),
+                "definitions": len(self.definitions),
+                "idle_seconds": round(time.time() - self.last_used, 1)}
+
+
+class WorkspaceManager:
+    """
+    Registry of per-thread workspaces with LRU and idle-time eviction
+    按线程划分的工作区注册表，支持 LRU 与空闲超时淘汰
+
+    Workspaces in use by a running tool call are never evicted; the limits are
+    checked again once they are released. Above spill_bytes of DataFrames in
+    memory, the least recently used ones are written to spill_dir until usage
+    drops below three quarters of it.
+    正被工具调用使用的工作区不会被淘汰；释放后再重新检查限制。内存中的 DataFrame
+    超过 spill_bytes 时，最近最少使用的会被写入 spill_dir，直到用量降到其四分之三以下。
+    """
+
+    def __init__(self, max_workspaces: int = 32, idle_ttl: float = 3600, max_bytes: int = 0,
+                 spill_dir: str = None, spill_bytes: int = 0, spill_min_bytes: int = 0):
+        self.max_workspaces = max(1, max_workspaces)
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_bytes = spill_bytes
+        self.spill_min_bytes = spill_min_bytes
+        self._workspaces = OrderedDict()
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._io = {"spills": [0, 0, 0.0], "reloads": [0, 0, 0.0]}
+        self.created = 0
+        self.evicted = 0
+        self.torn_down = 0
+        if spill_dir:
+            # Spill files of an earlier process are unreachable / 之前进程留下的溢写文件已无法访问
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    def _checkout(self, thread_id: str) -> Workspace:
+        # Caller holds self._lock / 调用方需持有 self._lock
+        ws = self._workspaces.get(thread_id)
+        if ws is None:
+            spill_dir = None
+            if self.spill_dir:
+                spill_dir = os.path.join(self.spill_dir, hashlib.sha256(thread_id.encode('utf-8')).hexdigest()[:24])
+            ws = self._workspaces[thread_id] = Workspace(thread_id, spill_dir, self)
+            self.created += 1
+        self._workspaces.move_to_end(thread_id)
+        ws.last_used = time.time()
+        return ws
+
+    def get(self, thread_id: str) -> Workspace:
+        """Workspace of a thread, created on first use / 线程的工作区，首次使用时创建"""
+        with self._lock:
+            return self._checkout(thread_id)
+
+    @contextmanager
+    def use(self, config=None):
+        """
+        Borrow the workspace of the run's thread for the duration of a tool call
+        在工具调用期间借用当前运行线程的工作区
+        """
+        with self._lock:
+            ws = self._checkout(thread_id_of(config))
+            ws.active += 1
+        try:
+            yield ws
+        finally:
+            with self._lock:
+                ws.active -= 1
+                ws.last_used = time.time()
+            self.spill()
+            self.evict()
+
+    def record(self, kind: str, nbytes: int, seconds: float):
+        """Count a spill or reload / 记录一次溢写或重新加载"""
+        with self._lock:
+            entry = self._io[kind]
+            entry[0] += 1
+            entry[1] += nbytes
+            entry[2] += seconds
+
+    def spill(self):
+        """
+        Spill least recently used DataFrames while memory is above the high-water mark
+        内存高于高水位线时，溢写最近最少使用的 DataFrame
+        """
+        if not self.spill_bytes or not self.spill_dir:
+            return
+        with self._lock:
+            workspaces = list(self._workspaces.values())
+        total = sum(ws.nbytes for ws in workspaces)
+        if total <= self.spill_bytes or not self._spill_lock.acquire(blocking=False):
+            return
+        try:
+            target = self.spill_bytes * 3 // 4
+            candidates = []
+            for ws in workspaces:
+                # Skip workspaces a tool is running in / 跳过正在执行工具的工作区
+                if ws.active or not ws.lock.acquire(blocking=False):
+                    continue
+                try:
+                    candidates.extend((touched, name, size, ws) for touched, name, size in
+                                      ws.spill_candidates(self.spill_min_bytes))
+                finally:
+                    ws.lock.release()
+            for touched, name, size, ws in sorted(candidates, key=lambda c: c[0]):
+                if total <= target:
+                    break
+                if ws.active or not ws.lock.acquire(blocking=False):
+                    continue
+                try:
+                    total -= ws.spill(name)
+                except Exception as e:
+                    # Frames Arrow cannot represent stay in memory / Arrow 无法表示的 DataFrame 保留在内存中
+                    logger.warning("Spilling %s/%s failed: %s", ws.thread_id, name, e)
+                finally:
+                    ws.lock.release()
+        finally:
+            self._spill_lock.release()
+
+    def evict(self):
+        """
+        Drop idle workspaces past the TTL, then least recently used ones over the limits
+        先淘汰超过空闲时间的工作区，再按 LRU 淘汰超出数量或内存上限的工作区
+        """
+        victims = []
+        with self._lock:
+            now = time.time()
+            for thread_id, ws in list(self._workspaces.items()):
+                if not ws.active and self.idle_ttl and now - ws.last_used > self.idle_ttl:
+                    victims.append(self._workspaces.pop(thread_id))
+            total = sum(ws.nbytes for ws in self._workspaces.values())
+            for thread_id, ws in list(self._workspaces.items()):
+                over_count = len(self._workspaces) > self.max_workspaces
+                over_bytes = self.max_bytes and total > self.max_bytes
+                if not (over_count or over_bytes):
+                    break
+                if ws.active:
+                    continue
+                victims.append(self._workspaces.pop(thread_id))
+                total -= ws.nbytes
+            self.evicted += len(victims)
+        for ws in victims:
+            logger.info("Evicting workspace %s (%d variables, %.1f MB)",
+                        ws.thread_id, len(ws.sizes), ws.nbytes / 1024**2)
+            ws.clear()
+
+    def teardown(self, thread_id: str) -> bool:
+        """
+        Release a thread's workspace explicitly, e.g. when its conversation is deleted
+        显式释放某线程的工作区，例如会话被删除时
+        """
+        with self._lock:
+            ws = self._workspaces.pop(thread_id, None)
+            if ws is not None:
+                self.torn_down += 1
+        if ws is None:
+            return False
+        ws.clear()
+        return True
+
+    def close_all(self):
+        for thread_id in list(self._workspaces):
+            self.teardown(thread_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            workspaces = {tid: ws.stats() for tid, ws in self._workspaces.items()}
+            io = {kind: {"count": n, "bytes": b, "seconds": round(t, 3)} for kind, (n, b, t) in self._io.items()}
+        return {"workspaces": len(workspaces), "bytes": sum(w["bytes"] for w in workspaces.values()),
+                "spilled_bytes": sum(w["spilled_bytes"] for w in workspaces.values()),
+                "max_workspaces": self.max_workspaces, "idle_ttl": self.idle_ttl, "max_bytes": self.max_bytes,
+                "spill_bytes": self.spill_bytes, "created": self.created, "evicted": self.evicted,
+                "torn_down": self.torn_down, **io, "threads": workspaces}
+
+
+def value_global_names(value, namespace: dict) -> set:
+    """
+    Global names a function, or the methods of a class, defined in namespace read when called later
+    在 namespace 中定义的函数（或类的方法）之后被调用时读取的全局名称
+    """
+    members = [getattr(m, "__func__", m) for m in vars(value).values()] if isinstance(value, type) else [value]
+    return set().union(*(code_object_names(m.__code__) for m in members
+                         if getattr(m, "__globals__", None) is namespace and hasattr(m, "__code__")))
+
+
+def thread_id_of(config) -> str:
+    """LangGraph thread id of a tool call's run config / 工具调用运行配置中的 LangGraph 线程 id"""
+    configurable = (config or {}).get("configurable") or {}
+    return str(configurable.get("thread_id") or "default")
+
+
+workspace_manager = WorkspaceManager(
+    max_workspaces=int(os.getenv('WORKSPACE_MAX', '32')),
+    idle_ttl=float(os.getenv('WORKSPACE_IDLE_TTL', '3600')),
+    max_bytes=int(float(os.getenv('WORKSPACE_MAX_MB', '0')) * 1024 * 1024),
+    spill_dir=os.path.join(os.getenv('PROJECT_ROOT', "/app"), "cache", "workspaces"),
+    spill_bytes=int(float(os.getenv('WORKSPACE_SPILL_MB', '2048')) * 1024 * 1024),
+    spill_min_bytes=int(float(os.getenv('WORKSPACE_SPILL_MIN_MB', '8')) * 1024 * 1024),
+)
+
+# ============================================================================
+# PYTHON WORKER PROCESSES
+# Python 工作进程
+# ============================================================================
+# python_inter code runs in a pool of worker processes (workers.py) so a heavy
+# cell cannot stall the server. Calls are stateless: the workspace values the
+# code reads are pickled and sent along with it, workspace functions, classes
+# and imports go as source, and the values the code created or changed come
+# back into the workspace. A call past its time limit, or a cancelled one, has
+# its worker killed and replaced; the workspace keeps the values it had before.
+# python_inter 的代码在工作进程池（workers.py）中运行，避免耗时计算阻塞服务。调用是无状态的：
+# 代码读取的工作区变量经 pickle 序列化后随代码发送，工作区中的函数、类与导入以源码发送，
+# 代码创建或修改的变量再传回工作区。超时或被取消的调用会终止并替换其工作进程，工作区保持
+# 调用前的值。
+# ============================================================================
+
+def job_inputs(ws: Workspace, names: set) -> tuple:
+    """
+    (inputs, definitions) a worker job needs for code reading names, and notes on values that cannot be sent
+    读取 names 的代码在工作进程任务中所需的 (inputs, definitions)，以及无法发送的变量说明
+    """
+    names = ws.referenced(names)
+    inputs, notes = {}, []
+    for name in sorted(names):
+        if name in ws._base or name in ws.definitions or name not in ws:
+            continue
+        try:
+            inputs[name] = pickle.dumps(ws.get(name), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            notes.append(f"⚠️ '{name}' could not be sent to the worker process: {e}")
+    # In definition order, so each finds what it builds on / 按定义顺序发送，以便找到其依赖
+    definitions = {name: source for name, source in ws.definitions.items() if name in names}
+    return inputs, definitions, notes
+
+
+def run_python_in_worker(ws: Workspace, py_code: str, timeout: float, cancel: CancelScope = None) -> str:
+    """
+    Execute python_inter code for ws in a worker process; caller holds ws.lock
+    在工作进程中为 ws 执行 python_inter 代码；调用方需持有 ws.lock
+    """
+    inputs, definitions, notes = job_inputs(ws, code_names(py_code))
+    try:
+        result = python_workers.call(run_python, (py_code, inputs, definitions), timeout, cancel)
+    except WorkerStopped as e:
+        if e.reason == "crashed":
+            return "\n".join(notes + [f"Code execution error: the Python worker {e}. "
+                                      f"Workspace variables keep the values they had before this call."])
+        limit = python_workers.cpu_seconds if e.reason == "cpu_limit" else timeout
+        return "\n".join(notes + [interruption_report("python_inter", e.reason, limit, e.elapsed, py_code)])
+    except RuntimeError as e:
+        return "\n".join(notes + [f"Code execution error: {e}"])
+    failed = dict(result["failed"])
+    for name, payload in result["values"].items():
+        try:
+            ws.set(name, pickle.loads(payload))
+        except Exception as e:
+            failed[name] = f"{type(e).__name__}: {e}"
+    for name, source in result["definitions"].items():
+        ws.define(name, source)
+    for name in result["deleted"]:
+        ws.discard(name)
+    if failed:
+        notes.append("⚠️ Not kept, these values cannot be copied out of the Python worker: "
+                     + "; ".join(f"{name} ({reason})" for name, reason in failed.items())
+                     + ". Define functions and classes at the top level of the code, and keep results as data.")
+    if result["unavailable"]:
+        notes.append("⚠️ Could not be defined again in the Python worker: "
+                     + "; ".join(f"{name} ({reason})" for name, reason in result["unavailable"].items()))
+    log_timings("python_inter", ws.thread_id, result["timings"])
+    return "\n".join(notes + [result["text"]])
+
+
+python_workers = WorkerPool(
+    "python_inter",
+    size=int(os.getenv('PYTHON_WORKERS', '2')),
+    max_tasks=int(os.getenv('PYTHON_WORKER_MAX_TASKS', '200')),
+    cpu_seconds=float(os.getenv('PYTHON_WORKER_CPU_SECONDS', '300')),
+    memory_bytes=int(float(os.getenv('PYTHON_WORKER_MEMORY_MB', '4096')) * 1024 * 1024),
+    # Pre-warm the heavy imports analysis code usually needs / 预先导入分析代码常用的重量级库
+    warm=("sklearn",),
+)